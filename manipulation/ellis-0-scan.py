@@ -6,6 +6,7 @@
 #' ---
 #+ echo=FALSE
 # python manipulation/ellis-0-scan.py  # run from project root
+# python manipulation/ellis-0-scan.py plan|search|enrich|export|stats  # one stage at a time
 
 """
 ELLIS-0: COMPREHENSIVE CAFE FETCHER FOR EDMONTON
@@ -15,55 +16,139 @@ Purpose:
   Systematically search Edmonton for all cafes using Google Places API
   with grid-based coverage to ensure comprehensive results
 
+The scan itself is scan/engine.py (shared with scan/cafe-fetcher-comprehensive.py);
+this script supplies the Edmonton ScanConfig (--config overrides it from JSON)
+and the output targets from scan/outputs.py.
+
 Output Files:
   - data-private/derived/ellis-0/ellis-0-scan.csv (CSV format)
-  - data-private/derived/ellis-0/ellis-0-scan.rds (R format via Rscript)
+  - data-private/derived/ellis-0/ellis-0-scan.rds (R format, written in Python)
+  - data-private/derived/ellis-0/ellis-0-scan.parquet / .feather (typed
+    columnar copies; need the optional pyarrow package)
+  - data-private/derived/ellis-0/ellis-0-scan-index.npz (grid index for
+    radius and nearest-cafe queries; load with scan.spatial.PlaceIndex)
+  - data-private/derived/cafes/edmonton_cafes_comprehensive.csv (input of
+    scan/clean-cafe-list.R, formerly written by the separate fetcher script)
+  - data-private/derived/ellis-0/ellis-0-scan-metrics.json / .prom (API
+    latency histograms, status counts, bytes, pages per query, accepted and
+    rejected places; the .prom file suits Prometheus' textfile collector;
+    not written by export or --shard merge, which make no API calls)
 
 Data Source:
   Google Places API (https://maps.googleapis.com/maps/api)
   
 API Key:
-  Loaded from .env file in project root (PLACES_API_KEY)
+  PLACES_API_KEY from the .Renv file in the manipulation directory, read
+  only by commands that call the API: not by plan, export or stats, nor
+  with --replay, which serves every request from the response cache
+
+Response Cache:
+  - data-private/derived/ellis-0/ellis-0-cache.sqlite (keyed on request
+    parameters without the API key; per-endpoint TTLs; LRU size bound)
+
+Incremental Refresh (--incremental):
+  Loads the existing ellis_0_cafes table, fetches Place Details only for new
+  place_ids or rows whose details are older than --stale-days, and upserts
+  back by place_id; rows missing from this scan get seen_in_last_scan = 0.
+
+Checkpoint Journal:
+  - data-private/derived/ellis-0/ellis-0-scan.journal (finished searches,
+    accepted places and details, fsynced in batches); --resume continues an
+    interrupted or crashed scan from it
+
+Streaming Output (--sink csv|jsonl|sqlite):
+  - data-private/derived/ellis-0/ellis-0-scan_stream.{csv,jsonl,sqlite}
+    written in batches while the scan runs: a row when a place is accepted
+    and another when its details arrive (last row per place_id wins; the
+    SQLite file is upserted by place_id). --stream-only keeps only places
+    awaiting details in memory and builds the final results from SQLite
+
+Budgeted Scans (--max-calls / --max-cost, --prioritize):
+  Every API call spends from the budget and each accepted place reserves its
+  Details call, so the scan stops cleanly when the next search no longer
+  fits; places from searches already in flight by then that no longer fit
+  a reservation are kept without details and no new search starts. It then
+  writes ellis-0-scan_partial.csv and ellis-0-scan-plan.json (budget spent,
+  places still without details, searches not yet run);
+  --resume continues from the journal. --prioritize searches circles with
+  the most cafes from the last scan first.
+
+Sharded Scans (--shard plan|work|merge|run):
+  - data-private/derived/ellis-0/ellis-0-queue.sqlite holds the search
+    circles as work units. Worker processes (--workers of them, on any
+    hosts sharing the file) lease units, each at its share of --rps, and
+    queue one Details unit per new place_id. 'merge' rebuilds the results
+    in plan order, first sighting winning, and saves them like a normal
+    run once every unit is done (before that, only ellis-0-scan_partial.csv);
+    'run' plans, starts local workers and merges in one go.
+
+Staged Scans (subcommands plan, search, enrich, export, stats):
+  The same queue file (--queue) holds a scan's state between stages, so
+  each can run on its own, be interrupted and re-run, and the outputs or
+  statistics can be rebuilt later without the API:
+    plan    writes the search circles of --config/--coverage/--boundary
+    search  runs the search units (capped adaptive cells queue children)
+    enrich  fetches Place Details for the places found so far
+    export  merges the queue and writes every output but the metrics once
+            all units are done (as --shard merge)
+    stats   prints unit counts and summary statistics, without pandas
+  pandas and requests are only imported by the stages that use them.
+  Without a subcommand the whole scan runs in one process as before.
 
 Processing:
-  1. Generates grid of search points across Edmonton
-  2. Searches each grid point with multiple type/keyword combinations
-  3. De-duplicates results by place_id
+  1. Generates grid of search points across Edmonton (fixed lattice, a
+     hexagonal circle cover sized in metres, or an adaptive quadtree that
+     only refines cells whose queries hit the 60-result cap)
+  2. Searches each grid point with multiple type/keyword combinations,
+     with up to MAX_IN_FLIGHT calls in flight paced by a shared token bucket;
+     page 2/3 requests are scheduled for when their next_page_token becomes
+     valid and other searches run in the meantime
+     (optionally ordered and pruned by observed yield with --prune);
+     throttled and failed calls are retried with backoff (scan/retry.py),
+     and searches or Details that still fail are retried once more at the
+     end of the phase
+  2b. With --boundary, skips search circles that miss the city polygon and
+     rejects places outside it before any Details call
+  3. De-duplicates results by place_id (in task order, so concurrent and
+     serial runs produce identical output)
   4. Enriches with detailed information via place details API
-  5. Saves to CSV and converts to RDS format
+  4b. Resolves listings of the same venue (a drive-thru or kiosk listing,
+     a relocated cafe's old pin) to one venue_id (scan/resolve.py)
+  5. Saves to CSV, RDS and Parquet/Feather (each written directly, no R process),
+     the SQLite table, and edmonton_cafes_comprehensive.csv for
+     clean-cafe-list.R (see output_targets), plus ellis-0-scan-venues.csv
+     (one record per venue) and ellis-0-scan-venue-ids.csv (place_id to
+     venue_id), which ellis-6-transform.R and clean-cafe-list.R use to
+     count each venue once
+  6. With --transform, assigns venues to neighbourhoods with population and
+     density (same output as ellis-6-transform)
 """
 
 import os
-import requests
-import pandas as pd
-import time
-from datetime import datetime
-from dotenv import load_dotenv
+import argparse
 import json
-from typing import List, Dict, Set
-import math
-import subprocess
+import multiprocessing
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable, List
 
-# ---- environment-setup ------
-# Load API key from .Renv file in manipulation directory
-renv_path = os.path.join(os.path.dirname(__file__), '.Renv')
-PLACES_API_KEY = None
-if os.path.exists(renv_path):
-    try:
-        with open(renv_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    if key.strip() == 'PLACES_API_KEY':
-                        PLACES_API_KEY = value.strip()
-                        break
-    except Exception as e:
-        print(f"Warning: Could not load .Renv file: {e}")
+# The scan package loads without pandas or requests; scan.outputs (pandas) is
+# imported by the commands that write outputs, requests by the first API call
+from scan.budget import PriorityScheduler, ScanBudget
+from scan.cache import DAY, ResponseCache
+from scan.engine import DETAIL_COLUMNS, PLACE_COLUMNS, CafeFetcher, ScanConfig, print_summary
+from scan.journal import ScanJournal
+from scan.planner import QueryPlanner
+from scan.shard import merge_places, merge_shards, plan_shards, print_queue, shard_config, work_shards
+from scan.storage import load_places
+from scan.sinks import CsvSink, JsonlSink, SinkWriter, SqliteSink
+from scan.workqueue import WorkQueue
+
+if TYPE_CHECKING:
+    from scan.outputs import OutputTarget
 
-if not PLACES_API_KEY:
-    print("Error: PLACES_API_KEY not found in .Renv file")
-    exit(1) 
+# ---- environment-setup ------
+# PLACES_API_KEY lives in the .Renv file in the manipulation directory (see load_api_key)
+RENV_PATH = os.path.join(os.path.dirname(__file__), '.Renv')
 
 # ---- declare-globals -------
 # Configuration constants
@@ -78,355 +163,498 @@ GRID_SIZE = 0.05  # degrees (~5km grid cells)
 SEARCH_RADIUS = 3500  # meters (to ensure overlap between grid cells)
 SEARCH_TYPES = ['cafe', 'coffee_shop', 'bakery']
 SEARCH_KEYWORDS = ['cafe', 'coffee', 'espresso', 'latte', 'tea house', 'bubble tea', 'boba']
+MAX_RESULTS_PER_QUERY = 60  # Nearby Search cap (3 pages x 20)
+RULES_PROFILE = 'scan'  # cafe-rules.json profile applied while scanning
+
+# Coverage mode: 'lattice' (fixed GRID_SIZE points), 'hex' (hexagonal
+# circle cover of SEARCH_RADIUS circles in metres) or 'adaptive' (quadtree)
+COVERAGE = 'lattice'
+HEX_OVERLAP = 0.05  # shrink the hex lattice radius by this share as a safety margin
+ADAPTIVE_ROOT_SIZE = 0.1  # degrees per level-0 quadtree cell
+ADAPTIVE_MAX_LEVEL = 4  # deepest refinement (cells ~1/16 of the root side)
+
+# Request pacing (replaces the fixed sleeps between queries)
+REQUESTS_PER_SECOND = 10.0  # shared token bucket across all worker threads
+MAX_IN_FLIGHT = 8  # concurrent API calls; 1 runs the scan serially
+
+# Optional city boundary (GeoJSON Polygon/MultiPolygon, e.g. the City of
+# Edmonton corporate boundary from the open data portal); None uses
+# EDMONTON_BOUNDS plus a 0.1 degree margin
+BOUNDARY_PATH = None
+
+SCAN_CONFIG = ScanConfig(
+    bounds=EDMONTON_BOUNDS,
+    grid_size=GRID_SIZE,
+    search_radius=SEARCH_RADIUS,
+    search_types=tuple(SEARCH_TYPES),
+    search_keywords=tuple(SEARCH_KEYWORDS),
+    rules_profile=RULES_PROFILE,
+    max_results_per_query=MAX_RESULTS_PER_QUERY,
+    hex_overlap=HEX_OVERLAP,
+    adaptive_root_size=ADAPTIVE_ROOT_SIZE,
+    adaptive_max_level=ADAPTIVE_MAX_LEVEL,
+    title='ELLIS-0: COMPREHENSIVE EDMONTON CAFE SEARCH',
+)
 
 # Output directory
 OUTPUT_DIR = 'data-private/derived/ellis-0'
+DB_PATH = 'data-private/derived/global-data.sqlite'
+DB_TABLE = 'ellis_0_cafes'
+# Neighbourhood transform (--transform), same inputs and outputs as ellis-6-transform
+TRANSFORM_NEIGHBOURHOODS = 'data-private/derived/ellis-4-open-data/ellis-4-open-data.csv'
+TRANSFORM_POPULATION = 'data-private/derived/ellis-5-open-data/ellis-5-open-data.csv'
+TRANSFORM_OUTPUT_DIR = 'data-private/derived/ellis-6-transform'
+OUTPUT_FORMATS = ['rds', 'parquet']  # written alongside the CSV (--formats)
+# The same scan also feeds clean-cafe-list.R, which used to need its own fetcher run
+COMPREHENSIVE_CSV = 'data-private/derived/cafes/edmonton_cafes_comprehensive.csv'
+
+# Incremental refresh: details older than this are re-fetched
+DETAILS_STALE_DAYS = 30
+
+# Query planner (--prune): skip queries expected to add < threshold new places per call
+PRUNE_THRESHOLD = 0.05
+PRUNE_AUDIT_RATE = 0.1  # share of would-be-skipped queries run anyway to measure recall loss
+
+# Response cache (see scan/cache.py); replay mode serves it without network
+CACHE_PATH = os.path.join(OUTPUT_DIR, 'ellis-0-cache.sqlite')
+CACHE_TTL = {'nearbysearch': 7 * DAY, 'details': 30 * DAY}  # seconds per endpoint
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Checkpoint journal (see scan/journal.py)
+JOURNAL_PATH = os.path.join(OUTPUT_DIR, 'ellis-0-scan.journal')
+JOURNAL_FSYNC_EVERY = 100  # entries per fsync batch
+
+# Budgeted scans (--max-calls/--max-cost) stop early and list the work left (see scan/budget.py)
+PLAN_PATH = os.path.join(OUTPUT_DIR, 'ellis-0-scan-plan.json')
+
+# Sharded scans (--shard): work units in a queue file shared by worker processes (see scan/shard.py)
+QUEUE_PATH = os.path.join(OUTPUT_DIR, 'ellis-0-queue.sqlite')
+SHARD_WORKERS = 4  # worker processes splitting --rps between them
+
+# Streaming sinks (--sink): places are written as they are accepted and again with details
+SINK_PATHS = {
+    'csv': os.path.join(OUTPUT_DIR, 'ellis-0-scan_stream.csv'),
+    'jsonl': os.path.join(OUTPUT_DIR, 'ellis-0-scan_stream.jsonl'),
+    'sqlite': os.path.join(OUTPUT_DIR, 'ellis-0-scan_stream.sqlite'),
+}
+SINK_BATCH_SIZE = 100  # records per write/transaction
+SINK_MAX_DELAY = 5.0  # seconds before a partial batch is flushed anyway
 
 # ---- declare-functions -----
-class EdmontonCafeFetcher:
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.session = requests.Session()
-        self.found_places: Dict[str, Dict] = {}  # place_id -> place data
-        self.search_count = 0
-        self.api_calls = 0
-        
-    def generate_search_grid(self) -> List[Dict[str, float]]:
-        """Generate grid of search points covering Edmonton"""
-        points = []
-        
-        lat = EDMONTON_BOUNDS['south']
-        while lat <= EDMONTON_BOUNDS['north']:
-            lng = EDMONTON_BOUNDS['west']
-            while lng <= EDMONTON_BOUNDS['east']:
-                points.append({'lat': lat, 'lng': lng})
-                lng += GRID_SIZE
-            lat += GRID_SIZE
-        
-        print(f"Generated {len(points)} grid points to search")
-        return points
-    
-    def search_nearby(self, location: Dict[str, float], search_type: str = None, keyword: str = None) -> List[Dict]:
-        """Search for places near a specific location"""
-        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-        
-        params = {
-            'location': f"{location['lat']},{location['lng']}",
-            'radius': SEARCH_RADIUS,
-            'key': self.api_key
-        }
-        
-        if search_type:
-            params['type'] = search_type
-        if keyword:
-            params['keyword'] = keyword
-            
-        all_results = []
-        
-        while True:
-            self.api_calls += 1
-            print(f"  API Call #{self.api_calls}: {search_type or 'general'} / {keyword or 'no keyword'}")
-            
+def load_api_key(path: str = RENV_PATH) -> str:
+    """PLACES_API_KEY from the .Renv file, or None if it is missing"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    if key.strip() == 'PLACES_API_KEY':
+                        return value.strip()
+    except Exception as e:
+        print(f"Warning: Could not load .Renv file: {e}")
+    return None
+
+
+def output_targets(formats: List[str], transform: bool = False, metrics: bool = True) -> List['OutputTarget']:
+    """Files and tables written from the final results, in order (metrics:
+    False when this process made none of the scan's API calls)"""
+    from scan.outputs import (ColumnarOutput, CsvOutput, IndexOutput, MetricsOutput, RdsOutput,
+                              SqliteOutput, TransformOutput, VenueOutput)
+    targets: List[OutputTarget] = [
+        CsvOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan.csv')),
+        IndexOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan-index.npz')),
+        VenueOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan-venues.csv'),
+                    os.path.join(OUTPUT_DIR, 'ellis-0-scan-venue-ids.csv')),
+    ]
+    if 'rds' in formats:
+        targets.append(RdsOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan.rds')))
+    for fmt in ('parquet', 'feather'):
+        if fmt in formats:
+            targets.append(ColumnarOutput(os.path.join(OUTPUT_DIR, f'ellis-0-scan.{fmt}')))
+    targets.append(SqliteOutput(DB_PATH, DB_TABLE))
+    targets.append(CsvOutput(COMPREHENSIVE_CSV))
+    if metrics:
+        targets.append(MetricsOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan-metrics.json')))
+        targets.append(MetricsOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan-metrics.prom')))
+    if transform:
+        targets.append(TransformOutput(TRANSFORM_NEIGHBOURHOODS, TRANSFORM_POPULATION,
+                                       TRANSFORM_OUTPUT_DIR, DB_PATH))
+    return targets
+
+
+def shard_fetcher(args: argparse.Namespace, config: ScanConfig, requests_per_second: float,
+                  boundary: str = None, cache: ResponseCache = None, api_key: str = None) -> CafeFetcher:
+    """Fetcher for planning, working or merging a sharded scan"""
+    fetcher = CafeFetcher(api_key, config=config, requests_per_second=requests_per_second,
+                          max_in_flight=args.max_in_flight, cache=cache)
+    fetcher.quiet = args.quiet
+    if boundary:
+        fetcher.load_boundary(boundary)
+    if args.incremental:
+        fetcher.load_known_places(DB_PATH, DB_TABLE, stale_days=args.stale_days)
+    return fetcher
+
+
+def shard_worker(args: argparse.Namespace, kinds: Iterable[str] = ('details', 'search')) -> None:
+    """One worker of a sharded scan, with the plan's config and its share of
+    the rate, working units of `kinds`"""
+    queue = WorkQueue(args.queue)
+    meta = queue.meta
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_path, ttls=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, replay=args.replay)
+    try:
+        fetcher = shard_fetcher(args, shard_config(queue, SCAN_CONFIG), meta['requests_per_second'] / meta['workers'],
+                                boundary=meta.get('boundary'), cache=cache,
+                                api_key=None if args.replay else load_api_key())
+        work_shards(fetcher, queue, kinds=kinds)
+    finally:
+        queue.close()
+        if cache:
+            cache.close()
+
+
+def run_sharded(args: argparse.Namespace, config: ScanConfig) -> None:
+    """--shard plan / work / merge, or all three with local worker processes (run)"""
+    queue = WorkQueue(args.queue)
+    try:
+        if args.shard in ('plan', 'run'):
+            fetcher = shard_fetcher(args, config, args.rps, boundary=args.boundary)
             try:
-                response = self.session.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get('status') == 'ZERO_RESULTS':
-                    break
-                    
-                if data.get('status') not in ['OK', 'ZERO_RESULTS']:
-                    print(f"    Warning: API returned status {data.get('status')}")
-                    if data.get('status') == 'OVER_QUERY_LIMIT':
-                        print("    Hit API quota limit. Waiting 60 seconds...")
-                        time.sleep(60)
-                        continue
-                    break
-                
-                results = data.get('results', [])
-                all_results.extend(results)
-                print(f"    Found {len(results)} results")
-                
-                # Check for next page
-                next_page_token = data.get('next_page_token')
-                if not next_page_token:
-                    break
-                    
-                # Wait before fetching next page (required by Google)
-                time.sleep(2)
-                params = {'pagetoken': next_page_token, 'key': self.api_key}
-                
-            except requests.exceptions.RequestException as e:
-                print(f"    Error: {e}")
-                break
-        
-        return all_results
-    
-    def get_place_details(self, place_id: str) -> Dict:
-        """Get detailed information about a place"""
-        url = "https://maps.googleapis.com/maps/api/place/details/json"
-        
-        params = {
-            'place_id': place_id,
-            'fields': 'name,formatted_address,geometry,place_id,business_status,types,rating,user_ratings_total,opening_hours,formatted_phone_number,website,price_level,editorial_summary',
-            'key': self.api_key
-        }
-        
-        self.api_calls += 1
+                plan_shards(fetcher, queue, args.coverage, args.rps, args.workers, boundary=args.boundary)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+        elif 'config' not in queue.meta:
+            print(f"Error: no plan in {args.queue}; run --shard plan first")
+            return
+        if args.shard in ('work', 'run'):
+            retry_failed_units(queue)
+        
+        if args.shard == 'work':
+            shard_worker(args)
+        elif args.shard == 'run':
+            workers = [multiprocessing.Process(target=shard_worker, args=(args,), name=f"shard-{i + 1}")
+                       for i in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        
+        if args.shard in ('merge', 'run'):
+            export_queue(args, queue)
+    finally:
+        queue.close()
+
+
+def retry_failed_units(queue: WorkQueue) -> None:
+    """Give units that failed for good in an earlier run (the queue's dead
+    letters) fresh attempts"""
+    retried = queue.retry_failed()
+    if retried:
+        print(f"Retrying {retried} units that failed in an earlier run")
+
+
+def export_queue(args: argparse.Namespace, queue: WorkQueue) -> None:
+    """Merge a worked queue and write every output target but the metrics,
+    which stay with the workers' calls (only ellis-0-scan_partial.csv while
+    units are not done)"""
+    meta = queue.meta
+    fetcher = shard_fetcher(args, shard_config(queue, SCAN_CONFIG), meta['requests_per_second'],
+                            boundary=meta.get('boundary'))
+    print(f"\nMerging {args.queue}")
+    df, unfinished = merge_shards(fetcher, queue)
+    print()
+    if unfinished:
+        # A partial merge must not replace the full outputs (or delete unseen rows from the table)
+        from scan.outputs import CsvOutput
+        CsvOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan_partial.csv')).write(df, fetcher)
+        finish = "run the search and enrich stages" if args.command == 'export' else "work them (--shard work)"
+        print(f"{unfinished} units are not done; {finish} and {args.command or 'merge'} again to write the outputs")
+        return
+    fetcher.save_results(df, output_targets([f for f in args.formats.split(',') if f], args.transform,
+                                            metrics=False))
+    print_summary(df.to_dict('records'))
+
+
+def run_stage(args: argparse.Namespace) -> None:
+    """One stage of a staged scan (plan, search, enrich, export or stats) on the queue file"""
+    if args.command != 'plan' and not os.path.exists(args.queue):
+        print(f"Error: no plan in {args.queue}; run the plan stage first")
+        return
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == 'plan':
+            config = SCAN_CONFIG.updated_from(args.config) if args.config else SCAN_CONFIG
+            fetcher = shard_fetcher(args, config, args.rps, boundary=args.boundary)
+            try:
+                plan_shards(fetcher, queue, args.coverage, args.rps, args.workers, boundary=args.boundary)
+            except ValueError as e:
+                print(f"Error: {e}")
+            return
+        if 'config' not in queue.meta:
+            print(f"Error: no plan in {args.queue}; run the plan stage first")
+            return
         
-        try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get('status') == 'OK':
-                return data.get('result', {})
-            else:
-                print(f"    Details fetch failed for {place_id}: {data.get('status')}")
-                return {}
-                
-        except requests.exceptions.RequestException as e:
-            print(f"    Error fetching details: {e}")
-            return {}
+        if args.command in ('search', 'enrich'):
+            retry_failed_units(queue)
+            shard_worker(args, kinds=('search',) if args.command == 'search' else ('details',))
+            print()
+            unfinished = print_queue(queue)
+            if args.command == 'enrich' and queue.unfinished('search'):
+                print("Searches are still unfinished; run enrich again once they are done")
+            elif not unfinished:
+                print("All units done; run export to write the outputs")
+        elif args.command == 'export':
+            export_queue(args, queue)
+        else:  # stats: no pandas, no network
+            fetcher = shard_fetcher(args, shard_config(queue, SCAN_CONFIG), queue.meta['requests_per_second'])
+            print(f"Scan state in {args.queue}")
+            merge_places(fetcher, queue)
+            print_summary(sorted(fetcher.found_places.values(), key=lambda place: place['name']))
+    finally:
+        queue.close()
+
+
+# ---- main-function ----------
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command-line options (a stage subcommand, or none for the whole scan)"""
+    # Option groups shared by the whole-scan options and the stage subcommands
+    scope = argparse.ArgumentParser(add_help=False)
+    scope.add_argument('--rps', type=float, default=REQUESTS_PER_SECOND,
+                       help=f"API requests per second across all workers (default: {REQUESTS_PER_SECOND:g})")
+    scope.add_argument('--config',
+                       help="JSON file overriding scan settings (bounds, grid_size, search_radius, "
+                            "search_types, search_keywords, rules_profile, ...); see scan/engine.py")
+    scope.add_argument('--coverage', choices=['lattice', 'hex', 'adaptive'], default=COVERAGE,
+                       help="fixed GRID_SIZE lattice, hexagonal circle cover in metres, or quadtree "
+                            f"refined where results hit the cap (default: {COVERAGE})")
+    scope.add_argument('--boundary', default=BOUNDARY_PATH,
+                       help="GeoJSON city boundary; search circles and places outside it are skipped")
+    calls = argparse.ArgumentParser(add_help=False)
+    calls.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                       help=f"concurrent API calls; 1 runs serially (default: {MAX_IN_FLIGHT})")
+    calls.add_argument('--replay', action='store_true',
+                       help="serve every request from the response cache and never touch the network")
+    calls.add_argument('--no-cache', action='store_true',
+                       help="bypass the response cache")
+    calls.add_argument('--cache-path', default=CACHE_PATH,
+                       help=f"response cache file (default: {CACHE_PATH})")
+    calls.add_argument('--quiet', action='store_true',
+                       help="skip the per-call log; print a progress/ETA line every few seconds instead")
+    refresh = argparse.ArgumentParser(add_help=False)
+    refresh.add_argument('--incremental', action='store_true',
+                         help=f"only fetch details for new or stale places and upsert into {DB_TABLE}")
+    refresh.add_argument('--stale-days', type=float, default=DETAILS_STALE_DAYS,
+                         help=f"age after which known details are re-fetched (default: {DETAILS_STALE_DAYS})")
+    save = argparse.ArgumentParser(add_help=False)
+    save.add_argument('--formats', default=','.join(OUTPUT_FORMATS),
+                      help="comma-separated outputs written besides the CSV: rds, parquet, feather "
+                           f"(default: {','.join(OUTPUT_FORMATS)}; '' for CSV only)")
+    save.add_argument('--transform', action='store_true',
+                      help="after saving, assign cafes to neighbourhoods with demographics "
+                           "(the ellis-6 transform, run in this process)")
+    state = argparse.ArgumentParser(add_help=False)
+    state.add_argument('--queue', default=QUEUE_PATH,
+                       help=f"work queue holding the scan's state (default: {QUEUE_PATH})")
     
-    def is_in_edmonton_area(self, lat: float, lng: float) -> bool:
-        """Check if coordinates are within Edmonton area (with margin)"""
-        margin = 0.1  # Allow some margin beyond strict boundaries
-        return (EDMONTON_BOUNDS['south'] - margin <= lat <= EDMONTON_BOUNDS['north'] + margin and
-                EDMONTON_BOUNDS['west'] - margin <= lng <= EDMONTON_BOUNDS['east'] + margin)
+    parser = argparse.ArgumentParser(description="Scan Edmonton for cafes via the Google Places API",
+                                     parents=[scope, calls, refresh, save, state])
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted scan from its checkpoint journal")
+    parser.add_argument('--journal-path', default=JOURNAL_PATH,
+                        help=f"checkpoint journal file (default: {JOURNAL_PATH})")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="fetch details while searching instead of after the search")
+    parser.add_argument('--prune', action='store_true',
+                        help="order queries by observed yield and skip low-yield type/keyword combinations")
+    parser.add_argument('--prune-threshold', type=float, default=PRUNE_THRESHOLD,
+                        help=f"minimum expected new places per call to keep a query (default: {PRUNE_THRESHOLD})")
+    parser.add_argument('--sink', action='append', choices=sorted(SINK_PATHS), default=[],
+                        help="stream places to this file as they are found (repeatable; "
+                             f"written under {OUTPUT_DIR})")
+    parser.add_argument('--stream-only', action='store_true',
+                        help="keep only places awaiting details in memory and read the final "
+                             "results back from the SQLite sink (implies --sink sqlite)")
+    parser.add_argument('--max-calls', type=int,
+                        help="stop cleanly after this many API calls (details of new places are reserved first)")
+    parser.add_argument('--max-cost', type=float,
+                        help="stop cleanly before spending more than this many USD (list prices in scan/budget.py)")
+    parser.add_argument('--prioritize', action='store_true',
+                        help=f"search circles with the most cafes in {DB_TABLE} (and central ones) first; "
+                             "implied by --max-calls/--max-cost")
+    parser.add_argument('--shard', choices=['plan', 'work', 'merge', 'run'],
+                        help="sharded scan through a work queue file: 'plan' writes the search units, "
+                             "'work' runs one worker (start --workers of them, on any hosts sharing the "
+                             "file), 'merge' saves the results; 'run' does all three with local processes")
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS,
+                        help=f"worker processes sharing --rps in a sharded scan (default: {SHARD_WORKERS})")
+    # Stage subcommands; their options follow the subcommand name
+    stages = parser.add_subparsers(dest='command', metavar='STAGE',
+                                   help="run one stage of a scan on the --queue file (options follow the stage)")
+    offline = {'max_in_flight': 1, 'quiet': False, 'replay': False, 'no_cache': True}
+    plan = stages.add_parser('plan', parents=[scope, state],
+                             help="write the search circles of the scan settings (no API calls)")
+    plan.add_argument('--workers', type=int, default=1,
+                      help="processes that will run each stage, splitting --rps between them (default: 1)")
+    plan.set_defaults(incremental=False, **offline)
+    stages.add_parser('search', parents=[calls, state],
+                      help="run the planned searches; capped adaptive cells queue their children"
+                      ).set_defaults(incremental=False)
+    stages.add_parser('enrich', parents=[calls, refresh, state],
+                      help="fetch Place Details for the places found so far")
+    stages.add_parser('export', parents=[refresh, save, state],
+                      help="merge the queue and write every output (no API calls)").set_defaults(**offline)
+    stages.add_parser('stats', parents=[refresh, state],
+                      help="print unit counts and summary statistics (no API calls, no pandas)"
+                      ).set_defaults(**offline)
+    return parser.parse_args(argv)
+
+
+def main():
+    """Main execution function"""
+    args = parse_args()
     
-    def is_likely_cafe(self, place: Dict) -> bool:
-        """Determine if a place is likely a cafe/coffee shop"""
-        types = place.get('types', [])
-        name = place.get('name', '').lower()
-        
-        # Type-based filtering
-        cafe_types = ['cafe', 'coffee_shop', 'bakery', 'restaurant', 'food', 'bar']
-        has_cafe_type = any(t in types for t in cafe_types)
-        
-        # Name-based filtering
-        cafe_keywords = ['cafe', 'coffee', 'espresso', 'latte', 'cappuccino', 'tea', 'boba', 'bubble', 
-                         'bakery', 'patisserie', 'bistro', 'beans', 'brew', 'roast', 'starbucks', 
-                         'tim hortons', 'second cup', 'good earth', 'blenz']
-        has_cafe_keyword = any(kw in name for kw in cafe_keywords)
-        
-        # Exclude clearly non-cafe places
-        exclude_keywords = ['gas station', 'convenience store', 'hotel', 'hospital', 'school', 
-                           'university', 'library', 'gym', 'bank', 'car wash']
-        is_excluded = any(kw in name for kw in exclude_keywords)
-        
-        return (has_cafe_type or has_cafe_keyword) and not is_excluded
+    if args.replay and args.no_cache:
+        print("Error: --replay needs the response cache; drop --no-cache")
+        return
     
-    def process_place(self, place: Dict) -> None:
-        """Process and store a place if it's valid and in Edmonton"""
-        place_id = place.get('place_id')
-        if not place_id:
+    if args.command:
+        if args.command in ('search', 'enrich') and not args.replay and not load_api_key():
+            print("Error: PLACES_API_KEY not found in .Renv file")
             return
-        
-        # Skip if already processed
-        if place_id in self.found_places:
-            return
-        
-        # Check location
-        geometry = place.get('geometry', {})
-        location = geometry.get('location', {})
-        lat = location.get('lat')
-        lng = location.get('lng')
-        
-        if not lat or not lng:
-            return
-            
-        if not self.is_in_edmonton_area(lat, lng):
+        run_stage(args)
+        return
+    
+    if args.shard:
+        unsupported = [flag for flag, used in [
+            ('--resume', args.resume), ('--pipeline', args.pipeline), ('--prune', args.prune),
+            ('--sink/--stream-only', args.sink or args.stream_only),
+            ('--max-calls/--max-cost/--prioritize',
+             args.max_calls is not None or args.max_cost is not None or args.prioritize)] if used]
+        if unsupported:
+            print(f"Error: --shard does not combine with {', '.join(unsupported)}")
             return
-        
-        # Check if it's likely a cafe
-        if not self.is_likely_cafe(place):
+        if args.shard in ('work', 'run') and not args.replay and not load_api_key():
+            print("Error: PLACES_API_KEY not found in .Renv file")
             return
-        
-        # Store basic info first
-        self.found_places[place_id] = {
-            'place_id': place_id,
-            'name': place.get('name'),
-            'address': place.get('vicinity') or place.get('formatted_address'),
-            'lat': lat,
-            'lng': lng,
-            'types': ', '.join(place.get('types', [])),
-            'rating': place.get('rating'),
-            'user_ratings_total': place.get('user_ratings_total'),
-            'business_status': place.get('business_status'),
-            'price_level': place.get('price_level')
-        }
-        
-        print(f"    [ADDED] {place.get('name')}")
+        run_sharded(args, SCAN_CONFIG.updated_from(args.config) if args.config else SCAN_CONFIG)
+        return
     
-    def enrich_with_details(self) -> None:
-        """Fetch detailed information for all found places"""
-        print(f"\nEnriching {len(self.found_places)} places with detailed information...")
-        
-        for i, (place_id, place_data) in enumerate(self.found_places.items(), 1):
-            print(f"  [{i}/{len(self.found_places)}] {place_data['name']}")
-            
-            details = self.get_place_details(place_id)
-            if details:
-                # Update with detailed info
-                place_data['formatted_address'] = details.get('formatted_address', place_data['address'])
-                place_data['phone'] = details.get('formatted_phone_number', '')
-                place_data['website'] = details.get('website', '')
-                
-                # Opening hours
-                opening_hours = details.get('opening_hours', {})
-                place_data['hours'] = '; '.join(opening_hours.get('weekday_text', []))
-                place_data['is_open_now'] = opening_hours.get('open_now', None)
-                
-                # Editorial summary
-                editorial = details.get('editorial_summary', {})
-                place_data['description'] = editorial.get('overview', '')
-            
-            # Rate limiting
-            if i % 10 == 0:
-                time.sleep(1)
+    api_key = None if args.replay else load_api_key()
+    if args.replay:
+        print(f"Replay mode: serving all requests from {args.cache_path}")
+    elif not api_key:
+        print("Error: PLACES_API_KEY not found in .Renv file")
+        return
+    else:
+        print(f"Using Google Places API Key: {api_key[:10]}...")
     
-    def search_all(self) -> pd.DataFrame:
-        """Execute comprehensive search"""
-        print("=" * 80)
-        print("ELLIS-0: COMPREHENSIVE EDMONTON CAFE SEARCH")
-        print("=" * 80)
-        
-        # Generate search grid
-        grid_points = self.generate_search_grid()
-        
-        # Search each grid point with different types and keywords
-        total_searches = len(grid_points) * (len(SEARCH_TYPES) + len(SEARCH_KEYWORDS))
-        current = 0
-        
-        print(f"\nExecuting {total_searches} searches across {len(grid_points)} grid points...")
-        print("This will take a while to ensure comprehensive coverage.\n")
-        
-        for i, point in enumerate(grid_points, 1):
-            print(f"\nGrid Point {i}/{len(grid_points)}: ({point['lat']:.4f}, {point['lng']:.4f})")
-            
-            # Search by type
-            for search_type in SEARCH_TYPES:
-                current += 1
-                print(f"  Search {current}/{total_searches}: type={search_type}")
-                results = self.search_nearby(point, search_type=search_type)
-                for place in results:
-                    self.process_place(place)
-                time.sleep(0.5)  # Rate limiting
-            
-            # Search by keyword
-            for keyword in SEARCH_KEYWORDS:
-                current += 1
-                print(f"  Search {current}/{total_searches}: keyword={keyword}")
-                results = self.search_nearby(point, keyword=keyword)
-                for place in results:
-                    self.process_place(place)
-                time.sleep(0.5)  # Rate limiting
-            
-            print(f"  Total unique cafes found so far: {len(self.found_places)}")
-        
-        # Enrich with details
-        self.enrich_with_details()
-        
-        # Convert to DataFrame
-        df = pd.DataFrame.from_dict(self.found_places, orient='index')
-        
-        # Sort by name
-        df = df.sort_values('name')
-        
-        return df
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_path, ttls=CACHE_TTL, max_bytes=CACHE_MAX_BYTES,
+                              replay=args.replay)
     
-    def save_results(self, df: pd.DataFrame) -> str:
-        """Save results to CSV and convert to RDS"""
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        
-        # Save CSV
-        csv_file = os.path.join(OUTPUT_DIR, 'ellis-0-scan.csv')
-        df.to_csv(csv_file, index=False, encoding='utf-8')
-        print(f"\nCSV saved to: {csv_file}")
-        
-        # Convert to RDS using R
-        rds_file = os.path.join(OUTPUT_DIR, 'ellis-0-scan.rds')
-        try:
-            r_code = f"""
-            library(readr)
-            df <- read_csv('{csv_file}')
-            saveRDS(df, '{rds_file}')
-            """
-            subprocess.run(['Rscript', '-e', r_code], check=True)
-            print(f"RDS saved to: {rds_file}")
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: Could not convert to RDS: {e}")
-            print("You may need to install R or required packages")
-        
-        # Save to SQLite database
-        db_path = 'data-private/derived/global-data.sqlite'
-        db_dir = os.path.dirname(db_path)
-        os.makedirs(db_dir, exist_ok=True)
-        
-        try:
-            import sqlite3
-            conn = sqlite3.connect(db_path)
-            df.to_sql('ellis_0_cafes', conn, if_exists='replace', index=False)
-            conn.close()
-            print(f"SQLite table 'ellis_0_cafes' saved to: {db_path}")
-            print(f"  Records: {len(df)}")
-        except Exception as e:
-            print(f"Warning: Could not save to SQLite: {e}")
-        
-        return csv_file
-
-
-# ---- main-function ----------
-def main():
-    """Main execution function"""
-    if not PLACES_API_KEY:
-        print("Error: PLACES_API_KEY not found in .env file")
+    journal = ScanJournal(args.journal_path, fsync_every=JOURNAL_FSYNC_EVERY)
+    state = journal.load() if args.resume else None
+    if state and state.header.get('coverage', args.coverage) != args.coverage:
+        print(f"Error: journal was written with --coverage {state.header['coverage']}; "
+              f"resume with the same coverage mode")
         return
+    journal.open(resume=args.resume and bool(state.header),
+                 header={'coverage': args.coverage, 'started_at': datetime.now().isoformat()})
     
-    print(f"Using Google Places API Key: {PLACES_API_KEY[:10]}...")
+    sink = None
+    sink_kinds = set(args.sink) | ({'sqlite'} if args.stream_only else set())
+    if sink_kinds:
+        sinks = []
+        for kind in sorted(sink_kinds):
+            path = SINK_PATHS[kind]
+            if kind == 'csv':
+                sinks.append(CsvSink(path, PLACE_COLUMNS + DETAIL_COLUMNS))
+            elif kind == 'jsonl':
+                sinks.append(JsonlSink(path))
+            else:
+                sinks.append(SqliteSink(path, PLACE_COLUMNS + DETAIL_COLUMNS))
+            print(f"Streaming places to {path}")
+        sink = SinkWriter(sinks, batch_size=SINK_BATCH_SIZE, max_delay=SINK_MAX_DELAY)
     
-    fetcher = EdmontonCafeFetcher(PLACES_API_KEY)
+    config = SCAN_CONFIG.updated_from(args.config) if args.config else SCAN_CONFIG
+    fetcher = CafeFetcher(
+        api_key,
+        config=config,
+        requests_per_second=args.rps,
+        max_in_flight=args.max_in_flight,
+        cache=cache,
+        journal=journal,
+        sink=sink
+    )
+    fetcher.retain_places = not args.stream_only
+    fetcher.quiet = args.quiet
+    if args.boundary:
+        fetcher.load_boundary(args.boundary)
+    if args.prune:
+        fetcher.planner = QueryPlanner(threshold=args.prune_threshold, audit_rate=PRUNE_AUDIT_RATE)
+    if state:
+        fetcher.resume_from(state)
+    if args.incremental:
+        fetcher.load_known_places(DB_PATH, DB_TABLE, stale_days=args.stale_days)
+    if args.max_calls is not None or args.max_cost is not None:
+        fetcher.budget = ScanBudget(max_calls=args.max_calls, max_cost=args.max_cost)
+        print(f"Budget: {fetcher.budget.describe()} (resume with --resume to spend more)")
+    if args.prioritize or fetcher.budget:
+        history = fetcher.known_places or load_places(DB_PATH, DB_TABLE)
+        fetcher.scheduler = PriorityScheduler.from_places(config.bounds, history.values())
+        print(f"Prioritizing search circles by {len(history)} known cafes and distance from the centre")
     
     try:
         # Execute comprehensive search
-        df = fetcher.search_all()
-        
-        # Save results
-        fetcher.save_results(df)
+        df = fetcher.search_all(coverage=args.coverage, pipeline=args.pipeline)
+        
+        if fetcher.budget_exhausted:
+            # A partial scan must not replace the full outputs (or delete unseen rows from the table)
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            with open(PLAN_PATH, 'w', encoding='utf-8') as f:
+                json.dump(fetcher.budget_plan(), f, indent=2)
+            from scan.outputs import CsvOutput
+            CsvOutput(os.path.join(OUTPUT_DIR, 'ellis-0-scan_partial.csv')).write(df, fetcher)
+            print(f"Remaining work saved to: {PLAN_PATH}")
+            print(f"Budget spent ({fetcher.budget.describe()}); re-run with --resume and a new budget to continue.")
+            return
         
-        # Print summary statistics
-        print("\n" + "=" * 80)
-        print("SUMMARY STATISTICS")
-        print("=" * 80)
-        print(f"Total cafes: {len(df)}")
-        print(f"With ratings: {df['rating'].notna().sum()}")
-        print(f"Average rating: {df['rating'].mean():.2f}")
-        print(f"With phone: {df['phone'].notna().sum()}")
-        print(f"With website: {df['website'].notna().sum()}")
-        print(f"Operational: {(df['business_status'] == 'OPERATIONAL').sum()}")
-        print(f"Temporarily closed: {(df['business_status'] == 'CLOSED_TEMPORARILY').sum()}")
-        print(f"Permanently closed: {(df['business_status'] == 'CLOSED_PERMANENTLY').sum()}")
+        # Save results to every output target
+        print()
+        fetcher.save_results(df, output_targets([f for f in args.formats.split(',') if f], args.transform))
         
-        print("\nTop 10 highest rated cafes:")
-        top_rated = df[df['user_ratings_total'] >= 20].nlargest(10, 'rating')
-        for _, row in top_rated.iterrows():
-            print(f"  {row['name']}: {row['rating']} ⭐ ({row['user_ratings_total']} reviews)")
+        print_summary(df.to_dict('records'))
         
     except KeyboardInterrupt:
         print("\n\nSearch interrupted by user.")
-        if fetcher.found_places:
+        if sink:
+            print(f"Places found so far are in the stream files ({', '.join(sorted(sink_kinds))})")
+        if fetcher.found_places and fetcher.retain_places:
             print(f"Saving {len(fetcher.found_places)} cafes found so far...")
-            df = pd.DataFrame.from_dict(fetcher.found_places, orient='index')
+            df = fetcher.found_places.to_frame()
             output_dir = 'data-private/derived/ellis-0'
             os.makedirs(output_dir, exist_ok=True)
             csv_file = os.path.join(output_dir, 'ellis-0-scan_partial.csv')
             df.to_csv(csv_file, index=False, encoding='utf-8')
             print(f"Partial results saved to: {csv_file}")
+        print(f"Progress is journaled in {args.journal_path}; re-run with --resume to continue.")
     except Exception as e:
         print(f"\nError: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        journal.close()
+        if sink:
+            sink.close()
+        if cache:
+            print(f"\nResponse cache: {cache.summary()}")
+            cache.close()
 
 
 if __name__ == "__main__":
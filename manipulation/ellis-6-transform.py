@@ -0,0 +1,80 @@
+#' ---
+#' title: "Ellis-6: Data Transformation and Neighborhood Assignment"
+#' subtitle: "Combine cafe locations with neighborhood demographics (Python)"
+#' author: "RG-FIDES Research Team"
+#' date: "last Updated: `python -c 'from datetime import date; print(date.today())'`"
+#' ---
+#+ echo=FALSE
+# python manipulation/ellis-6-transform.py  # run from project root
+
+"""
+ELLIS-6: NEIGHBOURHOOD DEMOGRAPHICS FOR SCANNED CAFES
+=====================================================
+
+Purpose:
+  Python version of ellis-6-transform.R without the R + sf round trip:
+  assigns every cafe to its neighbourhood with a vectorized
+  point-in-polygon join, then adds population, area and density. Each
+  venue counts once: listings that ellis-0 resolved to another place_id
+  (drive-thru, kiosk, old pin) are dropped, as in ellis-6-transform.R.
+  `python manipulation/ellis-0-scan.py --transform` runs the same step
+  right after a scan, in the same process.
+
+Input Files:
+  - data-private/derived/ellis-0/ellis-0-scan.csv (cafes)
+  - data-private/derived/ellis-0/ellis-0-scan-venue-ids.csv (place_id to
+    venue_id; optional)
+  - data-private/derived/ellis-4-open-data/ellis-4-open-data.csv
+    (neighbourhood polygons as WKT; a .geojson path also works)
+  - data-private/derived/ellis-5-open-data/ellis-5-open-data.csv (population)
+
+Output Files:
+  - data-private/derived/ellis-6-transform/ellis-6-transform.csv / .rds
+  - SQLite table ellis_6_cafes_with_demographics in global-data.sqlite
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from scan.neighbourhoods import run_transform
+
+# ---- declare-globals -------
+ELLIS_0_CSV = 'data-private/derived/ellis-0/ellis-0-scan.csv'
+ELLIS_0_VENUE_IDS_CSV = 'data-private/derived/ellis-0/ellis-0-scan-venue-ids.csv'
+ELLIS_4_CSV = 'data-private/derived/ellis-4-open-data/ellis-4-open-data.csv'
+ELLIS_5_CSV = 'data-private/derived/ellis-5-open-data/ellis-5-open-data.csv'
+OUTPUT_DIR = 'data-private/derived/ellis-6-transform'
+DB_PATH = 'data-private/derived/global-data.sqlite'
+
+
+# ---- main-function ----------
+def main():
+    parser = argparse.ArgumentParser(description="Assign scanned cafes to neighbourhoods with demographics")
+    parser.add_argument('--cafes', default=ELLIS_0_CSV, help=f"scan CSV (default: {ELLIS_0_CSV})")
+    parser.add_argument('--venue-ids', default=ELLIS_0_VENUE_IDS_CSV,
+                        help=f"place_id to venue_id map, used when it exists (default: {ELLIS_0_VENUE_IDS_CSV})")
+    parser.add_argument('--neighbourhoods', default=ELLIS_4_CSV,
+                        help=f"polygons: CSV with WKT the_geom, or GeoJSON (default: {ELLIS_4_CSV})")
+    parser.add_argument('--population', default=ELLIS_5_CSV, help=f"population CSV (default: {ELLIS_5_CSV})")
+    args = parser.parse_args()
+
+    for path in (args.cafes, args.neighbourhoods, args.population):
+        if not os.path.exists(path):
+            print(f"Error: input file not found: {path}")
+            sys.exit(1)
+
+    cafes = pd.read_csv(args.cafes)
+    print(f"Loaded {len(cafes)} cafes from {args.cafes}")
+    if os.path.exists(args.venue_ids):
+        venues = pd.read_csv(args.venue_ids)
+        extra_listings = venues.loc[~venues['is_canonical'].astype(bool), 'place_id']
+        cafes = cafes[~cafes['place_id'].isin(extra_listings)]
+        print(f"- Kept {len(cafes)} venues (without listings resolved to another place_id)")
+    run_transform(cafes, args.neighbourhoods, args.population, OUTPUT_DIR, DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
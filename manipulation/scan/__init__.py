@@ -0,0 +1,44 @@
+"""
+Shared building blocks for the Google Places cafe fetchers.
+
+The hyphenated files in this directory (e.g. `cafe-fetcher-comprehensive.py`)
+are runnable scripts; the modules below are imported by
+`manipulation/ellis-0-scan.py` as `scan.<module>`:
+
+  budget     - call/cost budget with Details reservations and
+               value-first ordering of search circles
+  cache      - SQLite response cache with TTLs, LRU eviction and replay
+  classifier - cafe include/exclude/type rules compiled from cafe-rules.json
+  deferred   - in-order runner for multi-step jobs that park their next
+               step in a due-time heap (page token waits)
+  engine     - the scan itself: ScanConfig plus the CafeFetcher both
+               scripts run (coverage, search, filtering, details)
+  geometry   - great-circle distances, hexagonal circle cover and its
+               coverage verification, prepared boundary polygons
+  journal    - append-only checkpoint journal behind --resume
+  metrics    - per-endpoint latency histograms, status/byte/page counts,
+               JSON and Prometheus export, quiet-mode progress line
+  mockapi    - local HTTP stand-in for Nearby Search / Place Details with
+               pagination, latency and injected errors (benchmark-scan.py)
+  neighbourhoods - vectorized cafe-to-neighbourhood join with area and
+               population density (the ellis-6 transform)
+  outputs    - output targets (CSV, RDS, Parquet/Feather, index, venues,
+               SQLite, transform) that save_results writes the final frame to
+  pipeline   - bounded producer/consumer queue for overlapping phases
+  placestore - columnar found_places store with interned values and a
+               place_id index
+  planner    - yield-driven ordering and pruning of type/keyword queries
+  quadtree   - adaptive cells that split where Nearby Search saturates
+  ratelimit  - thread-safe token bucket for pacing API calls
+  retry      - status classes, jittered exponential backoff, adaptive
+               request rate and circuit breaker for API calls
+  rds        - pure-Python saveRDS writer for the results frame
+  resolve    - duplicate-listing resolution: geohash blocking, name and
+               address matching, union-find venue clusters
+  shard      - sharded scans: plan circles into a work queue, worker
+               loop, deterministic merge by place_id
+  sinks      - batched CSV/JSONL/SQLite writers for streaming results
+  spatial    - grid index for batched radius and nearest-neighbour queries
+  storage    - keyed places schema and upserts in global-data.sqlite
+  workqueue  - SQLite work queue with leases, shared by worker processes
+"""
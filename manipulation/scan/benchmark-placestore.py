@@ -0,0 +1,110 @@
+"""
+Memory benchmark for CafeFetcher.found_places (scan/placestore.py)
+
+Builds the places of a large synthetic scan twice, as the dict per place
+that found_places used to hold and as a PlaceStore, from freshly decoded
+JSON responses (as the API client produces them), and reports the memory
+each retains, bytes per place and the time to build the final DataFrame:
+
+  python manipulation/scan/benchmark-placestore.py --places 100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Shared modules live in the `scan` package one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.engine import CafeFetcher, ScanConfig
+from scan.mockapi import PlacesDataset
+from scan.placestore import PlaceStore
+
+BENCHMARK_CONFIG = ScanConfig(
+    bounds={'north': 53.7, 'south': 53.4, 'east': -113.3, 'west': -113.7},
+    area_margin=1.0,
+    title='BENCHMARK: PLACE STORE',
+)
+
+
+def cafe_dataset(fetcher: CafeFetcher, cafes: int, seed: int) -> PlacesDataset:
+    """Synthetic places cut right after the `cafes`-th one the classifier accepts
+    (the other businesses in between are skipped, as in a scan)"""
+    size = cafes
+    while True:
+        dataset = PlacesDataset.synthetic(size, BENCHMARK_CONFIG.bounds, seed=seed)
+        accepted = [i for i, place in enumerate(dataset.places) if fetcher.is_likely_cafe(place)]
+        if len(accepted) >= cafes:
+            break
+        size = int(size * cafes / max(1, len(accepted)) * 1.05) + 1
+    kept = dataset.places[:accepted[cafes - 1] + 1] if cafes else []
+    return PlacesDataset(kept, dataset.details)
+
+
+def accepted_places(fetcher: CafeFetcher, dataset: PlacesDataset):
+    """(search result, details result) per accepted place, each decoded from JSON anew"""
+    for place in dataset.places:
+        raw = json.loads(json.dumps(place))
+        if fetcher.is_likely_cafe(raw):
+            yield raw, json.loads(json.dumps(dataset.place_details(raw['place_id'])))
+
+
+def build(fetcher: CafeFetcher, dataset: PlacesDataset, store) -> None:
+    """Fill `store` ({} or a PlaceStore) through process_place and detail_fields"""
+    fetcher.found_places = PlaceStore()
+    for raw, details in accepted_places(fetcher, dataset):
+        fetcher.process_place(raw)
+        place_id = raw['place_id']
+        if place_id not in fetcher.found_places:
+            continue
+        record = fetcher.found_places[place_id]
+        fields = fetcher.detail_fields(record, details)
+        if isinstance(store, dict):
+            store[place_id] = record
+            record.update(fields)
+        else:
+            store.add(record)
+            store.update(place_id, fields)
+        fetcher.found_places = PlaceStore()  # only `store` keeps anything
+
+
+def measure(label: str, fetcher: CafeFetcher, dataset: PlacesDataset, store) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    build(fetcher, dataset, store)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    df = pd.DataFrame.from_dict(store, orient='index') if isinstance(store, dict) else store.to_frame()
+    frame_s = time.perf_counter() - started
+    print(f"  {label:<14} {len(store):>8} places  {retained / 2 ** 20:>8.1f} MiB  "
+          f"{retained / max(1, len(store)):>6.0f} B/place  frame {frame_s:.2f} s")
+    return {'places': len(store), 'bytes': retained, 'frame_s': frame_s, 'frame': df}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare found_places memory: dict per place vs PlaceStore")
+    parser.add_argument('--places', type=int, default=100000,
+                        help="places stored, more are generated as some are not cafes (default: 100000)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fetcher = CafeFetcher('benchmark', BENCHMARK_CONFIG)
+    fetcher.quiet = True
+    dataset = cafe_dataset(fetcher, args.places, args.seed)
+    print(f"Found places with details, {args.places} of {len(dataset)} synthetic places:")
+    old = measure('dict of dicts', fetcher, dataset, {})
+    new = measure('PlaceStore', fetcher, dataset, PlaceStore())
+    same = old['frame'].equals(new['frame'])
+    print(f"  saving: {(old['bytes'] - new['bytes']) / 2 ** 20:.1f} MiB "
+          f"({1 - new['bytes'] / old['bytes']:.0%}); identical DataFrames: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark for venue resolution (scan/resolve.py)
+
+Builds a multi-city synthetic scan (PlacesDataset.synthetic per city) and
+adds extra listings of a share of its places, the way Google duplicates
+venues: a drive-thru or kiosk listing at the same spot, a second pin for
+the same address, and a permanently closed listing next to a relocated
+cafe. Reports the time resolve_venues() takes, how many of the added
+listings it folded into their venue, and how many other places it merged.
+The first --check-places places (with their extra listings) are also
+resolved by comparing every pair, which must give the same clusters:
+
+  python manipulation/scan/benchmark-resolve.py --places 100000
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Shared modules live in the `scan` package one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.geometry import METRES_PER_DEGREE_LAT
+from scan.mockapi import PlacesDataset
+from scan.resolve import (MATCH_RADIUS_M, SAME_SPOT_M, UnionFind, canonical_venues, names_match,
+                          normalize_address, normalize_name, resolve_venues)
+from scan.spatial import haversine_np
+
+CITIES = {
+    'edmonton': {'north': 53.7, 'south': 53.4, 'east': -113.3, 'west': -113.7},
+    'calgary': {'north': 51.2, 'south': 50.85, 'east': -113.85, 'west': -114.3},
+    'saskatoon': {'north': 52.2, 'south': 52.05, 'east': -106.55, 'west': -106.8},
+    'winnipeg': {'north': 49.98, 'south': 49.75, 'east': -96.95, 'west': -97.3},
+    'vancouver': {'north': 49.32, 'south': 49.2, 'east': -123.02, 'west': -123.27},
+}
+VARIANTS = ['drive-thru', 'kiosk', 'second pin', 'relocated']
+
+
+def scan_records(places: int, seed: int) -> pd.DataFrame:
+    """ellis-0-scan.csv-like records spread over CITIES"""
+    rows = []
+    for k, (city, bounds) in enumerate(CITIES.items()):
+        dataset = PlacesDataset.synthetic(places // len(CITIES), bounds, seed=seed + k)
+        for place in dataset.places:
+            details = dataset.place_details(place['place_id'])
+            rows.append({
+                'place_id': f"{city}_{place['place_id']}",
+                'name': place['name'],
+                'address': place['vicinity'],
+                'lat': place['geometry']['location']['lat'],
+                'lng': place['geometry']['location']['lng'],
+                'business_status': place['business_status'],
+                'user_ratings_total': place.get('user_ratings_total'),
+                'formatted_address': details['formatted_address'],
+                'phone': details['formatted_phone_number'],
+            })
+    return pd.DataFrame(rows)
+
+
+def offset(lat: float, lng: float, metres: float, rng: random.Random):
+    bearing = rng.uniform(0, 2 * math.pi)
+    dlat = metres * math.cos(bearing) / METRES_PER_DEGREE_LAT
+    dlng = metres * math.sin(bearing) / (METRES_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+    return round(lat + dlat, 7), round(lng + dlng, 7)
+
+
+def add_duplicates(df: pd.DataFrame, share: float, seed: int):
+    """df plus extra listings of `share` of its places; return (frame, {extra place_id: original})"""
+    rng = random.Random(seed)
+    extra, truth = [], {}
+    for row in df.sample(frac=share, random_state=seed).to_dict('records'):
+        variant = rng.choice(VARIANTS)
+        copy = dict(row, place_id=f"{row['place_id']}_dup", user_ratings_total=rng.randint(0, 20))
+        if variant == 'drive-thru':
+            copy['name'] = f"{row['name']} Drive-Thru"
+            copy['lat'], copy['lng'] = offset(row['lat'], row['lng'], rng.uniform(5, 40), rng)
+        elif variant == 'kiosk':
+            copy['name'] = f"{row['name']} (Kiosk)"
+            copy['lat'], copy['lng'] = offset(row['lat'], row['lng'], rng.uniform(0, 30), rng)
+            copy['formatted_address'] = f"Unit {rng.randint(1, 99)}, {row['formatted_address']}"
+        elif variant == 'second pin':
+            copy['lat'], copy['lng'] = offset(row['lat'], row['lng'], rng.uniform(50, 140), rng)
+        else:
+            copy['business_status'] = 'CLOSED_PERMANENTLY'
+            copy['lat'], copy['lng'] = offset(row['lat'], row['lng'], rng.uniform(50, 140), rng)
+            number, street = row['address'].split(' ', 1)
+            copy['address'] = f"{int(number) + rng.randint(20, 200)} {street}"
+            copy['formatted_address'] = None
+        extra.append(copy)
+        truth[copy['place_id']] = row['place_id']
+    return pd.concat([df, pd.DataFrame(extra)], ignore_index=True), truth
+
+
+def all_pairs_clusters(df: pd.DataFrame) -> np.ndarray:
+    """Cluster roots from comparing every pair of places (the O(n^2) reference)"""
+    lat, lng = df['lat'].to_numpy(), df['lng'].to_numpy()
+    names = [normalize_name(name) for name in df['name']]
+    addresses = [normalize_address(a) for a in df['formatted_address'].fillna(df['address'])]
+    closed = (df['business_status'] == 'CLOSED_PERMANENTLY').to_numpy()
+    union = UnionFind(len(df))
+    for a in range(len(df)):
+        dist = haversine_np(lat[a], lng[a], lat[a + 1:], lng[a + 1:])
+        for b in np.flatnonzero(dist <= MATCH_RADIUS_M) + a + 1:
+            metres = dist[b - a - 1]
+            if names_match(names[a], names[b]) and (metres <= SAME_SPOT_M or (
+                    addresses[a] and addresses[a] == addresses[b]) or closed[a] or closed[b]):
+                union.union(a, b)
+    return union.roots()
+
+
+def same_partition(a: np.ndarray, b: np.ndarray) -> bool:
+    pairs = set(zip(a.tolist(), b.tolist()))
+    return len(pairs) == len(set(a.tolist())) == len(set(b.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time venue resolution and check it against injected duplicates")
+    parser.add_argument('--places', type=int, default=100000, help="synthetic places (default: 100000)")
+    parser.add_argument('--duplicates', type=float, default=0.05, help="share of places listed twice")
+    parser.add_argument('--check-places', type=int, default=3000,
+                        help="places also resolved by comparing all pairs (default: 3000)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df, truth = add_duplicates(scan_records(args.places, args.seed), args.duplicates, args.seed)
+    print(f"{len(df)} listings in {len(CITIES)} cities, {len(truth)} of them extra listings of a venue")
+
+    started = time.perf_counter()
+    venues = resolve_venues(df)
+    resolve_s = time.perf_counter() - started
+    started = time.perf_counter()
+    records = canonical_venues(df, venues)
+    records_s = time.perf_counter() - started
+
+    venue_of = dict(zip(venues['place_id'], venues['venue_id']))
+    found = sum(venue_of[extra] == venue_of[original] for extra, original in truth.items())
+    originals = venues[~venues['place_id'].isin(list(truth))]
+    merged = len(originals) - originals['venue_id'].nunique()
+    print(f"  resolve_venues    {resolve_s:6.2f} s  ({len(df) / resolve_s:,.0f} listings/s)")
+    print(f"  canonical_venues  {records_s:6.2f} s  -> {len(records)} venues")
+    print(f"  extra listings folded into their venue: {found}/{len(truth)} ({found / len(truth):.1%})")
+    print(f"  other places merged: {merged} ({merged / len(originals):.2%}; synthetic names repeat, "
+          f"so some are the same name within {SAME_SPOT_M:g} m)")
+
+    # The first places with their extra listings
+    kept = set(df['place_id'].head(args.check_places))
+    subset = df[df['place_id'].isin(kept | {extra for extra, original in truth.items() if original in kept})]
+    started = time.perf_counter()
+    reference = all_pairs_clusters(subset)
+    all_pairs_s = time.perf_counter() - started
+    started = time.perf_counter()
+    blocked = resolve_venues(subset)['venue_id'].to_numpy()
+    blocked_s = time.perf_counter() - started
+    print(f"  first {len(subset)} places: all pairs {all_pairs_s:.2f} s, blocked {blocked_s:.3f} s, "
+          f"identical clusters: {same_partition(reference, blocked)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Scan benchmark against the local mock Places API (scan/mockapi.py)
+
+Runs CafeFetcher.search_all (search plus enrich_with_details) against a
+synthetic or recorded dataset served over HTTP, so performance changes can
+be measured without spending quota. Reports wall time, time spent in the
+details phase, API calls per second, peak RSS and recall (share of the
+dataset's cafes inside the scan area that the scan found), and saves them
+as JSON for comparison between versions:
+
+  python manipulation/scan/benchmark-scan.py --max-in-flight 8 --label hex --coverage hex
+  python manipulation/scan/benchmark-scan.py --compare data-private/derived/benchmarks/<earlier>.json
+
+The mock server runs in a separate process, so its memory and CPU stay out
+of the measurements.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from urllib.request import urlopen
+
+import pandas as pd
+
+# Shared modules live in the `scan` package one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.budget import PriorityScheduler, ScanBudget
+from scan.engine import CafeFetcher, ScanConfig
+from scan.mockapi import PlacesDataset, serve
+from scan.planner import QueryPlanner
+from scan.retry import CircuitBreaker, RetryPolicy
+
+# Same area and queries as ellis-0-scan.py
+BENCHMARK_CONFIG = ScanConfig(
+    bounds={'north': 53.7, 'south': 53.4, 'east': -113.3, 'west': -113.7},
+    title='BENCHMARK: MOCK PLACES API SCAN',
+)
+OUTPUT_DIR = 'data-private/derived/benchmarks'
+# Compared by --compare: (metric, True when higher is better)
+KEY_METRICS = [('wall_time_s', False), ('details_phase_s', False), ('calls_per_sec', True),
+               ('api_calls', False), ('peak_rss_mb', False), ('recall', True)]
+
+
+class TimedFetcher(CafeFetcher):
+    """CafeFetcher that records how long the details phase takes"""
+
+    details_seconds = 0.0
+
+    def enrich_with_details(self) -> None:
+        started = time.perf_counter()
+        super().enrich_with_details()
+        self.details_seconds += time.perf_counter() - started
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the cafe scan against a local mock Places API")
+    data = parser.add_argument_group('dataset')
+    data.add_argument('--places', type=int, default=5000, help="synthetic places to generate (default: 5000)")
+    data.add_argument('--seed', type=int, default=0, help="seed for the dataset and injected faults")
+    data.add_argument('--recorded', help="serve places from an earlier scan CSV instead of synthetic ones")
+    data.add_argument('--config', help="JSON ScanConfig overrides (see scan/engine.py)")
+    server = parser.add_argument_group('mock server')
+    server.add_argument('--latency', type=float, default=0.02, help="mean response time in seconds (default: 0.02)")
+    server.add_argument('--jitter', type=float, default=0.5, help="latency varies by this share (default: 0.5)")
+    server.add_argument('--error-rate', type=float, default=0.0, help="share of requests failing with HTTP 500")
+    server.add_argument('--quota-rate', type=float, default=0.0, help="share of requests answered OVER_QUERY_LIMIT")
+    server.add_argument('--qps-limit', type=float, help="answer OVER_QUERY_LIMIT above this many requests/second")
+    server.add_argument('--token-delay', type=float, default=0.1,
+                        help="seconds before a next_page_token is valid (Google: ~2; default: 0.1)")
+    scan = parser.add_argument_group('scan')
+    scan.add_argument('--coverage', choices=['lattice', 'hex', 'adaptive'], default='lattice')
+    scan.add_argument('--rps', type=float, default=1000.0, help="fetcher rate limit (default: 1000)")
+    scan.add_argument('--max-in-flight', type=int, default=8)
+    scan.add_argument('--pipeline', action='store_true')
+    scan.add_argument('--prune', action='store_true')
+    scan.add_argument('--max-calls', type=int, help="call budget")
+    scan.add_argument('--max-cost', type=float, help="cost budget in USD")
+    scan.add_argument('--prioritize', action='store_true', help="order search circles by known cafe density")
+    scan.add_argument('--history', help="earlier scan CSV whose cafes guide --prioritize")
+    scan.add_argument('--retry-delay', type=float, default=0.05,
+                      help="first retry backoff in seconds, doubling per attempt (production: 1; default: 0.05)")
+    scan.add_argument('--breaker-cooldown', type=float, default=1.0,
+                      help="seconds the circuit breaker stays open (production: 30; default: 1)")
+    parser.add_argument('--label', default='', help="free-text tag stored with the result")
+    parser.add_argument('--output', help=f"result JSON path (default: {OUTPUT_DIR}/scan-benchmark-<time>.json)")
+    parser.add_argument('--compare', help="earlier result JSON to print changes against")
+    parser.add_argument('--verbose', action='store_true', help="show the fetcher's progress output")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    config = BENCHMARK_CONFIG.updated_from(args.config) if args.config else BENCHMARK_CONFIG
+    if args.recorded:
+        dataset = PlacesDataset.from_csv(args.recorded)
+    else:
+        dataset = PlacesDataset.synthetic(args.places, config.bounds, seed=args.seed)
+
+    url_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(dataset, url_queue), daemon=True, kwargs=dict(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        over_query_limit_rate=args.quota_rate, qps_limit=args.qps_limit,
+        token_delay=args.token_delay, seed=args.seed))
+    server.start()
+    try:
+        url = url_queue.get(timeout=30)
+        fetcher = TimedFetcher('mock-key', config, requests_per_second=args.rps,
+                               max_in_flight=args.max_in_flight, api_base_url=url)
+        fetcher.page_token_delay = args.token_delay
+        fetcher.retry_policy = RetryPolicy(base_delay=args.retry_delay, max_delay=args.retry_delay * 60,
+                                           seed=args.seed)
+        fetcher.breaker = CircuitBreaker(cooldown=args.breaker_cooldown)
+        fetcher.quiet = not args.verbose
+        if args.prune:
+            fetcher.planner = QueryPlanner()
+        if args.max_calls is not None or args.max_cost is not None:
+            fetcher.budget = ScanBudget(max_calls=args.max_calls, max_cost=args.max_cost)
+        if args.prioritize:
+            history = pd.read_csv(args.history).to_dict('records') if args.history else []
+            fetcher.scheduler = PriorityScheduler.from_places(config.bounds, history)
+
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if args.verbose else devnull):
+            df = fetcher.search_all(coverage=args.coverage, pipeline=args.pipeline)
+        wall = time.perf_counter() - started
+        with urlopen(f"{url}/stats") as response:
+            server_stats = json.load(response)
+    finally:
+        server.terminate()
+        server.join()
+
+    # Every place a perfect scan would keep: in the area and accepted by the rules
+    truth = {p['place_id'] for p in dataset.places
+             if fetcher.is_in_area(p['geometry']['location']['lat'], p['geometry']['location']['lng'])
+             and fetcher.is_likely_cafe(p)}
+    found = set(df['place_id']) if len(df) else set()
+    with_details = int(df['formatted_address'].notna().sum()) if 'formatted_address' in df else 0
+
+    return {
+        'benchmark': 'scan',
+        'label': args.label,
+        'version': git_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'verbose')},
+        'dataset': {'places': len(dataset), 'cafes_in_area': len(truth)},
+        'metrics': {
+            'wall_time_s': round(wall, 3),
+            'details_phase_s': round(fetcher.details_seconds, 3),
+            'api_calls': fetcher.api_calls,
+            'calls_per_sec': round(fetcher.api_calls / wall, 1) if wall else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'rss_before_scan_mb': round(rss_before, 1),
+            'places_found': len(found),
+            'recall': round(len(found & truth) / len(truth), 4) if truth else None,
+            'details_coverage': round(with_details / len(found), 4) if found else None,
+            'budget_exhausted': fetcher.budget_exhausted,
+            'retries': sum(fetcher.metrics.retries.values()),
+            'dead_letters': len(fetcher.dead_letters),
+        },
+        'server': server_stats,
+        'api': fetcher.metrics.summary(),
+    }
+
+
+def print_result(result: dict, baseline: dict = None) -> None:
+    print("=" * 80)
+    print(f"SCAN BENCHMARK {result['label']}".rstrip())
+    print("=" * 80)
+    print(f"Version: {result['version']}  Dataset: {result['dataset']['places']} places, "
+          f"{result['dataset']['cafes_in_area']} cafes in area")
+    for name, value in result['metrics'].items():
+        line = f"  {name:<20} {value}"
+        old = (baseline or {}).get('metrics', {}).get(name)
+        if baseline and isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            line += f"  ({(value - old) / old * 100:+.1f}% vs {baseline.get('version', 'baseline')})"
+        print(line)
+    print(f"  server: {result['server']}")
+
+
+def main():
+    args = parse_args()
+    result = run_benchmark(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_result(result, baseline)
+
+    output = args.output or os.path.join(OUTPUT_DIR, f"scan-benchmark-{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResult saved to: {output}")
+
+    if baseline:
+        worse = [name for name, higher_is_better in KEY_METRICS
+                 if isinstance(baseline['metrics'].get(name), (int, float)) and baseline['metrics'][name]
+                 and ((result['metrics'][name] - baseline['metrics'][name]) / baseline['metrics'][name]
+                      * (1 if higher_is_better else -1)) < -0.1]
+        if worse:
+            print(f"Warning: more than 10% worse than the baseline in: {', '.join(worse)}")
+
+
+if __name__ == "__main__":
+    main()
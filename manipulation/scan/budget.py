@@ -0,0 +1,145 @@
+"""
+Call budgets and value-first ordering for scans that cannot afford everything.
+
+ScanBudget caps the calls (and/or dollars) a run may spend. Every real API
+call spends from it before it is made; when the next call doesn't fit,
+BudgetExhausted is raised and the fetcher stops cleanly, leaving the
+checkpoint journal to resume from. Accepted places that will need a
+Details call reserve it up front, so searching never spends the budget the
+new places' details need; when a reservation fails, the fetcher defers that
+place's details to a resumed run and starts no further search.
+
+PriorityScheduler orders search circles by expected new cafes per call:
+the density of cafes already known from the last scan inside each circle,
+with circles near the middle of the bounds ahead of outer ones (the only
+signal before any history exists). Under a budget the best areas are
+searched first, so a partial scan buys the most coverage.
+"""
+
+import math
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    from .spatial import PlaceIndex
+
+# USD per call at list price. Details pays for the Contact and Atmosphere
+# fields DETAIL_FIELDS asks for.
+DEFAULT_PRICES = {'nearbysearch': 0.032, 'details': 0.025}
+RESULTS_PER_PAGE = 20
+MAX_PAGES = 3
+
+
+class BudgetExhausted(Exception):
+    """The next API call would exceed the scan budget"""
+
+
+class ScanBudget:
+    """Thread-safe call/cost allowance with reservations"""
+
+    def __init__(self, max_calls: int = None, max_cost: float = None, prices: Dict[str, float] = None):
+        if max_calls is None and max_cost is None:
+            raise ValueError("ScanBudget needs max_calls, max_cost or both")
+        self.max_calls = max_calls
+        self.max_cost = max_cost
+        self.prices = dict(DEFAULT_PRICES, **(prices or {}))
+        self.spent: Counter = Counter()  # endpoint -> calls made
+        self.reserved: Counter = Counter()  # endpoint -> calls promised but not made yet
+        self._lock = threading.Lock()
+
+    def _totals(self, counts: Counter) -> tuple:
+        return sum(counts.values()), sum(n * self.prices.get(ep, 0.0) for ep, n in counts.items())
+
+    def _fits(self, endpoint: str) -> bool:
+        calls, cost = self._totals(self.spent + self.reserved)
+        if self.max_calls is not None and calls + 1 > self.max_calls:
+            return False
+        return self.max_cost is None or cost + self.prices.get(endpoint, 0.0) <= self.max_cost + 1e-9
+
+    def spend(self, endpoint: str) -> None:
+        """Account for one call, using a reservation for `endpoint` if there is one"""
+        with self._lock:
+            if self.reserved[endpoint] > 0:
+                self.reserved[endpoint] -= 1
+            elif not self._fits(endpoint):
+                raise BudgetExhausted(f"budget exhausted before a {endpoint} call ({self.describe()})")
+            self.spent[endpoint] += 1
+
+    def reserve(self, endpoint: str) -> bool:
+        """Set aside one future call; False if it no longer fits"""
+        with self._lock:
+            if not self._fits(endpoint):
+                return False
+            self.reserved[endpoint] += 1
+            return True
+
+    def release(self, endpoint: str) -> None:
+        """Give back a reservation that turned out not to be needed"""
+        with self._lock:
+            if self.reserved[endpoint] > 0:
+                self.reserved[endpoint] -= 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls, cost = self._totals(self.spent)
+            reserved_calls, _ = self._totals(self.reserved)
+            return {'max_calls': self.max_calls, 'max_cost': self.max_cost, 'calls': calls,
+                    'cost': round(cost, 4), 'by_endpoint': dict(self.spent), 'reserved': reserved_calls}
+
+    def describe(self) -> str:
+        calls, cost = self._totals(self.spent)
+        limits = [f"{calls}/{self.max_calls} calls" if self.max_calls is not None else f"{calls} calls",
+                  f"${cost:.2f}/${self.max_cost:.2f}" if self.max_cost is not None else f"${cost:.2f}"]
+        return ', '.join(limits)
+
+
+def expected_calls(n_results: float) -> int:
+    """Nearby Search calls (pages) a query returning about n_results needs"""
+    return min(MAX_PAGES, max(1, math.ceil(n_results / RESULTS_PER_PAGE)))
+
+
+class PriorityScheduler:
+    """Orders search tasks, circle by circle, by expected cafes per call"""
+
+    def __init__(self, bounds: Dict[str, float], known: 'PlaceIndex' = None, centrality_weight: float = 1.0):
+        self.bounds = bounds
+        self.known = known  # cafes from the last scan; None before any history exists
+        self.centrality_weight = centrality_weight
+
+    @classmethod
+    def from_places(cls, bounds: Dict[str, float], places: Iterable[Dict], **kwargs) -> 'PriorityScheduler':
+        """History from place records with lat/lng (e.g. the ellis_0_cafes table)"""
+        from .spatial import PlaceIndex  # numpy; only loaded when there is history to index
+        rows = [p for p in places if p.get('lat') is not None and p.get('lng') is not None]
+        known = PlaceIndex([p['place_id'] for p in rows], [p['lat'] for p in rows],
+                           [p['lng'] for p in rows]) if rows else None
+        return cls(bounds, known, **kwargs)
+
+    def centrality(self, point: Dict[str, float]) -> float:
+        """1 at the centre of the bounds, 0 at the corners"""
+        b = self.bounds
+        dy = (point['lat'] - (b['north'] + b['south']) / 2) / ((b['north'] - b['south']) / 2 or 1)
+        dx = (point['lng'] - (b['east'] + b['west']) / 2) / ((b['east'] - b['west']) / 2 or 1)
+        return max(0.0, 1 - math.hypot(dx, dy) / math.sqrt(2))
+
+    def circle_values(self, circles: List[tuple]) -> List[float]:
+        """Expected cafes per call for (point, radius) circles"""
+        known = [0] * len(circles)
+        if self.known is not None and circles:
+            positions, _ = self.known.query_radius([c[0]['lat'] for c in circles], [c[0]['lng'] for c in circles],
+                                                   [c[1] for c in circles])
+            known = [len(p) for p in positions]
+        return [(n + self.centrality_weight * self.centrality(point)) / expected_calls(n)
+                for n, (point, _) in zip(known, circles)]
+
+    def order(self, tasks: List[Any]) -> List[Any]:
+        """Tasks regrouped by circle (task.group), best circle first; ties and the
+        queries within a circle keep their original order"""
+        groups: Dict[Any, List[Any]] = {}
+        for task in tasks:
+            groups.setdefault(task.group, []).append(task)
+        keys = list(groups)
+        values = self.circle_values([(groups[k][0].point, groups[k][0].radius) for k in keys])
+        ranked = sorted(range(len(keys)), key=lambda i: (-values[i], i))
+        return [task for i in ranked for task in groups[keys[i]]]
@@ -0,0 +1,125 @@
+"""
+Persistent SQLite cache of Places API responses.
+
+Entries are keyed on the endpoint plus the normalized request parameters
+(sorted, with the API key removed), so identical queries from different
+runs, machines or keys share one entry. Each endpoint has its own TTL, the
+file is kept under a byte budget by evicting least-recently-used entries,
+and in replay mode lookups ignore TTLs so a pipeline can be re-run
+deterministically without network access.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    endpoint    TEXT NOT NULL,
+    body        BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Stable key for a request: endpoint plus sorted params without the API key"""
+    normalized = {k: str(v) for k, v in params.items() if k != 'key' and v is not None}
+    return endpoint + '?' + json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+
+
+class ResponseCache:
+    """Thread-safe on-disk response cache with per-endpoint TTLs and LRU eviction"""
+
+    def __init__(self, path: str, ttls: Dict[str, float] = None, max_bytes: int = 512 * 1024 * 1024,
+                 replay: bool = False):
+        self.path = path
+        self.ttls = ttls or {}
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, endpoint: str, params: Dict[str, Any]) -> Optional[Any]:
+        """Cached response for a request, or None if absent or expired"""
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            ttl = self.ttls.get(endpoint)
+            # Replay serves whatever is on disk, however old
+            if row is None or (not self.replay and ttl is not None and now - row[1] > ttl):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def has(self, endpoint: str, params: Dict[str, Any]) -> bool:
+        """Whether get() would answer the request from the cache (no hit is counted)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at FROM responses WHERE key = ?", (cache_key(endpoint, params),)
+            ).fetchone()
+        ttl = self.ttls.get(endpoint)
+        return row is not None and (self.replay or ttl is None or time.time() - row[0] <= ttl)
+
+    def put(self, endpoint: str, params: Dict[str, Any], data: Any) -> None:
+        """Store a response, evicting least-recently-used entries past max_bytes"""
+        if self.replay:
+            return
+        key = cache_key(endpoint, params)
+        body = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body), now, now)
+            )
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    def _evict(self, target_bytes: int) -> None:
+        """Delete least-recently-used entries until the cache is under target_bytes"""
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def summary(self) -> str:
+        return (f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+                f"{self._total_bytes / 1e6:.1f} MB on disk")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
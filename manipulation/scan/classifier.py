@@ -0,0 +1,163 @@
+"""
+Rule-driven cafe classifier.
+
+Include, exclude and type rules live in one file (cafe-rules.json, shared
+with clean-cafe-list.R) and are compiled once per profile. All name
+keywords go into a single trie-shaped regular expression, scanned with a
+lookahead so every keyword occurrence is seen in one pass over the name.
+Whole DataFrames or raw API result batches are classified in a single
+pass that also returns the reason for each decision:
+
+  exclude:<kw>  name contains an exclude keyword (always wins)
+  type:<type>   a listed place type matched
+  name:<kw>     name contains an include keyword
+  none          nothing matched
+
+Re-classifying an existing scan after a rule change:
+
+  python manipulation/scan/classifier.py data-private/derived/ellis-0/ellis-0-scan.csv --profile clean
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cafe-rules.json')
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation factored into a trie, longest continuation first"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        terminal = '' in node
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if terminal:
+            # Trying the longer continuation first, but ending here is also a match
+            return ('(?:' + body + ')?') if len(branches) == 1 else body + '?'
+        return body
+
+    return build(trie)
+
+
+class CafeClassifier:
+    """Compiled include/exclude/type rules for one profile of the rules file"""
+
+    def __init__(self, include: List[str], exclude: List[str], types: List[str],
+                 type_match: str = 'exact'):
+        if type_match not in ('exact', 'substring'):
+            raise ValueError(f"Unknown type_match: {type_match}")
+        self.include = [kw.lower() for kw in include]
+        self.exclude = [kw.lower() for kw in exclude]
+        self.types = [t.lower() for t in types]
+        self.type_match = type_match
+        self._type_set = set(self.types)
+        
+        # One automaton over every name keyword; the lookahead reports a match
+        # at each position, so overlapping keywords are all seen
+        self._name_regex = re.compile('(?=(' + _trie_pattern(set(self.include) | set(self.exclude)) + '))')
+        self._type_regex = re.compile('(?=(' + _trie_pattern(set(self.types)) + '))')
+        
+        # The automaton returns the longest keyword at a position; any shorter
+        # keyword matching there is a prefix of it, so precompute what each
+        # match implies (is an exclude hidden in it? which include does it carry?)
+        keywords = set(self.include) | set(self.exclude)
+        self._hit: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        for kw in keywords:
+            prefixes = [kw[:i] for i in range(1, len(kw) + 1)]
+            excluded = next((p for p in prefixes if p in self.exclude), None)
+            included = next((p for p in reversed(prefixes) if p in self.include), None)
+            self._hit[kw] = (excluded, included)
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH, profile: str = 'scan') -> 'CafeClassifier':
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        if profile not in rules:
+            raise KeyError(f"Profile '{profile}' not found in {path}")
+        rule = rules[profile]
+        return cls(rule['include'], rule['exclude'], rule['types'], rule.get('type_match', 'exact'))
+
+    def classify(self, name: str, types: Iterable[str]) -> Tuple[bool, str]:
+        """(is_cafe, reason) for a name and its Places types (list or comma-joined string)"""
+        if isinstance(types, str):
+            type_list = [t.strip() for t in types.split(',')] if types else []
+        else:
+            type_list = list(types or [])
+        return self._decide(self._name_regex.findall((name or '').lower()), type_list)
+
+    def _decide(self, name_hits: List[str], type_list: List[str]) -> Tuple[bool, str]:
+        first_include = None
+        for hit in name_hits:
+            excluded, included = self._hit[hit]
+            if excluded:
+                return False, f"exclude:{excluded}"
+            if first_include is None and included:
+                first_include = included
+        matched_type = self._match_type(type_list)
+        if matched_type:
+            return True, f"type:{matched_type}"
+        if first_include:
+            return True, f"name:{first_include}"
+        return False, 'none'
+
+    def _match_type(self, type_list: List[str]) -> Optional[str]:
+        if self.type_match == 'exact':
+            return next((t for t in type_list if t.lower() in self._type_set), None)
+        hits = self._type_regex.findall(', '.join(type_list).lower())
+        return hits[0] if hits else None
+
+    def classify_place(self, place: Dict) -> Tuple[bool, str]:
+        """Classify a raw Places API result"""
+        return self.classify(place.get('name'), place.get('types', []))
+
+    def classify_places(self, places: Iterable[Dict]) -> List[Tuple[bool, str]]:
+        """Classify a batch of raw Places API results"""
+        return [self.classify_place(place) for place in places]
+
+    def classify_frame(self, df, name_col: str = 'name', types_col: str = 'types'):
+        """Classify every row of a DataFrame in one pass; returns columns is_cafe and reason"""
+        import pandas as pd
+        
+        names = df[name_col].fillna('').astype(str).str.lower()
+        name_hits = names.str.findall(self._name_regex)
+        types = df[types_col].fillna('').astype(str) if types_col in df else pd.Series('', index=df.index)
+        type_lists = types.str.split(r',\s*')
+        decisions = [self._decide(hits, [t for t in tl if t]) for hits, tl in zip(name_hits, type_lists)]
+        return pd.DataFrame(decisions, index=df.index, columns=['is_cafe', 'reason'])
+
+
+def main():
+    """Re-classify a saved scan CSV and report decisions by reason"""
+    import argparse
+    import pandas as pd
+    
+    parser = argparse.ArgumentParser(description="Re-classify scanned places with cafe-rules.json")
+    parser.add_argument('csv', help="scan CSV with name and types columns")
+    parser.add_argument('--profile', default='scan', help="rules profile (default: scan)")
+    parser.add_argument('--rules', default=RULES_PATH, help=f"rules file (default: {RULES_PATH})")
+    parser.add_argument('--output', help="write the CSV with is_cafe and reason columns here")
+    args = parser.parse_args()
+    
+    df = pd.read_csv(args.csv)
+    classifier = CafeClassifier.from_file(args.rules, args.profile)
+    result = classifier.classify_frame(df)
+    print(f"{int(result['is_cafe'].sum())} of {len(df)} places classified as cafes ({args.profile} profile)")
+    print(result['reason'].str.split(':').str[0].value_counts().to_string())
+    if args.output:
+        df.assign(is_cafe=result['is_cafe'], reason=result['reason']).to_csv(args.output, index=False)
+        print(f"Saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
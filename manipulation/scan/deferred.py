@@ -0,0 +1,126 @@
+"""
+Ordered execution of multi-step jobs whose steps can be scheduled for later.
+
+A job is a generator: each `next()` runs one step (one API call) and yields
+the seconds to wait before the next step, and the generator's return value
+is the job's result. A Nearby Search query is such a job: its page 2 and 3
+requests have to wait for the next_page_token to become valid. Instead of
+sleeping through that window, run_deferred parks the continuation in a heap
+keyed by the time it falls due and runs other jobs' steps meanwhile, so the
+workers only wait when every started job is waiting.
+
+Results are still handed back strictly in input order, so callers that
+de-duplicate by first sighting get the same output as a serial run.
+"""
+
+import heapq
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Generator, Iterable, List
+
+
+class _Job:
+    """One item's generator plus its outcome once finished"""
+
+    __slots__ = ('item', 'steps', 'finished', 'result', 'error')
+
+    def __init__(self, item: Any, steps: Generator):
+        self.item = item
+        self.steps = steps
+        self.finished = False
+        self.result = None
+        self.error: BaseException = None
+
+    def advance(self) -> float:
+        """Run one step; return the delay before the next one, or None when finished"""
+        try:
+            return next(self.steps)
+        except StopIteration as stop:
+            self.result = stop.value
+        except Exception as e:  # raised when the job's turn comes to be handled
+            self.error = e
+        self.finished = True
+        return None
+
+
+def run_deferred(items: Iterable[Any], job: Callable[[Any], Generator], handle: Callable[[Any, Any], None],
+                 workers: int = 1, lookahead: int = 64) -> None:
+    """Run job(item) for every item with up to `workers` steps in flight and
+    call handle(item, result) on this thread in item order.
+
+    At most `lookahead` jobs are started ahead of the oldest one not yet
+    handled. A job that raises stops new jobs from starting; the exception is
+    re-raised once every job before it has been handled."""
+    items = iter(items)
+    pending: List[_Job] = []  # started jobs in item order; pending[head:] not yet handled
+    head = 0
+    due: List[tuple] = []  # heap of (due time, sequence, job) for parked continuations
+    sequence = itertools.count()
+    running: Dict[Any, _Job] = {}  # future -> job
+    exhausted = failed = False
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def park(job: _Job, delay: float) -> None:
+        nonlocal failed
+        if job.finished:
+            failed = failed or job.error is not None
+        else:
+            heapq.heappush(due, (time.monotonic() + delay, next(sequence), job))
+
+    def next_step() -> _Job:
+        """A due continuation first (it holds up the in-order handling), else a new job"""
+        nonlocal exhausted
+        if due and due[0][0] <= time.monotonic():
+            return heapq.heappop(due)[2]
+        if exhausted or failed or len(pending) - head >= lookahead:
+            return None
+        try:
+            item = next(items)
+        except StopIteration:
+            exhausted = True
+            return None
+        started = _Job(item, job(item))
+        pending.append(started)
+        return started
+
+    try:
+        while True:
+            while head < len(pending) and pending[head].finished:
+                done = pending[head]
+                pending[head] = None
+                head += 1
+                if done.error is not None:
+                    raise done.error
+                handle(done.item, done.result)
+            if head > lookahead and head * 2 > len(pending):
+                del pending[:head]
+                head = 0
+
+            if pool is None:
+                step = next_step()
+                if step is not None:
+                    park(step, step.advance())
+                    continue
+            else:
+                while len(running) < workers:
+                    step = next_step()
+                    if step is None:
+                        break
+                    running[pool.submit(step.advance)] = step
+
+            if head == len(pending) and not running and (exhausted or failed):
+                return
+            timeout = max(0.0, due[0][0] - time.monotonic()) if due else None
+            if running:
+                finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    park(running.pop(future), future.result())
+            elif timeout is not None:
+                time.sleep(timeout)
+    finally:
+        if pool is not None:
+            # Steps already running finish; nothing new starts
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=True)
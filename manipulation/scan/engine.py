@@ -0,0 +1,1132 @@
+"""
+Shared Places API scan engine behind ellis-0-scan.py and cafe-fetcher-comprehensive.py.
+
+A ScanConfig declares what to scan: bounds, grid, search radius, type and
+keyword queries, and the cafe-rules.json profile used to filter places.
+The scan writes its final results to a list of output targets
+(scan/outputs.py), so one run can feed every downstream consumer. The
+entry-point scripts only choose the config, the targets and the CLI.
+
+A config can be loaded from JSON, with any subset of the field names:
+
+  {"bounds": {"north": 51.2, "south": 50.85, "east": -113.85, "west": -114.3},
+   "search_keywords": ["coffee", "espresso"], "title": "CALGARY CAFE SEARCH"}
+"""
+
+import json
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, Iterable, List, NamedTuple, Set, Tuple
+
+from .budget import BudgetExhausted, PriorityScheduler, ScanBudget
+from .cache import DAY, ResponseCache
+from .classifier import CafeClassifier
+from .deferred import run_deferred
+from .geometry import BoundaryPolygon, hex_cover, verify_coverage
+from .journal import JournalState, ScanJournal
+from .metrics import ProgressLine, ScanMetrics, format_eta
+from .pipeline import WorkerQueue
+from .placestore import PlaceStore
+from .planner import QueryPlanner
+from .quadtree import Cell, root_cells
+from .ratelimit import TokenBucket
+from .retry import FATAL, SUCCESS, THROTTLED, TRANSIENT, AdaptiveRate, CircuitBreaker, RetryPolicy, classify
+from .sinks import SinkWriter
+from .storage import load_places
+
+if TYPE_CHECKING:  # pandas and requests load on first use, so offline stages start fast
+    import pandas as pd
+    import requests
+
+API_BASE_URL = 'https://maps.googleapis.com/maps/api/place'  # scan/mockapi.py serves the same paths locally
+PAGE_TOKEN_DELAY = 2.0  # seconds before a next_page_token becomes valid (required by Google)
+PAGE_TOKEN_RETRY_DELAY = 1.0  # wait before re-sending a token answered INVALID_REQUEST (not valid yet)
+PAGE_TOKEN_RETRIES = 3
+SEARCH_LOOKAHEAD = 64  # searches started ahead of the oldest unhandled one (fills page token waits)
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines in quiet mode
+REQUESTS_PER_SECOND = 10.0  # shared token bucket across all worker threads
+MAX_IN_FLIGHT = 8  # concurrent API calls; 1 runs the scan serially
+DETAIL_QUEUE_SIZE = 200  # accepted places waiting for details before search blocks (pipelined mode)
+DETAILS_STALE_DAYS = 30  # incremental refresh: details older than this are re-fetched
+
+PLACE_COLUMNS = ['place_id', 'name', 'address', 'lat', 'lng', 'types', 'rating',
+                 'user_ratings_total', 'business_status', 'price_level']
+DETAIL_COLUMNS = ['formatted_address', 'phone', 'website', 'hours', 'is_open_now', 'description']
+DETAIL_FIELDS = ('name,formatted_address,geometry,place_id,business_status,types,rating,user_ratings_total,'
+                 'opening_hours,formatted_phone_number,website,price_level,editorial_summary')
+
+
+class ApiError(Exception):
+    """A Places API call that failed before returning JSON (connection error,
+    timeout or HTTP error status); status is 'EXCEPTION' or 'HTTP_<code>'"""
+    
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestFailed(Exception):
+    """A request given up on: a fatal status, or a retryable one that outlasted
+    the retry policy. partial holds the results fetched before the failure."""
+    
+    def __init__(self, endpoint: str, status: str, attempts: int, retryable: bool):
+        super().__init__(f"{endpoint} failed with {status} after {attempts} "
+                         f"attempt{'s' if attempts != 1 else ''}")
+        self.endpoint = endpoint
+        self.status = status
+        self.attempts = attempts
+        self.retryable = retryable
+        self.partial: List[Dict] = []
+
+
+class DeadLetter(NamedTuple):
+    """Work that failed for good this run (left unjournaled, so --resume tries it again)"""
+    kind: str  # 'search' or 'details'
+    key: str  # SearchTask.key or place_id
+    status: str
+    attempts: int
+
+
+class ScanConfig(NamedTuple):
+    """Declarative description of one scan: where to search, what to ask for, what to keep"""
+    bounds: Dict[str, float]  # north/south/east/west in degrees
+    grid_size: float = 0.05  # degrees between lattice points (~5km)
+    search_radius: float = 3500  # metres; overlaps neighbouring lattice circles
+    search_types: Tuple[str, ...] = ('cafe', 'coffee_shop', 'bakery')
+    search_keywords: Tuple[str, ...] = ('cafe', 'coffee', 'espresso', 'latte', 'tea house', 'bubble tea', 'boba')
+    rules_profile: str = 'scan'  # cafe-rules.json profile applied to every result
+    area_margin: float = 0.1  # degrees beyond the bounds a place may lie (without a boundary polygon)
+    max_results_per_query: int = 60  # Nearby Search cap (3 pages x 20)
+    hex_overlap: float = 0.05  # shrink the hex lattice radius by this share as a safety margin
+    adaptive_root_size: float = 0.1  # degrees per level-0 quadtree cell
+    adaptive_max_level: int = 4  # deepest refinement (cells ~1/16 of the root side)
+    title: str = 'CAFE SEARCH'
+
+    def updated_from(self, path: str) -> 'ScanConfig':
+        """This config with the fields set in a JSON file replaced"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return self.updated(json.load(f), source=path)
+    
+    def updated(self, data: Dict[str, Any], source: str = 'config') -> 'ScanConfig':
+        """This config with the fields in a JSON-style dict replaced (lists become tuples)"""
+        unknown = set(data) - set(self._fields)
+        if unknown:
+            raise ValueError(f"Unknown scan config fields in {source}: {', '.join(sorted(unknown))}")
+        return self._replace(**{k: tuple(v) if isinstance(v, list) else v for k, v in data.items()})
+
+
+class SearchTask(NamedTuple):
+    """One Nearby Search query: a circle plus a type or keyword"""
+    point: Dict[str, float]
+    search_type: str = None
+    keyword: str = None
+    radius: float = None
+    group: Any = None  # grid point index or quadtree Cell the task belongs to
+    
+    @property
+    def query(self) -> str:
+        return f"type={self.search_type}" if self.search_type else f"keyword={self.keyword}"
+    
+    @property
+    def key(self) -> str:
+        """Stable identity used by the checkpoint journal"""
+        return f"{self.point['lat']:.6f},{self.point['lng']:.6f},{round(self.radius)}|{self.query}"
+
+
+class CafeFetcher:
+    """Places API scan engine: coverage, search, filtering and enrichment
+    for the area and queries in a ScanConfig"""
+    
+    def __init__(self, api_key: str, config: ScanConfig, requests_per_second: float = REQUESTS_PER_SECOND,
+                 max_in_flight: int = MAX_IN_FLIGHT, cache: ResponseCache = None,
+                 journal: ScanJournal = None, sink: SinkWriter = None, api_base_url: str = API_BASE_URL):
+        self.api_key = api_key
+        self.config = config
+        self.api_base_url = api_base_url.rstrip('/')
+        self.page_token_delay = PAGE_TOKEN_DELAY
+        self.page_token_retry_delay = PAGE_TOKEN_RETRY_DELAY
+        self.search_lookahead = SEARCH_LOOKAHEAD
+        self.metrics = ScanMetrics()
+        self.quiet = False  # True: no per-call log, a progress line every progress_interval seconds
+        self.progress_interval = PROGRESS_INTERVAL
+        self._progress = ('starting', 0, 0, time.monotonic())  # phase, done, total, phase start
+        self.cache = cache  # None disables caching; cache.replay forbids network calls
+        self.journal = journal  # None disables checkpointing
+        self.sink = sink  # None disables streaming output
+        self.retain_places = True  # False: drop finished places from memory (sink holds them)
+        self.completed_tasks: Dict[str, int] = {}  # task key -> result count (from a resumed journal)
+        self.enriched: Set[str] = set()  # place_ids whose details have been applied
+        self.details_fetched_at: Dict[str, str] = {}  # place_id -> ISO time its details were fetched
+        self.known_places: Dict[str, Dict] = {}  # rows of the existing table (incremental mode)
+        self.incremental = False
+        self.stale_days = DETAILS_STALE_DAYS
+        self.reused_details = 0
+        self.details_attempted: Set[str] = set()  # place_ids whose details were requested this run
+        self.details_deferred: Set[str] = set()  # accepted when the budget no longer covered their details
+        self.details_reserved: Set[str] = set()  # place_ids holding a budget reservation for their Details call
+        self.detail_queue: WorkerQueue = None  # set while streaming details (start_detail_pipeline)
+        self.planner: QueryPlanner = None  # set to order/prune queries by yield
+        self.boundary: BoundaryPolygon = None  # set to restrict search circles and places to a polygon
+        self.budget: ScanBudget = None  # set to cap calls/cost; the scan stops cleanly when it runs out
+        self.scheduler: PriorityScheduler = None  # set to search the most promising circles first
+        self.budget_exhausted = False
+        self.handled_tasks: Set[str] = set()  # task keys whose places were processed this run
+        self._task_plan: List[SearchTask] = []  # tasks of the current run_searches call, in run order
+        self.classifier = CafeClassifier.from_file(profile=config.rules_profile)
+        self.scan_started_at = datetime.now().isoformat(timespec='seconds')
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.session: 'requests.Session' = None  # opened by the first API call
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.retry_policy = RetryPolicy()
+        self.rate_control = AdaptiveRate(self.rate_limiter)  # lowers the rate while the API pushes back
+        self.breaker = CircuitBreaker()
+        self.dead_letters: List[DeadLetter] = []  # requests that failed for good this run
+        self.found_places = PlaceStore()  # place_id -> place data
+        self.search_count = 0
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        
+    def resume_from(self, state: JournalState) -> None:
+        """Restore places, details and finished tasks from a checkpoint journal"""
+        self.found_places = PlaceStore.from_records(state.places.values())
+        for place_id, fields in state.details.items():
+            if place_id in self.found_places:
+                self.found_places.update(place_id, fields)
+                self.enriched.add(place_id)
+        self.details_fetched_at.update(state.details_fetched_at)
+        self.completed_tasks = dict(state.tasks)
+        if self.sink:
+            # Stream files start fresh each run, so replay what the journal restored
+            for place_id, record in self.found_places.items():
+                self.sink.emit(record)
+                if place_id in self.enriched:
+                    self.release_place(place_id)
+        print(f"Resumed {len(self.found_places)} places ({len(self.enriched)} with details) "
+              f"and {len(self.completed_tasks)} completed searches from journal")
+    
+    def load_known_places(self, db_path: str, table: str, stale_days: float = DETAILS_STALE_DAYS) -> None:
+        """Switch to incremental mode: reuse details from the existing table
+        when they are younger than stale_days"""
+        self.incremental = True
+        self.stale_days = stale_days
+        self.known_places = load_places(db_path, table)
+        print(f"Incremental mode: {len(self.known_places)} places already in {table}, "
+              f"details re-fetched after {stale_days:g} days")
+    
+    def reusable_details(self, place_id: str) -> Dict:
+        """Detail fields of a known place if they are still fresh, else {}"""
+        known = self.known_places.get(place_id)
+        if not known or not known.get('details_fetched_at'):
+            return {}
+        try:
+            fetched_at = datetime.fromisoformat(known['details_fetched_at'])
+        except (TypeError, ValueError):
+            return {}
+        if (datetime.now() - fetched_at).total_seconds() > self.stale_days * DAY:
+            return {}
+        fields = {column: known.get(column) for column in DETAIL_COLUMNS}
+        fields['is_open_now'] = {1: True, 0: False}.get(fields['is_open_now'])  # SQLite stores booleans as 0/1
+        return fields
+    
+    def _count_call(self, endpoint: str) -> int:
+        """Spend budget, take a rate-limit token and count one API call; return
+        the call number (raises BudgetExhausted when the budget is spent)"""
+        if self.budget:
+            if endpoint == 'nearbysearch' and self.details_deferred:
+                raise BudgetExhausted(f"budget exhausted: found places no longer fit their Details calls "
+                                      f"({self.budget.describe()})")
+            self.budget.spend(endpoint)
+        self.rate_limiter.acquire()
+        with self._lock:
+            self.api_calls += 1
+            return self.api_calls
+    
+    def _log(self, message: str) -> None:
+        """Per-call and per-place log lines, hidden in quiet mode"""
+        if not self.quiet:
+            print(message)
+    
+    def _set_progress(self, phase: str, done: int, total: int) -> None:
+        started = self._progress[3] if self._progress[0] == phase and done else time.monotonic()
+        self._progress = (phase, done, total, started)
+    
+    def progress_text(self) -> str:
+        """One-line status: phase progress, call rate, latency and ETA"""
+        phase, done, total, started = self._progress
+        elapsed = time.monotonic() - started
+        eta = elapsed / done * (total - done) if done else None
+        calls_elapsed = time.monotonic() - self.metrics.started
+        latency = self.metrics.endpoint_latency('nearbysearch' if phase == 'search' else 'details')
+        return (f"{phase} {done}/{total} | calls {self.api_calls} ({self.api_calls / calls_elapsed:.1f}/s, "
+                f"p50 {latency.quantile(0.5):.2f} s) | cafes {len(self.found_places)}, "
+                f"{len(self.enriched)} with details | ETA {format_eta(eta)}")
+    
+    def _open_session(self) -> None:
+        """Create the HTTP session (and import requests) on the first API call"""
+        import requests
+        with self._lock:
+            if self.session is not None:
+                return
+            session = requests.Session()
+            # One pooled connection per worker so threads don't queue on the pool
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self.session = session
+    
+    def _call_api(self, endpoint: str, kind: str, params: Dict) -> Dict:
+        """GET one Places API endpoint and decode it, recording latency, status
+        and size in self.metrics; raises ApiError on failure"""
+        if self.session is None:
+            self._open_session()
+        from requests.exceptions import RequestException
+        started = time.perf_counter()
+        status, nbytes = 'EXCEPTION', 0
+        try:
+            response = self.session.get(f"{self.api_base_url}/{endpoint}/json", params=params, timeout=30)
+            nbytes = len(response.content or b'')
+            if response.status_code >= 400:
+                status = f"HTTP_{response.status_code}"
+            response.raise_for_status()
+            data = response.json()
+            status = data.get('status', 'UNKNOWN')
+            return data
+        except RequestException as e:
+            raise ApiError(status, str(e)) from e
+        finally:
+            self.metrics.observe_call(endpoint, kind, time.perf_counter() - started, status, nbytes)
+    
+    def _request_steps(self, endpoint: str, kind: str, params: Dict, label: str = None,
+                       accept: Iterable[str] = ()) -> Generator[float, None, Dict]:
+        """One API request as a run_deferred job: each step sends it once and
+        yields the seconds to wait before sending it again (backoff, open
+        circuit breaker); returns the response data. Statuses in `accept`
+        are returned as they are. Raises RequestFailed when giving up."""
+        attempt = 0
+        while True:
+            wait = self.breaker.wait()
+            if wait > 0:
+                yield wait
+                continue
+            attempt += 1
+            call_number = self._count_call(endpoint)
+            if label:
+                self._log(f"  API Call #{call_number}: {label}")
+            sent_at = time.monotonic()
+            try:
+                data = self._call_api(endpoint, kind, params)
+                status = data.get('status', 'UNKNOWN')
+            except ApiError as e:
+                data, status = None, e.status
+                self._log(f"    Error: {e}")
+            outcome = SUCCESS if status in accept else classify(status)
+            if self.breaker.record(outcome == TRANSIENT):
+                self.metrics.observe_event('breaker_opened')
+                print(f"    Warning: {self.breaker.threshold} failed calls in a row ({status}); "
+                      f"pausing API calls for {self.breaker.cooldown:g} seconds")
+            if outcome == THROTTLED:
+                if self.rate_control.throttled(sent_at):
+                    self.metrics.observe_event('rate_lowered')
+                    print(f"    API is throttling ({status}); lowering the rate to "
+                          f"{self.rate_limiter.rate:g} requests/second")
+            elif outcome != TRANSIENT:
+                self.rate_control.succeeded()
+            
+            if outcome == SUCCESS:
+                return data
+            if outcome == FATAL or attempt >= self.retry_policy.max_attempts:
+                raise RequestFailed(endpoint, status, attempt, retryable=outcome != FATAL)
+            delay = self.retry_policy.delay(attempt)
+            self.metrics.observe_retry(endpoint, status)
+            self._log(f"    {status}: retry {attempt}/{self.retry_policy.max_attempts - 1} in {delay:.1f} s")
+            yield delay
+    
+    @staticmethod
+    def _wait_out(steps: Generator[float, None, Any]) -> Any:
+        """Run a job's steps on this thread, sleeping through its waits; return its result"""
+        try:
+            while True:
+                time.sleep(next(steps))
+        except StopIteration as stop:
+            return stop.value
+    
+    def dead_letter(self, kind: str, key: str, error: RequestFailed) -> None:
+        """Record work that failed for good; the end of the run reports it"""
+        with self._lock:
+            self.dead_letters.append(DeadLetter(kind, key, error.status, error.attempts))
+        self.metrics.observe_event('dead_letter')
+        print(f"  Warning: giving up on {kind} {key}: {error}")
+    
+    def _run_ordered(self, func: Callable[[Any], Any], items: Iterable[Any],
+                     handle: Callable[[Any, Any], None]) -> None:
+        """Run func(item) with up to max_in_flight calls in flight, calling
+        handle(item, result) on this thread strictly in item order"""
+        if self.max_in_flight <= 1:
+            for item in items:
+                handle(item, func(item))
+            return
+        
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        window = deque()
+        try:
+            for item in items:
+                window.append((item, pool.submit(func, item)))
+                if len(window) >= self.max_in_flight:
+                    done_item, future = window.popleft()
+                    handle(done_item, future.result())
+            while window:
+                done_item, future = window.popleft()
+                handle(done_item, future.result())
+        finally:
+            # Drop queued work on error/Ctrl-C instead of draining it
+            for _, future in window:
+                future.cancel()
+            pool.shutdown(wait=True)
+        
+    def point_tasks(self, point: Dict[str, float], radius: float = None, group: Any = None) -> List[SearchTask]:
+        """All type and keyword queries for one search circle"""
+        radius = radius or self.config.search_radius
+        return ([SearchTask(point, search_type=t, radius=radius, group=group) for t in self.config.search_types] +
+                [SearchTask(point, keyword=k, radius=radius, group=group) for k in self.config.search_keywords])
+    
+    def generate_search_grid(self) -> List[Dict[str, float]]:
+        """Generate grid of search points covering the configured bounds"""
+        points = []
+        bounds = self.config.bounds
+        
+        lat = bounds['south']
+        while lat <= bounds['north']:
+            lng = bounds['west']
+            while lng <= bounds['east']:
+                points.append({'lat': lat, 'lng': lng})
+                lng += self.config.grid_size
+            lat += self.config.grid_size
+        
+        print(f"Generated {len(points)} grid points to search")
+        return points
+    
+    def generate_hex_grid(self, radius: float = None, overlap: float = None) -> List[Dict[str, float]]:
+        """Generate a near-minimal hexagonal cover of the bounds with radius-metre
+        circles and report any area it leaves uncovered"""
+        radius = radius or self.config.search_radius
+        overlap = self.config.hex_overlap if overlap is None else overlap
+        points = hex_cover(self.config.bounds, radius, overlap)
+        check = verify_coverage(points, radius, self.config.bounds)
+        print(f"Generated {len(points)} hex grid points to search "
+              f"(radius {radius:.0f} m, overlap {overlap:.0%})")
+        if check['uncovered_samples']:
+            worst = check['worst_point']
+            print(f"  Warning: {check['uncovered_km2']:.2f} km2 uncovered "
+                  f"({check['uncovered_fraction']:.3%} of samples), largest gap {check['max_gap_m']:.0f} m "
+                  f"near ({worst['lat']:.4f}, {worst['lng']:.4f})")
+        else:
+            print(f"  Coverage verified: all {check['samples']} sample points within {radius:.0f} m of a centre")
+        return points
+    
+    def search_nearby(self, location: Dict[str, float], search_type: str = None, keyword: str = None,
+                      radius: float = None) -> List[Dict]:
+        """Search for places near a specific location"""
+        return self._wait_out(self.search_nearby_steps(location, search_type, keyword, radius))
+    
+    def search_nearby_steps(self, location: Dict[str, float], search_type: str = None, keyword: str = None,
+                            radius: float = None) -> Generator[float, None, List[Dict]]:
+        """search_nearby as a job for run_deferred: makes one API call per step,
+        yields the seconds to wait before the next one (page token, retry
+        backoff) and returns the results. Raises RequestFailed, with the
+        pages fetched so far as its partial results, when a page fails."""
+        params = {
+            'location': f"{location['lat']},{location['lng']}",
+            'radius': round(radius or self.config.search_radius),
+            'key': self.api_key
+        }
+        
+        if search_type:
+            params['type'] = search_type
+        if keyword:
+            params['keyword'] = keyword
+        
+        # Whole queries (all pages) are cached: page tokens don't survive between runs
+        query_label = f"{search_type or 'general'} / {keyword or 'no keyword'}"
+        query_kind = f"type={search_type}" if search_type else f"keyword={keyword}" if keyword else 'general'
+        if self.cache:
+            cached = self.cache.get('nearbysearch', params)
+            self.metrics.observe_cache('nearbysearch', cached is not None)
+            if cached is not None:
+                self._log(f"  Cached: {query_label} ({len(cached)} results)")
+                return cached
+            if self.cache.replay:
+                self._log(f"  Replay miss: {query_label}")
+                return []
+        cache_params = dict(params)
+            
+        all_results = []
+        complete = False  # only fully paginated queries are cached
+        calls = 0
+        token_retries = 0
+        
+        try:
+            while True:
+                steps = self._request_steps('nearbysearch', query_kind, params, query_label,
+                                            accept=('INVALID_REQUEST',) if 'pagetoken' in params else ())
+                data = yield from steps
+                calls += 1
+                
+                if data.get('status') == 'ZERO_RESULTS':
+                    complete = True
+                    break
+                
+                if data.get('status') == 'INVALID_REQUEST':
+                    # The page token isn't valid yet; ask again a little later
+                    if token_retries >= PAGE_TOKEN_RETRIES:
+                        raise RequestFailed('nearbysearch', 'INVALID_REQUEST', token_retries + 1, retryable=True)
+                    token_retries += 1
+                    self._log(f"    Page token not ready, retry {token_retries}/{PAGE_TOKEN_RETRIES}")
+                    yield self.page_token_retry_delay
+                    continue
+                
+                results = data.get('results', [])
+                all_results.extend(results)
+                self._log(f"    Found {len(results)} results")
+                
+                # Check for next page
+                next_page_token = data.get('next_page_token')
+                if not next_page_token:
+                    complete = True
+                    break
+                    
+                # The next page is due once the token is valid (required by
+                # Google); other queries use the wait
+                params = {'pagetoken': next_page_token, 'key': self.api_key}
+                token_retries = 0
+                yield self.page_token_delay
+        except RequestFailed as e:
+            e.partial = all_results
+            raise
+        finally:
+            self.metrics.observe_query(query_kind, calls)
+        
+        if self.cache and complete:
+            self.cache.put('nearbysearch', cache_params, all_results)
+        
+        return all_results
+    
+    def get_place_details(self, place_id: str) -> Dict:
+        """Get detailed information about a place ({} if the API has none);
+        raises RequestFailed when retryable failures outlast the retry policy"""
+        params = self._details_params(place_id)
+        if self.cache:
+            cached = self.cache.get('details', params)
+            self.metrics.observe_cache('details', cached is not None)
+            if cached is not None:
+                self._release_reservation(place_id)
+                return cached
+            if self.cache.replay:
+                self._log(f"    Replay miss: details for {place_id}")
+                self._release_reservation(place_id)
+                return {}
+        
+        # The first call spends the place's reservation
+        with self._lock:
+            self.details_reserved.discard(place_id)
+        try:
+            data = self._wait_out(self._request_steps('details', 'details', params))
+        except RequestFailed as e:
+            if e.retryable:
+                raise
+            self._log(f"    Details fetch failed for {place_id}: {e.status}")
+            return {}
+        
+        if data.get('status') == 'OK':
+            result = data.get('result', {})
+            if self.cache:
+                self.cache.put('details', params, result)
+            return result
+        else:
+            self._log(f"    Details fetch failed for {place_id}: {data.get('status')}")
+            return {}
+    
+    def _details_params(self, place_id: str) -> Dict[str, str]:
+        return {
+            'place_id': place_id,
+            'fields': DETAIL_FIELDS,
+            'key': self.api_key
+        }
+    
+    def needs_details_call(self, place_id: str) -> bool:
+        """Whether a place's details will cost an API call (not reusable from
+        the table, not in the response cache, not a replay)"""
+        if self.reusable_details(place_id):
+            return False
+        return not self.cache or not (self.cache.replay or self.cache.has('details', self._details_params(place_id)))
+    
+    def _release_reservation(self, place_id: str) -> None:
+        """Give back a place's Details reservation when its details came without an API call"""
+        with self._lock:
+            if place_id not in self.details_reserved:
+                return
+            self.details_reserved.discard(place_id)
+        self.budget.release('details')
+    
+    def load_boundary(self, path: str) -> None:
+        """Restrict the scan to a GeoJSON city boundary"""
+        self.boundary = BoundaryPolygon.from_geojson(path)
+        print(f"Boundary: {len(self.boundary.edges)} edges from {path} "
+              f"({self.boundary.n_bands} latitude bands)")
+    
+    def prune_to_boundary(self, points: List[Dict[str, float]], radius: float = None) -> List[Dict[str, float]]:
+        """Drop search circles that don't reach the boundary polygon"""
+        if not self.boundary:
+            return points
+        radius = radius or self.config.search_radius
+        kept = [p for p in points if self.boundary.circle_intersects(p['lat'], p['lng'], radius)]
+        print(f"Boundary: keeping {len(kept)} of {len(points)} grid points")
+        return kept
+    
+    def is_in_area(self, lat: float, lng: float) -> bool:
+        """Check if coordinates are within the scan area (bounds plus margin, or the boundary)"""
+        if self.boundary:
+            return self.boundary.contains(lat, lng)
+        bounds, margin = self.config.bounds, self.config.area_margin
+        return (bounds['south'] - margin <= lat <= bounds['north'] + margin and
+                bounds['west'] - margin <= lng <= bounds['east'] + margin)
+    
+    def is_likely_cafe(self, place: Dict) -> bool:
+        """Determine if a place is likely a cafe/coffee shop (rules in scan/cafe-rules.json)"""
+        return self.classifier.classify_place(place)[0]
+    
+    def process_place(self, place: Dict) -> None:
+        """Process and store a place if it's valid and in the scan area"""
+        place_id = place.get('place_id')
+        if not place_id:
+            return
+        
+        # Skip if already processed
+        if place_id in self.found_places:
+            self.metrics.observe_place('rejected', 'duplicate')
+            return
+        
+        # Check location
+        geometry = place.get('geometry', {})
+        location = geometry.get('location', {})
+        lat = location.get('lat')
+        lng = location.get('lng')
+        
+        if not lat or not lng:
+            self.metrics.observe_place('rejected', 'no_location')
+            return
+            
+        if not self.is_in_area(lat, lng):
+            self.metrics.observe_place('rejected', 'out_of_area')
+            return
+        
+        # Check if it's likely a cafe (rules in scan/cafe-rules.json)
+        is_cafe, reason = self.classifier.classify_place(place)
+        self.metrics.observe_place('accepted' if is_cafe else 'rejected', reason)
+        if not is_cafe:
+            return
+        
+        # Store basic info first
+        record = {
+            'place_id': place_id,
+            'name': place.get('name'),
+            'address': place.get('vicinity') or place.get('formatted_address'),
+            'lat': lat,
+            'lng': lng,
+            'types': ', '.join(place.get('types', [])),
+            'rating': place.get('rating'),
+            'user_ratings_total': place.get('user_ratings_total'),
+            'business_status': place.get('business_status'),
+            'price_level': place.get('price_level')
+        }
+        self.found_places.add(record)
+        
+        if self.journal:
+            self.journal.record_place(record)
+        if self.sink:
+            self.sink.emit(record)
+        if self.budget and self.needs_details_call(place_id):
+            if self.budget.reserve('details'):
+                with self._lock:
+                    self.details_reserved.add(place_id)
+            else:
+                # Results of searches already paid for: kept for a resumed run to enrich,
+                # and no further search is started
+                self.details_deferred.add(place_id)
+        
+        self._log(f"    [ADDED] {place.get('name')}")
+        
+        if self.detail_queue and place_id not in self.details_deferred:
+            self.detail_queue.put(place_id)
+    
+    def reuse_known_details(self, place_id: str) -> bool:
+        """Incremental mode: copy still-fresh details from the existing table"""
+        fields = self.reusable_details(place_id) if self.incremental else {}
+        if not fields:
+            return False
+        fetched_at = self.known_places[place_id]['details_fetched_at']
+        self.apply_details(place_id, fields, fetched_at)
+        with self._lock:
+            self.reused_details += 1
+        return True
+    
+    def apply_details(self, place_id: str, fields: Dict, fetched_at: str) -> None:
+        """Merge detail fields into a found place and journal them (thread-safe)"""
+        with self._lock:
+            self.found_places.update(place_id, fields)
+            self.enriched.add(place_id)
+            self.details_fetched_at[place_id] = fetched_at
+            record = self.found_places[place_id]
+        if self.journal:
+            self.journal.record_details(place_id, fields, fetched_at)
+        if self.sink:
+            self.sink.emit(record)
+    
+    def release_place(self, place_id: str) -> None:
+        """Drop a finished place's record, keeping its id for de-duplication"""
+        if not self.retain_places:
+            self.found_places.release(place_id)
+    
+    def fetch_and_apply_details(self, place_id: str, details: Dict) -> None:
+        """Apply a Place Details response (empty on failure) to a found place"""
+        with self._lock:
+            self.details_attempted.add(place_id)
+        if details:
+            fields = self.detail_fields(self.found_places[place_id], details)
+            self.apply_details(place_id, fields, datetime.now().isoformat(timespec='seconds'))
+        self.release_place(place_id)
+    
+    def enrich_with_details(self) -> None:
+        """Fetch detailed information for found places not enriched yet"""
+        pending = [pid for pid in self.found_places
+                   if pid not in self.enriched and pid not in self.details_attempted
+                   and pid not in self.details_deferred]
+        reused = [pid for pid in pending if self.reuse_known_details(pid)]
+        for place_id in reused:
+            self.release_place(place_id)
+        if self.incremental:
+            print(f"\nReusing fresh details for {len(reused)} known places")
+        # New places first, then known places whose details went stale
+        pending = sorted((pid for pid in pending if pid not in self.enriched),
+                         key=lambda pid: pid in self.known_places)
+        
+        total = len(pending)
+        print(f"\nEnriching {total} places with detailed information...")
+        if len(self.enriched):
+            print(f"  ({len(self.enriched)} places already have details)")
+        if self.details_deferred:
+            print(f"  ({len(self.details_deferred)} places found after the budget was committed "
+                  f"are left for a resumed run)")
+        
+        # Pacing comes from the shared token bucket in get_place_details
+        items = list(enumerate(pending, 1))
+        self._set_progress('details', 0, total)
+        
+        failed = []
+        
+        def fetch(item):
+            try:
+                return self.get_place_details(item[1])
+            except RequestFailed as e:
+                return e
+        
+        def apply(item, details):
+            i, place_id = item
+            if isinstance(details, RequestFailed):
+                failed.append(item)
+                return
+            self._log(f"  [{i}/{total}] {self.found_places.field(place_id, 'name')}")
+            self.fetch_and_apply_details(place_id, details)
+            self._set_progress('details', i, total)
+        
+        def apply_retry(item, details):
+            if isinstance(details, RequestFailed):
+                self.dead_letter('details', item[1], details)
+                details = {}
+            apply(item, details)
+        
+        self._run_ordered(fetch, items, apply)
+        if failed:
+            # Second chance once the run is through (an outage may have passed)
+            print(f"\nRetrying details for {len(failed)} places that failed...")
+            self._run_ordered(fetch, failed, apply_retry)
+    
+    def start_detail_pipeline(self, workers: int = None, queue_size: int = DETAIL_QUEUE_SIZE) -> None:
+        """Enrich places as process_place accepts them, overlapping search and details.
+        
+        Accepted place_ids go onto a bounded queue drained by `workers`
+        threads; a full queue blocks the search loop (backpressure), and
+        both phases draw from the same token bucket.
+        """
+        workers = workers or self.max_in_flight
+        def enrich_one(place_id: str) -> None:
+            if self.reuse_known_details(place_id):
+                self.release_place(place_id)
+                return
+            name = self.found_places.field(place_id, 'name')
+            try:
+                details = self.get_place_details(place_id)
+            except BudgetExhausted:
+                return  # left without details for a resumed run
+            except RequestFailed:
+                return  # not attempted yet: enrich_with_details tries it again
+
+            self.fetch_and_apply_details(place_id, details)
+            self._log(f"    [DETAILS] {name}")
+        
+        self.detail_queue = WorkerQueue(enrich_one, workers=workers, maxsize=queue_size,
+                                        name='details').start()
+        print(f"Streaming details to {workers} workers (queue of {queue_size})")
+    
+    def finish_detail_pipeline(self, abort: bool = False) -> None:
+        """Wait for queued details (or drop them when aborting) and stop the workers"""
+        if not self.detail_queue:
+            return
+        detail_queue, self.detail_queue = self.detail_queue, None
+        if abort:
+            detail_queue.abort()
+        else:
+            print(f"\nWaiting for {detail_queue.pending()} queued detail lookups...")
+            detail_queue.close()
+    
+    def detail_fields(self, place_data: Dict, details: Dict) -> Dict:
+        """Columns added to a place from its Place Details response"""
+        fields = {}
+        
+        # Update with detailed info
+        fields['formatted_address'] = details.get('formatted_address', place_data['address'])
+        fields['phone'] = details.get('formatted_phone_number', '')
+        fields['website'] = details.get('website', '')
+        
+        # Opening hours
+        opening_hours = details.get('opening_hours', {})
+        fields['hours'] = '; '.join(opening_hours.get('weekday_text', []))
+        fields['is_open_now'] = opening_hours.get('open_now', None)
+        
+        # Editorial summary
+        editorial = details.get('editorial_summary', {})
+        fields['description'] = editorial.get('overview', '')
+        return fields
+    
+    def run_searches(self, tasks: List[SearchTask],
+                     on_results: Callable[[SearchTask, int], None] = None) -> None:
+        """Execute search tasks and process their places in task order, so
+        de-duplication (first sighting wins) matches a serial run exactly.
+        
+        on_results(task, n_results) is called for every task run in order,
+        including tasks already completed in a resumed journal. With a
+        planner, tasks are reordered and low-yield ones skipped."""
+        total = len(tasks)
+        done = sum(1 for task in tasks if task.key in self.completed_tasks)
+        if done:
+            print(f"  Skipping {done}/{total} searches completed before resuming")
+        current = 0
+        
+        failed: List[SearchTask] = []  # retried once the other searches are through
+        
+        def run_search(task: SearchTask) -> Generator[float, None, Any]:
+            if task.key in self.completed_tasks:
+                return None
+            try:
+                return (yield from self.search_nearby_steps(task.point, search_type=task.search_type,
+                                                            keyword=task.keyword, radius=task.radius))
+            except RequestFailed as e:
+                return e
+        
+        def finish(task: SearchTask, results: List[Dict], dead: bool = False) -> None:
+            if on_results:
+                on_results(task, len(results))
+            self._log(f"  Search {current}/{total}: {task.query}")
+            found_before = len(self.found_places)
+            for place in results:
+                self.process_place(place)
+            if dead:
+                return  # unjournaled, so a resumed run searches it again
+            self.handled_tasks.add(task.key)
+            if self.planner:
+                self.planner.record(task, len(results), len(self.found_places) - found_before)
+            # Logged after its places, so a crash in between just repeats the task
+            if self.journal:
+                self.journal.record_task(task.key, len(results))
+        
+        def handle_results(task: SearchTask, results: Any) -> None:
+            nonlocal current
+            current += 1
+            self._set_progress('search', current, total)
+            if results is None:
+                # Finished in an earlier run; its places were restored from the journal
+                if on_results:
+                    on_results(task, self.completed_tasks[task.key])
+                return
+            if isinstance(results, RequestFailed):
+                if results.retryable:
+                    failed.append(task)
+                    return
+                self.dead_letter('search', task.key, results)
+                finish(task, results.partial, dead=True)  # the pages it did get
+                return
+            finish(task, results)
+        
+        def handle_retry(task: SearchTask, results: Any) -> None:
+            if isinstance(results, RequestFailed):
+                self.dead_letter('search', task.key, results)
+                finish(task, results.partial, dead=True)
+            else:
+                finish(task, results)
+        
+        if self.scheduler:
+            tasks = self.scheduler.order(tasks)
+        self._task_plan = list(tasks)
+        if self.planner:
+            tasks = self.planner.plan(tasks, keep=lambda task: task.key in self.completed_tasks)
+        self._set_progress('search', 0, total)
+        # Page requests wait for their token while other searches run
+        run_deferred(tasks, run_search, handle_results, workers=self.max_in_flight,
+                     lookahead=self.search_lookahead)
+        if failed:
+            print(f"  Retrying {len(failed)} searches that failed...")
+            run_deferred(failed, run_search, handle_retry, workers=self.max_in_flight,
+                         lookahead=self.search_lookahead)
+    
+    def search_points(self, grid_points: List[Dict[str, float]]) -> None:
+        """Search every point of a fixed grid (lattice or hex cover)"""
+        # One task per (grid point, type/keyword) combination
+        tasks = []
+        for i, point in enumerate(grid_points, 1):
+            tasks.extend(self.point_tasks(point, group=i))
+        
+        print(f"\nExecuting {len(tasks)} searches across {len(grid_points)} grid points...")
+        print(f"Up to {self.max_in_flight} calls in flight at {self.rate_limiter.rate:g} requests/second.\n")
+        
+        last_group = None
+        
+        def on_results(task: SearchTask, n_results: int) -> None:
+            nonlocal last_group
+            if task.group != last_group:
+                if last_group is not None:
+                    self._log(f"  Total unique cafes found so far: {len(self.found_places)}")
+                point = task.point
+                self._log(f"\nGrid Point {task.group}/{len(grid_points)}: ({point['lat']:.4f}, {point['lng']:.4f})")
+                last_group = task.group
+        
+        self.run_searches(tasks, on_results)
+        print(f"  Total unique cafes found so far: {len(self.found_places)}")
+    
+    def search_adaptive(self) -> Dict[int, Dict[str, int]]:
+        """Search a quadtree over the bounds, splitting only cells whose
+        queries hit max_results_per_query; return per-level statistics"""
+        config = self.config
+        cells = self.prune_cells(root_cells(config.bounds, config.adaptive_root_size))
+        level_stats: Dict[int, Dict[str, int]] = {}
+        
+        while cells:
+            level = cells[0].level
+            calls_before = self.api_calls
+            found_before = len(self.found_places)
+            
+            tasks = []
+            for cell in cells:
+                tasks.extend(self.point_tasks(cell.center, radius=cell.radius_m, group=cell))
+            print(f"\nLevel {level}: {len(cells)} cells, {len(tasks)} searches "
+                  f"(radius {cells[0].radius_m:.0f} m)")
+            
+            capped: Set[Cell] = set()
+            results_per_cell: Dict[Cell, int] = {cell: 0 for cell in cells}
+            
+            def on_results(task: SearchTask, n_results: int) -> None:
+                results_per_cell[task.group] += n_results
+                if n_results >= config.max_results_per_query:
+                    capped.add(task.group)
+            
+            self.run_searches(tasks, on_results)
+            
+            empty = sum(1 for n in results_per_cell.values() if n == 0)
+            level_stats[level] = {
+                'cells': len(cells),
+                'searches': len(tasks),
+                'api_calls': self.api_calls - calls_before,
+                'capped_cells': len(capped),
+                'empty_cells': empty,
+                'new_places': len(self.found_places) - found_before
+            }
+            print(f"  Level {level} done: {len(capped)} capped, {empty} empty, "
+                  f"{len(self.found_places)} unique cafes so far")
+            
+            # Refine saturated cells only; empty and unsaturated cells are leaves
+            if level >= config.adaptive_max_level:
+                if capped:
+                    print(f"  Warning: {len(capped)} cells still capped at max level {config.adaptive_max_level}")
+                break
+            cells = self.prune_cells([child for cell in cells if cell in capped for child in cell.split()])
+        
+        self.print_level_stats(level_stats)
+        return level_stats
+    
+    def prune_cells(self, cells: List[Cell]) -> List[Cell]:
+        """Drop quadtree cells whose search circle doesn't reach the boundary polygon"""
+        if not self.boundary:
+            return cells
+        return [c for c in cells
+                if self.boundary.circle_intersects(c.center['lat'], c.center['lng'], c.radius_m)]
+    
+    def print_level_stats(self, level_stats: Dict[int, Dict[str, int]]) -> None:
+        """Print per-level call counts next to the fixed-grid equivalent"""
+        queries = len(self.config.search_types) + len(self.config.search_keywords)
+        lattice_searches = len(self.generate_search_grid()) * queries
+        print("\nAdaptive coverage by level:")
+        print(f"  {'level':>5} {'cells':>6} {'searches':>9} {'api_calls':>10} {'capped':>7} {'empty':>6} {'new':>6}")
+        for level, st in sorted(level_stats.items()):
+            print(f"  {level:>5} {st['cells']:>6} {st['searches']:>9} {st['api_calls']:>10} "
+                  f"{st['capped_cells']:>7} {st['empty_cells']:>6} {st['new_places']:>6}")
+        total_calls = sum(st['api_calls'] for st in level_stats.values())
+        total_searches = sum(st['searches'] for st in level_stats.values())
+        print(f"  total: {total_searches} searches, {total_calls} API calls "
+              f"(fixed lattice: {lattice_searches} searches before pagination)")
+    
+    def search_coverage(self, coverage: str, grid: List[Dict[str, float]]) -> None:
+        """Search phase; a spent budget ends it early and sets budget_exhausted"""
+        try:
+            if coverage == 'adaptive':
+                self.search_adaptive()
+            else:
+                self.search_points(grid)
+        except BudgetExhausted as e:
+            # Accepted places hold Details reservations (or are deferred), so queued details still finish
+            self.budget_exhausted = True
+            print(f"\nStopping the search: {e}")
+    
+    def budget_plan(self) -> Dict[str, Any]:
+        """What a budget-stopped scan left undone, in the order a resumed run takes it"""
+        done = self.handled_tasks | set(self.completed_tasks)
+        remaining = [task for task in self._task_plan if task.key not in done]
+        without_details = [pid for pid in self.found_places
+                           if pid not in self.enriched and pid not in self.details_attempted]
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'budget': self.budget.summary() if self.budget else None,
+            'places_found': len(self.found_places),
+            'places_without_details': len(without_details),
+            'remaining_searches': len(remaining),
+            'note': ("later quadtree levels are planned once this one finishes"
+                     if remaining and isinstance(remaining[0].group, Cell) else None),
+            'next_searches': [task.key for task in remaining],
+        }
+    
+    def search_all(self, coverage: str = 'lattice', pipeline: bool = False) -> 'pd.DataFrame':
+        """Execute comprehensive search"""
+        print("=" * 80)
+        print(self.config.title)
+        print("=" * 80)
+        
+        if coverage == 'lattice':
+            grid = self.prune_to_boundary(self.generate_search_grid())
+        elif coverage == 'hex':
+            grid = self.prune_to_boundary(self.generate_hex_grid())
+        elif coverage == 'adaptive':
+            grid = []  # cells come from the quadtree
+        else:
+            raise ValueError(f"Unknown coverage mode: {coverage}")
+        
+        progress = ProgressLine(self.progress_text, self.progress_interval).start() if self.quiet else None
+        try:
+            if pipeline:
+                self.start_detail_pipeline()
+            try:
+                self.search_coverage(coverage, grid)
+            except BaseException:
+                self.finish_detail_pipeline(abort=True)
+                raise
+            self.finish_detail_pipeline()
+            
+            if self.planner:
+                self.planner.report(len(self.found_places))
+            
+            # Enrich with details (everything in serial mode; places restored
+            # from a journal without details in pipelined mode)
+            try:
+                self.enrich_with_details()
+            except BudgetExhausted as e:
+                self.budget_exhausted = True
+                print(f"\nStopping details: {e}")
+        finally:
+            if progress:
+                progress.stop()
+        self.metrics.print_report()
+        self.print_dead_letters()
+        
+        # Convert to DataFrame (read back from the stream when places were not kept)
+        if self.retain_places:
+            df = self.found_places.to_frame()
+        else:
+            self.sink.flush()
+            df = self.sink.sqlite_sink().read_frame()
+            df['is_open_now'] = df['is_open_now'].map({1: True, 0: False})  # SQLite stores booleans as 0/1
+        
+        # Sort by name
+        df = df.sort_values('name')
+        
+        return df
+    
+    def print_dead_letters(self) -> None:
+        """Report requests that failed for good (a resumed run retries them)"""
+        if not self.dead_letters:
+            return
+        kinds = Counter(letter.kind for letter in self.dead_letters)
+        print("\nWarning: gave up on " + ', '.join(f"{n} {kind}" for kind, n in sorted(kinds.items())) +
+              " requests" + ("; resume from the journal to retry them" if self.journal else ""))
+        for letter in self.dead_letters[:10]:
+            print(f"  {letter.kind} {letter.key}: {letter.status} "
+                  f"after {letter.attempts} attempt{'s' if letter.attempts != 1 else ''}")
+        if len(self.dead_letters) > 10:
+            print(f"  ... and {len(self.dead_letters) - 10} more")
+    
+    def save_results(self, df: 'pd.DataFrame', targets: List[Any]) -> None:
+        """Write the final results to every output target (see scan/outputs.py);
+        a failing target is reported without stopping the others"""
+        for target in targets:
+            try:
+                target.write(df, self)
+            except Exception as e:
+                print(f"Warning: Could not write {target}: {e}")
+    
+    def table_records(self, df: 'pd.DataFrame') -> List[Dict]:
+        """Rows for the places table: scan columns plus refresh bookkeeping"""
+        records = df.to_dict('records')
+        for record in records:
+            place_id = record['place_id']
+            known = self.known_places.get(place_id, {})
+            record['first_seen_at'] = known.get('first_seen_at') or self.scan_started_at
+            record['last_seen_at'] = self.scan_started_at
+            record['details_fetched_at'] = self.details_fetched_at.get(place_id)
+            record['seen_in_last_scan'] = 1
+        return records
+
+
+def print_summary(places: Iterable[Dict]) -> None:
+    """Print summary statistics of a finished scan from its records
+    (e.g. df.to_dict('records'); plain dicts keep `stats` free of pandas)"""
+    def present(value: Any) -> bool:
+        return value is not None and value == value  # NaN never equals itself
+    
+    places = list(places)
+    ratings = [place['rating'] for place in places if present(place.get('rating'))]
+    statuses = [place.get('business_status') for place in places]
+    print("\n" + "=" * 80)
+    print("SUMMARY STATISTICS")
+    print("=" * 80)
+    print(f"Total cafes: {len(places)}")
+    print(f"With ratings: {len(ratings)}")
+    print(f"Average rating: {sum(ratings) / len(ratings) if ratings else float('nan'):.2f}")
+    print(f"With phone: {sum(present(place.get('phone')) for place in places)}")
+    print(f"With website: {sum(present(place.get('website')) for place in places)}")
+    print(f"Operational: {statuses.count('OPERATIONAL')}")
+    print(f"Temporarily closed: {statuses.count('CLOSED_TEMPORARILY')}")
+    print(f"Permanently closed: {statuses.count('CLOSED_PERMANENTLY')}")
+    
+    print("\nTop 10 highest rated cafes:")
+    rated = [place for place in places
+             if present(place.get('rating')) and (place.get('user_ratings_total') or 0) >= 20]
+    for place in sorted(rated, key=lambda place: -place['rating'])[:10]:  # stable: ties keep row order
+        print(f"  {place['name']}: {place['rating']} ⭐ ({place['user_ratings_total']} reviews)")
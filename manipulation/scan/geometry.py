@@ -0,0 +1,198 @@
+"""
+Small spherical-geometry helpers shared by the coverage generators.
+
+Distances are great-circle metres on a spherical Earth, which is well
+within the accuracy needed to size Places API search circles.
+"""
+
+import math
+from typing import Any, Dict, List, Tuple
+
+EARTH_RADIUS_M = 6371008.8  # mean Earth radius
+METRES_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180.0
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres between two lat/lng points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def metres_per_degree(lat: float) -> Tuple[float, float]:
+    """(metres per degree latitude, metres per degree longitude) at a latitude"""
+    return METRES_PER_DEGREE_LAT, METRES_PER_DEGREE_LAT * math.cos(math.radians(lat))
+
+
+def hex_cover(bounds: Dict[str, float], radius: float, overlap: float = 0.1) -> List[Dict[str, float]]:
+    """Centres of a hexagonal circle packing that covers `bounds`.
+    
+    Circles of radius r cover the plane with the fewest centres when placed
+    on a triangular lattice: spacing sqrt(3)*r along a row, rows 1.5*r
+    apart, alternate rows offset by half a spacing. Spacing is computed in
+    metres, per row at that row's latitude, so longitude shrinkage is
+    accounted for. `overlap` shrinks the lattice radius to r*(1 - overlap)
+    as a safety margin. Centres whose hexagonal cell misses the bounds are
+    dropped.
+    """
+    r_eff = radius * (1.0 - overlap)
+    spacing = math.sqrt(3.0) * r_eff
+    row_step = 1.5 * r_eff
+    m_lat = METRES_PER_DEGREE_LAT
+    
+    points = []
+    row = 0
+    # Start one lattice radius below the bounds so the southern edge is covered
+    y = -r_eff
+    height = (bounds['north'] - bounds['south']) * m_lat
+    while y <= height + r_eff:
+        lat = bounds['south'] + y / m_lat
+        m_lng = m_lat * math.cos(math.radians(lat))
+        width = (bounds['east'] - bounds['west']) * m_lng
+        x = -spacing / 2 if row % 2 else 0.0
+        x -= spacing  # one column west of the bounds
+        while x <= width + spacing:
+            # Keep the centre if its cell (inside the r_eff circle) can touch the bounds
+            dx = max(0.0, -x, x - width)
+            dy = max(0.0, -y, y - height)
+            if math.hypot(dx, dy) < r_eff:
+                points.append({'lat': lat, 'lng': bounds['west'] + x / m_lng})
+            x += spacing
+        y += row_step
+        row += 1
+    return points
+
+
+def verify_coverage(points: List[Dict[str, float]], radius: float, bounds: Dict[str, float],
+                    step: float = 100.0) -> Dict[str, Any]:
+    """Sample `bounds` every `step` metres and report area outside every circle"""
+    import numpy as np  # installed with pandas; only needed for verification
+    
+    m_lat = METRES_PER_DEGREE_LAT
+    lat0 = (bounds['north'] + bounds['south']) / 2
+    n_lat = max(2, int((bounds['north'] - bounds['south']) * m_lat / step) + 1)
+    n_lng = max(2, int((bounds['east'] - bounds['west']) * m_lat * math.cos(math.radians(lat0)) / step) + 1)
+    lats, lngs = np.meshgrid(np.linspace(bounds['south'], bounds['north'], n_lat),
+                             np.linspace(bounds['west'], bounds['east'], n_lng), indexing='ij')
+    lats, lngs = np.radians(lats.ravel()), np.radians(lngs.ravel())
+    
+    nearest = np.full(lats.shape, np.inf)
+    for p in points:
+        plat, plng = math.radians(p['lat']), math.radians(p['lng'])
+        a = (np.sin((lats - plat) / 2) ** 2 +
+             np.cos(lats) * math.cos(plat) * np.sin((lngs - plng) / 2) ** 2)
+        d = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        np.minimum(nearest, d, out=nearest)
+    
+    uncovered = nearest > radius
+    cell_area_km2 = (bounds['north'] - bounds['south']) * (bounds['east'] - bounds['west']) / \
+        ((n_lat - 1) * (n_lng - 1)) * m_lat * m_lat * math.cos(math.radians(lat0)) / 1e6
+    worst = int(np.argmax(nearest))
+    return {
+        'points': len(points),
+        'samples': int(lats.size),
+        'uncovered_samples': int(uncovered.sum()),
+        'uncovered_fraction': float(uncovered.mean()),
+        'uncovered_km2': float(uncovered.sum() * cell_area_km2),
+        'max_gap_m': float(max(0.0, nearest[worst] - radius)),
+        'worst_point': {'lat': math.degrees(lats[worst]), 'lng': math.degrees(lngs[worst])},
+    }
+
+
+class BoundaryPolygon:
+    """(Multi)polygon prepared for fast point-in-polygon and circle tests.
+    
+    Edges of every ring (holes included; the even-odd rule handles them)
+    are bucketed into horizontal latitude bands, so a point test only
+    ray-casts against the few edges crossing its band instead of the
+    whole boundary.
+    """
+
+    def __init__(self, rings: List[List[Tuple[float, float]]]):
+        # rings: lists of (lng, lat) vertices, as in GeoJSON
+        self.edges: List[Tuple[float, float, float, float]] = []  # (lat1, lng1, lat2, lng2)
+        for ring in rings:
+            if len(ring) > 1 and tuple(ring[0]) == tuple(ring[-1]):
+                ring = ring[:-1]
+            for i in range(len(ring)):
+                lng1, lat1 = ring[i][0], ring[i][1]
+                lng2, lat2 = ring[(i + 1) % len(ring)][0], ring[(i + 1) % len(ring)][1]
+                self.edges.append((lat1, lng1, lat2, lng2))
+        if not self.edges:
+            raise ValueError("Boundary polygon has no edges")
+        
+        lats = [e[0] for e in self.edges]
+        lngs = [e[1] for e in self.edges]
+        self.south, self.north = min(lats), max(lats)
+        self.west, self.east = min(lngs), max(lngs)
+        
+        self.n_bands = max(1, min(1024, len(self.edges) // 4))
+        self.band_height = (self.north - self.south) / self.n_bands or 1.0
+        self.bands: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(self.n_bands)]
+        for edge in self.edges:
+            lo = self._band(min(edge[0], edge[2]))
+            hi = self._band(max(edge[0], edge[2]))
+            for b in range(lo, hi + 1):
+                self.bands[b].append(edge)
+
+    @classmethod
+    def from_geojson(cls, path: str) -> 'BoundaryPolygon':
+        """Load every Polygon/MultiPolygon in a GeoJSON file (geometry, Feature or FeatureCollection)"""
+        import json
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        geometries = []
+        if data.get('type') == 'FeatureCollection':
+            geometries = [feature.get('geometry') or {} for feature in data.get('features', [])]
+        elif data.get('type') == 'Feature':
+            geometries = [data.get('geometry') or {}]
+        else:
+            geometries = [data]
+        
+        rings = []
+        for geometry in geometries:
+            if geometry.get('type') == 'Polygon':
+                rings.extend(geometry['coordinates'])
+            elif geometry.get('type') == 'MultiPolygon':
+                for polygon in geometry['coordinates']:
+                    rings.extend(polygon)
+        return cls(rings)
+
+    def _band(self, lat: float) -> int:
+        return min(self.n_bands - 1, max(0, int((lat - self.south) / self.band_height)))
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """Point-in-polygon by ray casting against the edges of the point's band"""
+        if not (self.south <= lat <= self.north and self.west <= lng <= self.east):
+            return False
+        inside = False
+        for lat1, lng1, lat2, lng2 in self.bands[self._band(lat)]:
+            if (lat1 > lat) != (lat2 > lat):
+                cross_lng = lng1 + (lat - lat1) * (lng2 - lng1) / (lat2 - lat1)
+                if lng < cross_lng:
+                    inside = not inside
+        return inside
+
+    def circle_intersects(self, lat: float, lng: float, radius: float) -> bool:
+        """True if a circle of `radius` metres around (lat, lng) overlaps the polygon"""
+        m_lat, m_lng = metres_per_degree(lat)
+        d_lat, d_lng = radius / m_lat, radius / m_lng
+        if (lat + d_lat < self.south or lat - d_lat > self.north or
+                lng + d_lng < self.west or lng - d_lng > self.east):
+            return False
+        if self.contains(lat, lng):
+            return True
+        # Otherwise the circle must reach an edge; measure in a local metric projection
+        for b in range(self._band(lat - d_lat), self._band(lat + d_lat) + 1):
+            for lat1, lng1, lat2, lng2 in self.bands[b]:
+                ax, ay = (lng1 - lng) * m_lng, (lat1 - lat) * m_lat
+                bx, by = (lng2 - lng) * m_lng, (lat2 - lat) * m_lat
+                dx, dy = bx - ax, by - ay
+                length2 = dx * dx + dy * dy
+                t = 0.0 if length2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length2))
+                if math.hypot(ax + t * dx, ay + t * dy) <= radius:
+                    return True
+        return False
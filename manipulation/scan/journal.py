@@ -0,0 +1,128 @@
+"""
+Append-only checkpoint journal for long scans.
+
+Every completed search task, accepted place and applied details record is
+appended as one JSON line. Writes are buffered and fsynced in batches, so
+a crash (not just Ctrl-C) loses at most one batch. A line torn by a crash
+mid-write is skipped on load, and resuming cuts an unfinished final line
+off before appending, so later entries never join onto it. Replaying the
+journal rebuilds `found_places` in its original order and the set of
+finished tasks.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict
+
+
+class JournalState:
+    """Progress recovered from a journal"""
+
+    def __init__(self):
+        self.header: Dict[str, Any] = {}
+        self.tasks: Dict[str, int] = {}  # task key -> number of results it returned
+        self.places: Dict[str, Dict] = {}  # place_id -> record, in acceptance order
+        self.details: Dict[str, Dict] = {}  # place_id -> detail fields applied
+        self.details_fetched_at: Dict[str, str] = {}  # place_id -> when those details were fetched
+
+
+class ScanJournal:
+    """JSON-lines journal of finished tasks and accepted places"""
+
+    def __init__(self, path: str, fsync_every: int = 100):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> JournalState:
+        """Read back an existing journal (empty state if there is none)"""
+        state = JournalState()
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash; the lines around it are intact
+                    continue
+                kind = entry.get('kind')
+                if kind == 'header':
+                    state.header = entry
+                elif kind == 'task':
+                    state.tasks[entry['key']] = entry.get('results', 0)
+                elif kind == 'place':
+                    place = entry['place']
+                    state.places.setdefault(place['place_id'], place)
+                elif kind == 'details':
+                    state.details[entry['place_id']] = entry['fields']
+                    if entry.get('fetched_at'):
+                        state.details_fetched_at[entry['place_id']] = entry['fetched_at']
+        return state
+
+    def open(self, resume: bool, header: Dict[str, Any] = None) -> None:
+        """Append to the journal when resuming, otherwise start a new one"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if resume:
+            self._drop_unfinished_line()
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if not resume:
+            self._write({'kind': 'header', **(header or {})})
+            self.flush()
+
+    def _drop_unfinished_line(self) -> None:
+        """Truncate the journal after its last complete line (a crash can
+        leave a final line without its newline)"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                block = f.read(position - start)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+                print(f"Warning: dropped an unfinished line at the end of {self.path}")
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def record_task(self, key: str, results: int) -> None:
+        self._write({'kind': 'task', 'key': key, 'results': results})
+
+    def record_place(self, place: Dict) -> None:
+        self._write({'kind': 'place', 'place': place})
+
+    def record_details(self, place_id: str, fields: Dict, fetched_at: str = None) -> None:
+        self._write({'kind': 'details', 'place_id': place_id, 'fields': fields, 'fetched_at': fetched_at})
+
+    def flush(self) -> None:
+        """Force buffered entries to disk"""
+        if self._file:
+            with self._lock:
+                self._sync()
+
+    def close(self) -> None:
+        if self._file:
+            self.flush()
+            self._file.close()
+            self._file = None
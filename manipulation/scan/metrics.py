@@ -0,0 +1,301 @@
+"""
+Structured metrics for a scan: what the API calls cost and what they returned.
+
+ScanMetrics is shared by all worker threads of a fetcher and records, per
+endpoint and query kind (e.g. 'type=cafe', 'keyword=espresso', 'details'):
+
+  - latency histograms (fixed buckets, so quantiles are estimates)
+  - response status counts (API status, 'HTTP_<code>' or 'EXCEPTION')
+  - bytes received and pagination depth per query
+  - cache hits/misses and places accepted/rejected by reason
+
+It exports a JSON summary and a Prometheus text-format file (for the node
+exporter's textfile collector). ProgressLine redraws a single status line
+every few seconds, for quiet runs that skip the per-call log.
+"""
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+PAGE_BUCKETS = (1, 2, 3)  # Nearby Search returns at most 3 pages
+METRIC_PREFIX = 'cafe_scan'
+
+
+class Histogram:
+    """Cumulative-bucket histogram as in Prometheus (upper bounds inclusive)"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation within the bucket holding the q-th value"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': round(self.quantile(0.5), 6),
+            'p95': round(self.quantile(0.95), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'max': round(self.max, 6),
+            'buckets': {str(b): n for b, n in zip(list(self.bounds) + ['+Inf'], self.counts)},
+        }
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    body = ','.join(f'{k}="{escape(v)}"' for k, v in labels.items())
+    return '{' + body + '}' if body else ''
+
+
+class ScanMetrics:
+    """Thread-safe counters and histograms for one scan"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}  # (endpoint, query kind)
+        self.pages: Dict[str, Histogram] = {}  # query kind -> pages fetched per query
+        self.statuses: Counter = Counter()  # (endpoint, status)
+        self.bytes: Counter = Counter()  # endpoint
+        self.cache: Counter = Counter()  # (endpoint, 'hit' | 'miss')
+        self.places: Counter = Counter()  # (outcome, reason)
+        self.retries: Counter = Counter()  # (endpoint, status that was retried)
+        self.events: Counter = Counter()  # breaker_opened, rate_lowered, dead_letter
+
+    def observe_call(self, endpoint: str, kind: str, seconds: float, status: str, nbytes: int = 0) -> None:
+        with self._lock:
+            histogram = self.latency.get((endpoint, kind))
+            if histogram is None:
+                histogram = self.latency[(endpoint, kind)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            self.statuses[(endpoint, status)] += 1
+            self.bytes[endpoint] += nbytes
+
+    def observe_query(self, kind: str, pages: int) -> None:
+        with self._lock:
+            histogram = self.pages.get(kind)
+            if histogram is None:
+                histogram = self.pages[kind] = Histogram(PAGE_BUCKETS)
+            histogram.observe(pages)
+
+    def observe_cache(self, endpoint: str, hit: bool) -> None:
+        with self._lock:
+            self.cache[(endpoint, 'hit' if hit else 'miss')] += 1
+
+    def observe_place(self, outcome: str, reason: str) -> None:
+        with self._lock:
+            self.places[(outcome, reason)] += 1
+
+    def observe_retry(self, endpoint: str, status: str) -> None:
+        with self._lock:
+            self.retries[(endpoint, status)] += 1
+
+    def observe_event(self, event: str) -> None:
+        with self._lock:
+            self.events[event] += 1
+
+    @property
+    def calls(self) -> int:
+        with self._lock:
+            return sum(h.count for h in self.latency.values())
+
+    def endpoint_latency(self, endpoint: str) -> Histogram:
+        """All query kinds of one endpoint merged"""
+        merged = Histogram(LATENCY_BUCKETS)
+        with self._lock:
+            for (ep, _), h in self.latency.items():
+                if ep == endpoint:
+                    merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+                    merged.count += h.count
+                    merged.sum += h.sum
+                    merged.max = max(merged.max, h.max)
+        return merged
+
+    def summary(self) -> Dict:
+        """Everything recorded so far, as plain JSON-ready data"""
+        with self._lock:
+            endpoints = sorted({ep for ep, _ in self.latency} | {ep for ep, _ in self.statuses})
+            by_query = {f"{ep} {kind}": h.to_dict() for (ep, kind), h in sorted(self.latency.items())}
+            statuses: Dict[str, Dict[str, int]] = {}
+            for (ep, status), n in sorted(self.statuses.items()):
+                statuses.setdefault(ep, {})[status] = n
+            cache: Dict[str, Dict[str, int]] = {}
+            for (ep, result), n in sorted(self.cache.items()):
+                cache.setdefault(ep, {})[result] = n
+            places: Dict[str, Dict[str, int]] = {}
+            for (outcome, reason), n in sorted(self.places.items()):
+                places.setdefault(outcome, {})[reason] = n
+            pages = {kind: h.to_dict() for kind, h in sorted(self.pages.items())}
+            received = dict(self.bytes)
+            retries: Dict[str, Dict[str, int]] = {}
+            for (ep, status), n in sorted(self.retries.items()):
+                retries.setdefault(ep, {})[status] = n
+            events = dict(sorted(self.events.items()))
+        elapsed = time.monotonic() - self.started
+        calls = sum(h['count'] for h in by_query.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'api_calls': calls,
+            'calls_per_sec': round(calls / elapsed, 2) if elapsed else None,
+            'latency': {ep: self.endpoint_latency(ep).to_dict() for ep in endpoints},
+            'latency_by_query': by_query,
+            'statuses': statuses,
+            'bytes_received': received,
+            'pages_per_query': pages,
+            'cache': cache,
+            'places': places,
+            'retries': retries,
+            'events': events,
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        p = METRIC_PREFIX
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, items: List[Tuple[Dict[str, str], Histogram]]) -> None:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for labels, h in items:
+                cumulative = 0
+                for bound, n in zip(list(h.bounds) + ['+Inf'], h.counts):
+                    cumulative += n
+                    lines.append(f"{p}_{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+                lines.append(f"{p}_{name}_sum{_labels(**labels)} {h.sum:.6f}")
+                lines.append(f"{p}_{name}_count{_labels(**labels)} {h.count}")
+
+        def counter(name: str, help_text: str, items: List[Tuple[Dict[str, str], int]]) -> None:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} counter")
+            for labels, n in items:
+                lines.append(f"{p}_{name}{_labels(**labels)} {n}")
+
+        with self._lock:
+            histogram('api_request_duration_seconds', 'Places API call latency.',
+                      [({'endpoint': ep, 'query': kind}, h) for (ep, kind), h in sorted(self.latency.items())])
+            counter('api_responses_total', 'Places API responses by status.',
+                    [({'endpoint': ep, 'status': s}, n) for (ep, s), n in sorted(self.statuses.items())])
+            counter('api_response_bytes_total', 'Bytes received from the Places API.',
+                    [({'endpoint': ep}, n) for ep, n in sorted(self.bytes.items())])
+            histogram('query_pages', 'Nearby Search pages fetched per query.',
+                      [({'query': kind}, h) for kind, h in sorted(self.pages.items())])
+            counter('cache_lookups_total', 'Response cache lookups.',
+                    [({'endpoint': ep, 'result': r}, n) for (ep, r), n in sorted(self.cache.items())])
+            counter('places_total', 'Places seen in search results, by outcome.',
+                    [({'outcome': o, 'reason': r}, n) for (o, r), n in sorted(self.places.items())])
+            counter('api_retries_total', 'Places API calls sent again, by the status that failed.',
+                    [({'endpoint': ep, 'status': s}, n) for (ep, s), n in sorted(self.retries.items())])
+            counter('scan_events_total', 'Circuit breaker trips, rate reductions and dead-lettered requests.',
+                    [({'event': e}, n) for e, n in sorted(self.events.items())])
+        lines.append(f"# HELP {p}_elapsed_seconds Time since the scan started.")
+        lines.append(f"# TYPE {p}_elapsed_seconds gauge")
+        lines.append(f"{p}_elapsed_seconds {time.monotonic() - self.started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+
+    def print_report(self) -> None:
+        """Per-endpoint latency, status and pagination overview"""
+        summary = self.summary()
+        print(f"\nAPI calls: {summary['api_calls']} in {summary['elapsed_s']:.0f} s "
+              f"({summary['calls_per_sec'] or 0:.1f}/s)")
+        for endpoint, h in summary['latency'].items():
+            statuses = ', '.join(f"{s} {n}" for s, n in summary['statuses'].get(endpoint, {}).items())
+            print(f"  {endpoint}: {h['count']} calls, p50 {h['p50']:.3f} s, p95 {h['p95']:.3f} s, "
+                  f"max {h['max']:.3f} s, {summary['bytes_received'].get(endpoint, 0) / 1e6:.1f} MB; {statuses}")
+        queries = sum(h['count'] for h in summary['pages_per_query'].values())
+        pages = sum(h['sum'] for h in summary['pages_per_query'].values())
+        if queries:
+            print(f"  pagination: {pages / queries:.2f} pages per query over {queries} queries")
+        for outcome, reasons in summary['places'].items():
+            print(f"  places {outcome}: " + ', '.join(f"{r} {n}" for r, n in reasons.items()))
+        for endpoint, statuses in summary['retries'].items():
+            print(f"  {endpoint} retries: " + ', '.join(f"{s} {n}" for s, n in statuses.items()))
+        if summary['events']:
+            print("  events: " + ', '.join(f"{e} {n}" for e, n in summary['events'].items()))
+
+
+def format_eta(seconds: float) -> str:
+    if seconds is None or seconds != seconds or seconds == float('inf'):
+        return '--:--'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+class ProgressLine:
+    """Redraws `status()` on one line every `interval` seconds from a background thread"""
+
+    def __init__(self, status: Callable[[], str], interval: float = 2.0, stream=None):
+        self.status = status
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+        self._width = 0
+
+    def _draw(self) -> None:
+        text = self.status()
+        if self.stream.isatty():
+            # Pad over the previous line's leftovers
+            self.stream.write('\r' + text.ljust(self._width))
+            self._width = len(text)
+        else:
+            self.stream.write(text + '\n')
+        self.stream.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def start(self) -> 'ProgressLine':
+        self._thread = threading.Thread(target=self._run, name='progress', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._draw()
+        if self.stream.isatty():
+            self.stream.write('\n')
@@ -0,0 +1,352 @@
+"""
+Local stand-in for the Places API Nearby Search and Place Details endpoints.
+
+Serves `<url>/nearbysearch/json` and `<url>/details/json` over HTTP from an
+in-memory dataset, so a fetcher pointed at it with
+`CafeFetcher(..., api_base_url=server.url)` runs unchanged and spends no
+quota. The dataset is either synthetic (clustered around a few centres,
+mixing cafes, bakeries, restaurants and look-alikes the rules reject) or
+recorded from an earlier scan's CSV.
+
+Nearby Search mimics the real API where it matters for the fetcher:
+results within the radius matching the type or keyword, ordered by
+prominence, capped at 60 and paged 20 at a time with a `next_page_token`
+that only becomes valid `token_delay` seconds after it is issued
+(INVALID_REQUEST before that). Latency, HTTP errors, OVER_QUERY_LIMIT
+responses and a requests-per-second quota are configurable, and
+`<url>/stats` returns the counts the server saw.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .spatial import PlaceIndex
+
+PAGE_SIZE = 20
+MAX_RESULTS = 60  # Nearby Search cap (3 pages x 20)
+TOKEN_TTL = 300.0  # seconds a page token stays usable
+
+# Synthetic places: (weight, name patterns, types, extra keywords). '{}' takes a random word.
+SYNTHETIC_KINDS = [
+    (30, ['{} Coffee', '{} Cafe', '{} Espresso Bar', '{} Roasters', 'Cafe {}'],
+     ['cafe', 'food', 'point_of_interest', 'establishment'], ['coffee', 'espresso', 'latte']),
+    (10, ['Tim Hortons', 'Starbucks', 'Second Cup', 'Good Earth Coffeehouse', 'Blenz Coffee'],
+     ['cafe', 'food', 'point_of_interest', 'establishment'], ['coffee', 'latte']),
+    (8, ['{} Tea House', '{} Bubble Tea', '{} Boba'],
+     ['cafe', 'food', 'point_of_interest', 'establishment'], ['tea house', 'bubble tea', 'boba']),
+    (10, ['{} Bakery', '{} Patisserie', '{} Bread Co.'],
+     ['bakery', 'food', 'store', 'point_of_interest', 'establishment'], ['cafe', 'coffee']),
+    (12, ['{} Bistro', '{} Kitchen', '{} Diner'],
+     ['restaurant', 'food', 'point_of_interest', 'establishment'], ['coffee']),
+    (15, ['{} Grill', '{} Pizza', '{} Noodle House', '{} Pub'],
+     ['restaurant', 'food', 'bar', 'point_of_interest', 'establishment'], []),
+    (5, ['Hotel {}', '{} Gas Station', '{} Convenience Store', '{} Library'],
+     ['lodging', 'gas_station', 'convenience_store', 'point_of_interest', 'establishment'], ['coffee', 'cafe']),
+    (10, ['{} Books', '{} Hardware', '{} Pharmacy', '{} Salon'],
+     ['store', 'point_of_interest', 'establishment'], []),
+]
+SYNTHETIC_WORDS = ['Maple', 'River', 'Northern', 'Prairie', 'Oak', 'Whyte', 'Jasper', 'Aurora', 'Cedar',
+                   'Summit', 'Harvest', 'Copper', 'Blue Door', 'Lantern', 'Granite', 'Willow', 'Bluebird',
+                   'Old Strathcona', 'Highlands', 'Garneau', 'Ritchie', 'Millwoods', 'Westmount', 'Beacon']
+STREETS = ['Jasper Ave', 'Whyte Ave', '124 St', '109 St', 'Gateway Blvd', 'Stony Plain Rd', '97 St', '82 Ave']
+
+
+class PlacesDataset:
+    """Places in Nearby Search result format, with details, indexed for radius queries"""
+
+    def __init__(self, places: Iterable[Dict], details: Dict[str, Dict] = None):
+        self.places = [p for p in places if p.get('place_id')]
+        self.by_id = {p['place_id']: p for p in self.places}
+        self.details = details or {}
+        # Text a keyword is matched against (Google also matches name, types and content)
+        self._text = {p['place_id']: ' '.join([p.get('name', ''), ' '.join(p.get('types', [])),
+                                               ' '.join(p.get('_keywords', []))]).lower().replace('_', ' ')
+                      for p in self.places}
+        located = [p for p in self.places if p.get('geometry', {}).get('location')]
+        self.index = PlaceIndex([p['place_id'] for p in located],
+                                [p['geometry']['location']['lat'] for p in located],
+                                [p['geometry']['location']['lng'] for p in located])
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    @classmethod
+    def synthetic(cls, n: int, bounds: Dict[str, float], seed: int = 0,
+                  clusters: int = 6, clustered_share: float = 0.6) -> 'PlacesDataset':
+        """`n` made-up places inside `bounds`; `clustered_share` of them around
+        `clusters` centres (a dense core and neighbourhood high streets)"""
+        rng = random.Random(seed)
+        height = bounds['north'] - bounds['south']
+        width = bounds['east'] - bounds['west']
+        centres = [(bounds['south'] + height * rng.uniform(0.2, 0.8), bounds['west'] + width * rng.uniform(0.2, 0.8),
+                    rng.uniform(0.004, 0.02)) for _ in range(clusters)]
+        weights = [kind[0] for kind in SYNTHETIC_KINDS]
+
+        places, details = [], {}
+        for i in range(n):
+            if rng.random() < clustered_share:
+                lat0, lng0, spread = rng.choice(centres)
+                lat = min(max(rng.gauss(lat0, spread), bounds['south']), bounds['north'])
+                lng = min(max(rng.gauss(lng0, spread * 1.6), bounds['west']), bounds['east'])
+            else:
+                lat = rng.uniform(bounds['south'], bounds['north'])
+                lng = rng.uniform(bounds['west'], bounds['east'])
+            _, patterns, types, keywords = rng.choices(SYNTHETIC_KINDS, weights)[0]
+            name = rng.choice(patterns).format(rng.choice(SYNTHETIC_WORDS))
+            place_id = f"mock{seed}_{i:06d}"
+            address = f"{rng.randint(100, 19999)} {rng.choice(STREETS)}"
+            place = {
+                'place_id': place_id,
+                'name': name,
+                'geometry': {'location': {'lat': round(lat, 7), 'lng': round(lng, 7)}},
+                'types': list(types),
+                'vicinity': f"{address}, Edmonton",
+                'business_status': rng.choices(['OPERATIONAL', 'CLOSED_TEMPORARILY', 'CLOSED_PERMANENTLY'],
+                                               [94, 3, 3])[0],
+                '_keywords': keywords,
+            }
+            if rng.random() < 0.9:
+                place['rating'] = round(rng.uniform(3.0, 5.0), 1)
+                # Heavy-tailed review counts drive prominence, as in the real ranking
+                place['user_ratings_total'] = int(rng.paretovariate(1.2) * 5)
+            if rng.random() < 0.6:
+                place['price_level'] = rng.randint(1, 3)
+            places.append(place)
+            details[place_id] = {
+                'formatted_address': f"{address} NW, Edmonton, AB T5J 0A1, Canada",
+                'formatted_phone_number': f"(780) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+                'website': f"https://example.com/{place_id}" if rng.random() < 0.7 else None,
+                'opening_hours': {'weekday_text': ['Monday: 7:00 AM – 6:00 PM', 'Tuesday: 7:00 AM – 6:00 PM'],
+                                  'open_now': rng.random() < 0.5},
+                'editorial_summary': {'overview': f"{name} in Edmonton"} if rng.random() < 0.3 else None,
+            }
+        return cls(places, details)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'PlacesDataset':
+        """Places recorded by an earlier scan (ellis-0-scan.csv columns)"""
+        import pandas as pd
+
+        df = pd.read_csv(path).astype(object)
+        df = df.where(df.notna(), None)
+        places, details = [], {}
+        for row in df.to_dict('records'):
+            place = {
+                'place_id': row['place_id'],
+                'name': row.get('name') or '',
+                'geometry': {'location': {'lat': float(row['lat']), 'lng': float(row['lng'])}},
+                'types': [t.strip() for t in (row.get('types') or '').split(',') if t.strip()],
+                'vicinity': row.get('address'),
+                'business_status': row.get('business_status'),
+            }
+            for key in ('rating', 'user_ratings_total', 'price_level'):
+                if row.get(key) is not None:
+                    place[key] = int(row[key]) if key != 'rating' else float(row[key])
+            places.append(place)
+            details[row['place_id']] = {
+                'formatted_address': row.get('formatted_address'),
+                'formatted_phone_number': row.get('phone'),
+                'website': row.get('website'),
+                'opening_hours': {'weekday_text': [h for h in (row.get('hours') or '').split('; ') if h],
+                                  'open_now': row.get('is_open_now')},
+                'editorial_summary': {'overview': row['description']} if row.get('description') else None,
+            }
+        return cls(places, details)
+
+    def search(self, lat: float, lng: float, radius: float, search_type: str = None,
+               keyword: str = None) -> List[Dict]:
+        """Matching places within `radius` metres, most prominent first, capped at 60"""
+        positions, _ = self.index.query_radius([lat], [lng], radius)
+        matches = []
+        for place_id in self.index.place_ids[positions[0]]:
+            place = self.by_id[str(place_id)]
+            if search_type and search_type not in place.get('types', []):
+                continue
+            if keyword and keyword.lower() not in self._text[place['place_id']]:
+                continue
+            matches.append(place)
+        matches.sort(key=lambda p: (-(p.get('user_ratings_total') or 0), p['place_id']))
+        return [public_fields(p) for p in matches[:MAX_RESULTS]]
+
+    def place_details(self, place_id: str) -> Optional[Dict]:
+        place = self.by_id.get(place_id)
+        if place is None:
+            return None
+        result = public_fields(place)
+        result.update({k: v for k, v in self.details.get(place_id, {}).items() if v is not None})
+        return result
+
+
+def public_fields(place: Dict) -> Dict:
+    """A place without the dataset's private (underscore) fields"""
+    return {k: v for k, v in place.items() if not k.startswith('_')}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        status, body = self.server.mock.handle(parsed.path, params)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockPlacesServer:
+    """HTTP server for a PlacesDataset; use as a context manager or start()/stop()"""
+
+    def __init__(self, dataset: PlacesDataset, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, over_query_limit_rate: float = 0.0, qps_limit: float = None,
+                 token_delay: float = 0.0, seed: int = 0, host: str = '127.0.0.1', port: int = 0):
+        self.dataset = dataset
+        self.latency = latency  # mean seconds per response
+        self.jitter = jitter  # latency varies uniformly by this share either way
+        self.error_rate = error_rate  # share of requests answered with HTTP 500
+        self.over_query_limit_rate = over_query_limit_rate  # share answered OVER_QUERY_LIMIT
+        self.qps_limit = qps_limit  # OVER_QUERY_LIMIT beyond this many requests in any second
+        self.token_delay = token_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, tuple] = {}  # token -> (remaining results, valid from, expires)
+        self._recent = deque()  # request times within the last second (qps_limit)
+        self.counts = {'nearbysearch': 0, 'details': 0, 'pages': 0, 'http_errors': 0,
+                       'over_query_limit': 0, 'invalid_request': 0, 'not_found': 0}
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockPlacesServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockPlacesServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def _delay(self) -> None:
+        if self.latency > 0:
+            with self._lock:
+                factor = self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            time.sleep(max(0.0, self.latency * factor))
+
+    def _injected_failure(self) -> Optional[tuple]:
+        """(status, body) for an injected error or quota response, else None"""
+        now = time.monotonic()
+        with self._lock:
+            roll = self._rng.random()
+            over_qps = False
+            if self.qps_limit:
+                while self._recent and self._recent[0] <= now - 1.0:
+                    self._recent.popleft()
+                over_qps = len(self._recent) >= self.qps_limit
+                self._recent.append(now)
+        if roll < self.error_rate:
+            self._count('http_errors')
+            return 500, {'error_message': 'Injected server error'}
+        if over_qps or roll < self.error_rate + self.over_query_limit_rate:
+            self._count('over_query_limit')
+            return 200, {'status': 'OVER_QUERY_LIMIT', 'results': [],
+                         'error_message': 'You have exceeded your rate-limit for this API.'}
+        return None
+
+    def handle(self, path: str, params: Dict[str, str]) -> tuple:
+        """(HTTP status, JSON body) for one request"""
+        if path.endswith('/stats'):
+            return 200, self.stats()
+        self._delay()
+        if not params.get('key'):
+            return 200, {'status': 'REQUEST_DENIED', 'error_message': 'The provided API key is invalid.'}
+        if path.endswith('/nearbysearch/json'):
+            self._count('nearbysearch')
+            return self._injected_failure() or self._nearby(params)
+        if path.endswith('/details/json'):
+            self._count('details')
+            return self._injected_failure() or self._details(params)
+        return 404, {'error_message': f"Unknown endpoint {path}"}
+
+    def _nearby(self, params: Dict[str, str]) -> tuple:
+        now = time.monotonic()
+        if 'pagetoken' in params:
+            with self._lock:
+                entry = self._tokens.get(params['pagetoken'])
+            if entry is None or now > entry[2] or now < entry[1]:
+                self._count('invalid_request')
+                return 200, {'status': 'INVALID_REQUEST', 'results': []}
+            results = entry[0]
+        else:
+            try:
+                lat, lng = (float(v) for v in params['location'].split(','))
+                radius = float(params['radius'])
+            except (KeyError, ValueError):
+                self._count('invalid_request')
+                return 200, {'status': 'INVALID_REQUEST', 'results': []}
+            results = self.dataset.search(lat, lng, min(radius, 50000.0), params.get('type'), params.get('keyword'))
+        if not results:
+            return 200, {'status': 'ZERO_RESULTS', 'results': []}
+
+        self._count('pages')
+        body = {'status': 'OK', 'results': results[:PAGE_SIZE]}
+        if len(results) > PAGE_SIZE:
+            with self._lock:
+                token = f"{self._rng.getrandbits(128):032x}"
+                self._tokens[token] = (results[PAGE_SIZE:], now + self.token_delay, now + TOKEN_TTL)
+            body['next_page_token'] = token
+        return 200, body
+
+    def _details(self, params: Dict[str, str]) -> tuple:
+        result = self.dataset.place_details(params.get('place_id', ''))
+        if result is None:
+            self._count('not_found')
+            return 200, {'status': 'NOT_FOUND'}
+        return 200, {'status': 'OK', 'result': result}
+
+
+def serve(dataset: PlacesDataset, url_queue, **options) -> None:
+    """Run a MockPlacesServer until the process is terminated, reporting its
+    URL on `url_queue` (a multiprocessing target, so the server's memory and
+    CPU stay out of a benchmark's measurements)"""
+    server = MockPlacesServer(dataset, **options)
+    url_queue.put(server.url)
+    server.serve_forever()
+
@@ -0,0 +1,231 @@
+"""
+Neighbourhood assignment and demographics for scanned cafes (the ellis-6 transform).
+
+Neighbourhood polygons are read once, from the ellis-4 open-data CSV (WKT
+in `the_geom`) or a GeoJSON file, and their edges are packed into NumPy
+arrays with a bounding box per neighbourhood. Cafes are sorted by
+latitude, so each neighbourhood's bbox selects its candidates with two
+binary searches. The candidates are then ray-cast against all the
+polygon's edges in one vectorized step. Areas come from the same
+vertices, projected to a sinusoidal (equal-area) grid before applying
+the shoelace formula, so no GIS stack is needed.
+
+Output matches ellis-6-transform.R: name, address, neighborhood,
+population, area (km2) and density_of_population. Population (ellis-5)
+and area are left-joined on the upper-cased, trimmed neighbourhood name,
+as in the R script, so a name listed twice in either table repeats the
+cafe's row once per match.
+"""
+
+import json
+import os
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .geometry import EARTH_RADIUS_M
+
+Ring = List[Tuple[float, float]]  # (lng, lat) vertices
+Polygon = List[Ring]  # outer ring first, then holes
+
+MAX_TEST_CELLS = 4_000_000  # point x edge comparisons per vectorized chunk
+
+
+def parse_wkt(wkt: str) -> List[Polygon]:
+    """Polygons of a WKT POLYGON or MULTIPOLYGON (Z/M ordinates are dropped)"""
+    kind, paren, body = wkt.strip().partition('(')
+    if not paren:
+        return []  # EMPTY
+    kind = kind.split()[0].upper() if kind.strip() else ''
+    if kind not in ('POLYGON', 'MULTIPOLYGON'):
+        raise ValueError(f"Unsupported WKT geometry: {kind or wkt[:30]}")
+    ring_depth = 2 if kind == 'POLYGON' else 3
+    body = paren + body
+
+    polygons: List[Polygon] = []
+    rings: List[Ring] = []
+    depth = start = 0
+    for i, ch in enumerate(body):
+        if ch == '(':
+            depth += 1
+            if depth == ring_depth:
+                start = i + 1
+        elif ch == ')':
+            if depth == ring_depth:
+                rings.append([tuple(float(v) for v in point.split()[:2])
+                              for point in body[start:i].split(',')])
+            elif depth == ring_depth - 1:
+                polygons.append(rings)
+                rings = []
+            depth -= 1
+    return polygons
+
+
+def _geojson_polygons(geometry: dict) -> List[Polygon]:
+    if not geometry:
+        return []
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return list(geometry['coordinates'])
+    return []
+
+
+def ring_area_m2(ring: Ring) -> float:
+    """Area of a ring on the sphere via the sinusoidal equal-area projection"""
+    coords = np.radians(np.asarray(ring, dtype=float)[:, :2])
+    lng, lat = coords[:, 0], coords[:, 1]
+    x = EARTH_RADIUS_M * (lng - lng.mean()) * np.cos(lat)
+    y = EARTH_RADIUS_M * lat
+    return abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2
+
+
+class NeighbourhoodIndex:
+    """Named (multi)polygons prepared for batched point assignment"""
+
+    def __init__(self, names: Sequence[str], shapes: Sequence[List[Polygon]]):
+        self.names = list(names)
+        self.edges: List[np.ndarray] = []  # per neighbourhood: (n_edges, 4) lng1, lat1, lng2, lat2
+        bboxes = []
+        areas = []
+        for polygons in shapes:
+            edges = []
+            area = 0.0
+            for polygon in polygons:
+                for r, ring in enumerate(polygon):
+                    ring_arr = np.asarray(ring, dtype=float)[:, :2]
+                    if len(ring_arr) < 3:
+                        continue
+                    # Every ring's edges; the even-odd rule takes care of holes
+                    edges.append(np.hstack([ring_arr, np.roll(ring_arr, -1, axis=0)]))
+                    area += ring_area_m2(ring_arr) * (1 if r == 0 else -1)
+            edges = np.vstack(edges) if edges else np.empty((0, 4))
+            self.edges.append(edges)
+            areas.append(area)
+            if len(edges):
+                bboxes.append([edges[:, 1].min(), edges[:, 0].min(), edges[:, 1].max(), edges[:, 0].max()])
+            else:
+                bboxes.append([np.nan] * 4)
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)  # south, west, north, east
+        self.area_km2 = np.asarray(areas) / 1e6
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path: str, geometry_column: str = 'the_geom',
+                 name_column: str = 'name') -> 'NeighbourhoodIndex':
+        """Neighbourhoods from a CSV with a WKT geometry column (ellis-4 open data)"""
+        df = pd.read_csv(path, usecols=[name_column, geometry_column])
+        df = df[df[geometry_column].notna()]
+        return cls(df[name_column].astype(str), [parse_wkt(w) for w in df[geometry_column]])
+
+    @classmethod
+    def from_geojson(cls, path: str, name_property: str = 'name') -> 'NeighbourhoodIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            features = json.load(f).get('features', [])
+        return cls([str((feature.get('properties') or {}).get(name_property)) for feature in features],
+                   [_geojson_polygons(feature.get('geometry')) for feature in features])
+
+    @classmethod
+    def from_file(cls, path: str) -> 'NeighbourhoodIndex':
+        if path.lower().endswith(('.geojson', '.json')):
+            return cls.from_geojson(path)
+        return cls.from_csv(path)
+
+    def assign(self, lats: Iterable[float], lngs: Iterable[float]) -> np.ndarray:
+        """Index of the neighbourhood containing each point (-1 for none;
+        the first match wins where polygons overlap)"""
+        lat = np.asarray(lats, dtype=float)
+        lng = np.asarray(lngs, dtype=float)
+        result = np.full(len(lat), -1, dtype=np.int64)
+        order = np.argsort(lat, kind='stable')
+        sorted_lat = lat[order]
+
+        for k, (south, west, north, east) in enumerate(self.bboxes):
+            if np.isnan(south):
+                continue
+            lo = np.searchsorted(sorted_lat, south, side='left')
+            hi = np.searchsorted(sorted_lat, north, side='right')
+            candidates = order[lo:hi]
+            candidates = candidates[(lng[candidates] >= west) & (lng[candidates] <= east) &
+                                    (result[candidates] < 0)]
+            if not len(candidates):
+                continue
+            x1, y1, x2, y2 = self.edges[k].T
+            step = max(1, MAX_TEST_CELLS // len(x1))
+            for start in range(0, len(candidates), step):
+                chunk = candidates[start:start + step]
+                px, py = lng[chunk, None], lat[chunk, None]
+                spans = (y1 > py) != (y2 > py)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+                inside = np.count_nonzero(spans & (px < cross), axis=1) % 2 == 1
+                result[chunk[inside]] = k
+        return result
+
+
+def _name_key(names: pd.Series) -> pd.Series:
+    return names.astype('string').str.strip().str.upper()
+
+
+def cafes_with_demographics(cafes: pd.DataFrame, neighbourhoods: NeighbourhoodIndex,
+                            population: pd.DataFrame) -> pd.DataFrame:
+    """A row per cafe with its neighbourhood, population, area and density
+    (more than one where the neighbourhood's name is duplicated, see above)"""
+    assigned = neighbourhoods.assign(cafes['lat'], cafes['lng'])
+    # Unassigned cafes (-1) pick the trailing missing value
+    names = np.array(neighbourhoods.names + [None], dtype=object)
+    neighbourhood = pd.Series(names[assigned], dtype='string')
+
+    # dplyr left_join semantics: every match kept, in cafe order (missing names match each other)
+    totals = pd.DataFrame({'key': _name_key(population['neighbourhood']),
+                           'population': pd.to_numeric(population['total_population'], errors='coerce')})
+    areas = pd.DataFrame({'key': _name_key(pd.Series(neighbourhoods.names, dtype='string')),
+                          'area': neighbourhoods.area_km2})
+    result = pd.DataFrame({
+        'name': cafes['name'].to_numpy(),
+        'address': cafes['address'].to_numpy(),
+        'neighborhood': neighbourhood,
+        'key': _name_key(neighbourhood),
+    }).merge(totals, on='key', how='left').merge(areas, on='key', how='left').drop(columns='key')
+    result['population'] = result['population'].astype('float64')
+    result['density_of_population'] = np.where(result['area'].fillna(0) > 0,
+                                               result['population'] / result['area'], np.nan)
+    return result
+
+
+def run_transform(cafes: pd.DataFrame, geometry_path: str, population_path: str,
+                  output_dir: str, db_path: str, table: str = 'ellis_6_cafes_with_demographics') -> pd.DataFrame:
+    """Build the demographics table and write it as CSV, RDS and a SQLite table"""
+    from .rds import write_rds
+    from .storage import connect
+
+    neighbourhoods = NeighbourhoodIndex.from_file(geometry_path)
+    population = pd.read_csv(population_path)
+    result = cafes_with_demographics(cafes, neighbourhoods, population)
+
+    print(f"\nTransformed {len(result)} cafes against {len(neighbourhoods)} neighbourhoods")
+    print(f"- Cafes with neighborhood assigned: {result['neighborhood'].notna().sum()}")
+    print(f"- Cafes with population data: {result['population'].notna().sum()}")
+    print(f"- Cafes with density calculated: {result['density_of_population'].notna().sum()}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    csv_file = os.path.join(output_dir, 'ellis-6-transform.csv')
+    result.to_csv(csv_file, index=False, encoding='utf-8')
+    print(f"CSV saved to: {csv_file}")
+    rds_file = os.path.join(output_dir, 'ellis-6-transform.rds')
+    write_rds(result, rds_file)
+    print(f"RDS saved to: {rds_file}")
+
+    try:
+        conn = connect(db_path)
+        try:
+            result.to_sql(table, conn, if_exists='replace', index=False)
+        finally:
+            conn.close()
+        print(f"SQLite table '{table}' saved to: {db_path}")
+    except Exception as e:
+        print(f"Warning: Could not save to SQLite: {e}")
+    return result
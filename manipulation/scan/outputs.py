@@ -0,0 +1,184 @@
+"""
+Output targets for a finished scan.
+
+`CafeFetcher.save_results(df, targets)` hands the final results to each
+target in turn. An entry point declares the list of files and tables its
+consumers need, so one scan can serve all of them:
+
+  CsvOutput         plain CSV ('{timestamp}' in the path is filled in)
+  RdsOutput         typed .rds for R (scan/rds.py, no R process)
+  ColumnarOutput    typed Parquet or Feather (needs pyarrow)
+  IndexOutput       spatial index .npz (scan/spatial.py)
+  SqliteOutput      keyed places table in global-data.sqlite (scan/storage.py)
+  VenueOutput       one record per venue plus the place_id -> venue_id map (scan/resolve.py)
+  TransformOutput   neighbourhood demographics of distinct venues (scan/neighbourhoods.py)
+  MetricsOutput     the scan's API metrics as JSON or Prometheus text (scan/metrics.py)
+"""
+
+import os
+from datetime import datetime
+
+import pandas as pd
+
+# Typed columns for RDS/Parquet/Feather; other object columns become strings
+COLUMN_DTYPES = {'lat': 'float64', 'lng': 'float64', 'rating': 'float64', 'user_ratings_total': 'Int64',
+                 'price_level': 'Int64', 'is_open_now': 'boolean'}
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Results with declared column types for the typed output formats"""
+    dtypes = {}
+    for column in df.columns:
+        if column in COLUMN_DTYPES:
+            dtypes[column] = COLUMN_DTYPES[column]
+        elif df[column].dtype == object:
+            dtypes[column] = 'string'
+    return df.astype(dtypes).reset_index(drop=True)
+
+
+def _ensure_dir(path: str) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+
+class OutputTarget:
+    """Destination for the final results DataFrame"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        raise NotImplementedError
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__}({self.path})"
+
+
+class CsvOutput(OutputTarget):
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        path = self.path.replace('{timestamp}', datetime.now().strftime('%Y%m%d_%H%M%S'))
+        _ensure_dir(path)
+        df.to_csv(path, index=False, encoding='utf-8')
+        print(f"CSV saved to: {path}")
+
+
+class RdsOutput(OutputTarget):
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        from .rds import write_rds
+
+        _ensure_dir(self.path)
+        write_rds(typed_frame(df), self.path)
+        print(f"RDS saved to: {self.path}")
+
+
+class ColumnarOutput(OutputTarget):
+    """Parquet or Feather, chosen by the file extension"""
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        fmt = 'feather' if self.path.endswith('.feather') else 'parquet'
+        try:
+            import pyarrow  # noqa: F401  (pandas' Parquet/Feather engine)
+        except ImportError:
+            print(f"Warning: pyarrow is not installed; skipping {self.path}")
+            print("Install it with: pip install pyarrow")
+            return
+        _ensure_dir(self.path)
+        if fmt == 'parquet':
+            typed_frame(df).to_parquet(self.path, index=False)
+        else:
+            typed_frame(df).to_feather(self.path)
+        print(f"{fmt.capitalize()} saved to: {self.path}")
+
+
+class IndexOutput(OutputTarget):
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        from .spatial import PlaceIndex
+
+        if 'lat' not in df or not df['lat'].notna().any():
+            return
+        _ensure_dir(self.path)
+        PlaceIndex.from_frame(df).save(self.path)
+        print(f"Spatial index saved to: {self.path}")
+
+
+class SqliteOutput(OutputTarget):
+    """Places table: replaced by a full scan, upserted by an incremental one;
+    both stamp the bookkeeping columns a later incremental run relies on"""
+
+    def __init__(self, path: str, table: str):
+        super().__init__(path)
+        self.table = table
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        from .storage import replace_places, upsert_places
+
+        try:
+            if fetcher.incremental:
+                counts = upsert_places(self.path, self.table, fetcher.table_records(df))
+                print(f"SQLite table '{self.table}' upserted in: {self.path}")
+                print(f"  New: {counts['inserted']}, updated: {counts['updated']}, "
+                      f"not seen in this scan: {counts['unseen']}")
+            else:
+                replace_places(self.path, self.table, fetcher.table_records(df))
+                print(f"SQLite table '{self.table}' saved to: {self.path}")
+            print(f"  Records: {len(df)}")
+        except Exception as e:
+            print(f"Warning: Could not save to SQLite: {e}")
+
+
+class VenueOutput(OutputTarget):
+    """Listings of one venue resolved to a venue_id: the canonical venue
+    records as CSV at `path`, every place_id with its venue_id at `ids_path`"""
+
+    def __init__(self, path: str, ids_path: str):
+        super().__init__(path)
+        self.ids_path = ids_path
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        from .resolve import canonical_venues, resolve_venues
+
+        if not len(df):
+            return
+        venues = resolve_venues(df)
+        records = canonical_venues(df, venues)
+        _ensure_dir(self.path)
+        records.to_csv(self.path, index=False, encoding='utf-8')
+        print(f"Venues saved to: {self.path}")
+        print(f"  Listings: {len(df)}, venues: {len(records)}")
+        _ensure_dir(self.ids_path)
+        venues.to_csv(self.ids_path, index=False, encoding='utf-8')
+        print(f"Venue ids saved to: {self.ids_path}")
+
+
+class TransformOutput(OutputTarget):
+    """Neighbourhood demographics (the ellis-6 transform) computed from the
+    results, counting each venue once (its canonical listing)"""
+
+    def __init__(self, neighbourhoods: str, population: str, output_dir: str, db_path: str):
+        super().__init__(output_dir)
+        self.neighbourhoods = neighbourhoods
+        self.population = population
+        self.db_path = db_path
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        from .neighbourhoods import run_transform
+        from .resolve import resolve_venues
+
+        missing = [p for p in (self.neighbourhoods, self.population) if not os.path.exists(p)]
+        if missing:
+            print(f"Warning: skipping neighbourhood transform, input not found: {', '.join(missing)}")
+            return
+        if len(df):
+            df = df[resolve_venues(df)['is_canonical'].to_numpy()]
+        run_transform(df, self.neighbourhoods, self.population, self.path, self.db_path)
+
+
+class MetricsOutput(OutputTarget):
+    """The fetcher's API metrics: Prometheus text for a .prom path, JSON otherwise"""
+
+    def write(self, df: pd.DataFrame, fetcher) -> None:
+        _ensure_dir(self.path)
+        if self.path.endswith('.prom'):
+            fetcher.metrics.write_prometheus(self.path)
+        else:
+            fetcher.metrics.write_json(self.path)
+        print(f"Metrics saved to: {self.path}")
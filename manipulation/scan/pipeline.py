@@ -0,0 +1,91 @@
+"""
+Bounded producer/consumer queue for overlapping scan phases.
+
+The producer (the search loop) blocks on `put` once `maxsize` items are
+waiting, so a slow consumer applies backpressure instead of letting the
+queue grow without bound. Worker exceptions are re-raised in the producer
+on its next `put` or on `close`.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, List
+
+_STOP = object()
+
+
+class WorkerQueue:
+    """Bounded queue drained by a pool of worker threads calling handler(item)"""
+
+    def __init__(self, handler: Callable[[Any], None], workers: int = 4, maxsize: int = 100,
+                 name: str = 'worker'):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+        self._threads: List[threading.Thread] = []
+        self._error: BaseException = None
+        self._aborted = threading.Event()
+
+    def start(self) -> 'WorkerQueue':
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                if not self._aborted.is_set():
+                    self.handler(item)
+            except BaseException as e:  # surfaced to the producer
+                if self._error is None:
+                    self._error = e
+                self._aborted.set()
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def put(self, item: Any) -> None:
+        """Enqueue an item, blocking while the queue is full"""
+        self._raise_if_failed()
+        while True:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                self._raise_if_failed()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Wait for queued items to finish, stop the workers and re-raise any worker error"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._raise_if_failed()
+
+    def abort(self) -> None:
+        """Skip remaining items and stop the workers without raising"""
+        self._aborted.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
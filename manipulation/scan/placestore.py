@@ -0,0 +1,144 @@
+"""
+Columnar store for the places a scan accepts (CafeFetcher.found_places).
+
+A dict per place repeats every column name in every row and keeps its own
+copy of values that are the same across thousands of places ('cafe, food,
+point_of_interest, establishment', 'OPERATIONAL', a rating of 4.5). The
+store keeps one list per column, coordinates in float arrays, a shared
+object for each distinct value of low-cardinality columns, and a
+place_id -> row index. Rows are added and updated as dicts and read back
+as dicts, and to_frame() hands the columns to pandas whole.
+
+It behaves like the dict of dicts it replaces: columns appear in the order
+they are first set, a row only has the fields set on it (missing ones are
+NaN in the frame), and iteration follows insertion order.
+"""
+
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+FLOAT_COLUMNS = ('lat', 'lng')  # always present on accepted places
+# Columns with few distinct values; equal values share one object
+INTERNED_COLUMNS = ('types', 'business_status', 'rating', 'price_level', 'is_open_now', 'hours')
+_MISSING = float('nan')  # placeholder for fields a row doesn't have (NaN in the frame)
+
+
+class PlaceStore:
+    """place_id -> record mapping stored column by column"""
+
+    def __init__(self, float_columns: Iterable[str] = FLOAT_COLUMNS,
+                 interned_columns: Iterable[str] = INTERNED_COLUMNS):
+        self.float_columns = set(float_columns)
+        self.interned_columns = set(interned_columns)
+        self.index: Dict[str, int] = {}  # place_id -> row
+        self.columns: Dict[str, Any] = {}  # name -> list, or array('d') for float columns
+        self._interned: Dict[str, Dict[Any, Any]] = {name: {} for name in self.interned_columns}
+        self._released = bytearray()  # 1 for rows dropped by release()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], **kwargs) -> 'PlaceStore':
+        store = cls(**kwargs)
+        for record in records:
+            store.add(record)
+        return store
+
+    def _column(self, name: str) -> Any:
+        column = self.columns.get(name)
+        if column is None:
+            rows = len(self._released)
+            column = array('d', [_MISSING]) * rows if name in self.float_columns else [_MISSING] * rows
+            self.columns[name] = column
+        return column
+
+    def _store(self, name: str, row: int, value: Any) -> None:
+        column = self._column(name)
+        if name in self.float_columns:
+            column[row] = _MISSING if value is None else value
+            return
+        if name in self._interned and value == value:  # NaN never matches itself
+            try:
+                value = self._interned[name].setdefault(value, value)
+            except TypeError:  # unhashable: keep as is
+                pass
+        column[row] = value
+
+    def add(self, record: Dict[str, Any]) -> int:
+        """Append a record (it must have a new place_id); return its row"""
+        place_id = record['place_id']
+        if place_id in self.index:
+            raise KeyError(f"place {place_id} is already stored")
+        row = len(self._released)
+        for column in self.columns.values():
+            column.append(_MISSING)
+        self._released.append(0)
+        self.index[place_id] = row
+        for name, value in record.items():
+            self._store(name, row, value)
+        return row
+
+    def update(self, place_id: str, fields: Dict[str, Any]) -> None:
+        """Set fields on a stored place"""
+        row = self.index[place_id]
+        for name, value in fields.items():
+            self._store(name, row, value)
+
+    def release(self, place_id: str) -> None:
+        """Drop a place's fields, keeping its id for de-duplication"""
+        row = self.index[place_id]
+        self._released[row] = 1
+        for name, column in self.columns.items():
+            if name != 'place_id' and name not in self.float_columns:
+                column[row] = _MISSING
+
+    def field(self, place_id: str, name: str, default: Any = None) -> Any:
+        value = self.columns[name][self.index[place_id]] if name in self.columns else _MISSING
+        return default if value is _MISSING else value
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        if self._released[row]:
+            return None
+        record = {}
+        for name, column in self.columns.items():
+            value = column[row]
+            if value is _MISSING or (name in self.float_columns and value != value):
+                continue
+            record[name] = value
+        return record
+
+    def __getitem__(self, place_id: str) -> Dict[str, Any]:
+        """The place's fields as a new dict (None once released)"""
+        return self._record(self.index[place_id])
+
+    def get(self, place_id: str, default: Any = None) -> Dict[str, Any]:
+        row = self.index.get(place_id)
+        return default if row is None else self._record(row)
+
+    def __contains__(self, place_id: object) -> bool:
+        return place_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def values(self) -> Iterator[Dict[str, Any]]:
+        return (self._record(row) for row in self.index.values())
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return ((place_id, self._record(row)) for place_id, row in self.index.items())
+
+    def to_frame(self) -> 'pd.DataFrame':
+        """All rows as a DataFrame indexed by place_id, one column at a time
+        (same columns and dtypes as DataFrame.from_dict(..., orient='index'))"""
+        import numpy as np
+        import pandas as pd
+
+        data: Dict[str, Any] = {}
+        for name, column in self.columns.items():
+            data[name] = np.array(column, dtype=float) if name in self.float_columns else column
+        ids: List[str] = list(self.index)
+        return pd.DataFrame(data, index=pd.Index(ids), columns=list(self.columns))
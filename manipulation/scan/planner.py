@@ -0,0 +1,133 @@
+"""
+Yield-driven query planning for grid scans.
+
+Most type/keyword queries at a grid point return place_ids that an earlier
+query already accepted. The planner tracks marginal yield, i.e. new
+accepted places per API call, for each query kind globally and per coarse
+area. It runs each circle's queries highest expected yield first and skips
+a query once enough evidence says its yield is below a threshold.
+
+A deterministic sample of would-be-skipped queries is run anyway as an
+audit. Those audits keep the yield estimates honest and let the report
+estimate, kind by kind, how many places pruning lost compared with the
+exhaustive plan.
+"""
+
+import hashlib
+import itertools
+import math
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, Set, Tuple
+
+RESULTS_PER_PAGE = 20
+
+
+def _sample(key: str, rate: float) -> bool:
+    """Deterministic Bernoulli(rate) draw keyed on a string"""
+    digest = int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16)
+    return digest < rate * 0x100000000
+
+
+class YieldStats:
+    """API calls and new accepted places observed for one query kind/area"""
+    __slots__ = ('calls', 'new', 'tasks')
+
+    def __init__(self):
+        self.calls = 0
+        self.new = 0
+        self.tasks = 0
+
+
+class QueryPlanner:
+    """Orders and prunes search tasks by expected new places per call"""
+
+    def __init__(self, threshold: float = 0.05, area_size: float = 0.1, min_samples: int = 20,
+                 prior_weight: float = 5.0, audit_rate: float = 0.1):
+        self.threshold = threshold  # minimum expected new places per call
+        self.area_size = area_size  # degrees per area cell
+        self.min_samples = min_samples  # calls of a kind before it can be pruned
+        self.prior_weight = prior_weight  # pseudo-calls of the global rate mixed into each area
+        self.audit_rate = audit_rate
+        self.by_kind: Dict[str, YieldStats] = defaultdict(YieldStats)
+        self.by_area: Dict[Tuple[str, Tuple[int, int]], YieldStats] = defaultdict(YieldStats)
+        self.skipped: Dict[str, int] = defaultdict(int)  # kind -> tasks skipped
+        self.audits: Set[str] = set()  # keys of would-be-skipped tasks run as audits
+        self.audit_tasks: Dict[str, int] = defaultdict(int)  # kind -> audits run
+        self.audit_new: Dict[str, int] = defaultdict(int)  # kind -> new places the audits found
+
+    def area_of(self, point: Dict[str, float]) -> Tuple[int, int]:
+        return (math.floor(point['lat'] / self.area_size), math.floor(point['lng'] / self.area_size))
+
+    def expected_yield(self, task: Any) -> float:
+        """Area yield shrunk towards the kind's global yield (optimistic until sampled)"""
+        kind = self.by_kind[task.query]
+        if kind.calls == 0:
+            return math.inf
+        global_rate = kind.new / kind.calls
+        area = self.by_area[(task.query, self.area_of(task.point))]
+        return (area.new + self.prior_weight * global_rate) / (area.calls + self.prior_weight)
+
+    def plan(self, tasks: Iterable[Any], keep: Callable[[Any], bool] = None) -> Iterator[Any]:
+        """Yield tasks to run, each circle's queries best-first, dropping low-yield ones.
+        
+        Decisions are made lazily as tasks are drawn, so they use every
+        result handled up to that point. Tasks for which keep(task) is true
+        (e.g. already completed) are never dropped.
+        """
+        for _, group in itertools.groupby(tasks, key=lambda t: t.group):
+            for task in sorted(group, key=self.expected_yield, reverse=True):
+                if (keep and keep(task)) or self.by_kind[task.query].calls < self.min_samples or \
+                        self.expected_yield(task) >= self.threshold:
+                    yield task
+                elif _sample(task.key, self.audit_rate):
+                    self.audits.add(task.key)
+                    yield task
+                else:
+                    self.skipped[task.query] += 1
+
+    def record(self, task: Any, n_results: int, new_places: int) -> None:
+        """Feed back a handled task's result count and newly accepted places"""
+        calls = max(1, math.ceil(n_results / RESULTS_PER_PAGE))
+        for stats in (self.by_kind[task.query], self.by_area[(task.query, self.area_of(task.point))]):
+            stats.calls += calls
+            stats.new += new_places
+            stats.tasks += 1
+        if task.key in self.audits:
+            self.audit_tasks[task.query] += 1
+            self.audit_new[task.query] += new_places
+
+    def missed_estimate(self, kind: str) -> float:
+        """Places the skipped tasks of one kind would have found: its audits are
+        a random sample of them (kinds without audits use all audits)"""
+        if self.audit_tasks[kind]:
+            return self.skipped[kind] * self.audit_new[kind] / self.audit_tasks[kind]
+        audit_tasks = sum(self.audit_tasks.values())
+        return self.skipped[kind] * sum(self.audit_new.values()) / audit_tasks if audit_tasks else 0.0
+
+    def report(self, found: int) -> Dict[str, float]:
+        """Print per-kind yield and estimated savings and recall loss; return the totals"""
+        print("\nQuery planner yield by kind:")
+        print(f"  {'query':<22} {'tasks':>6} {'calls':>6} {'new':>6} {'new/call':>9} {'skipped':>8} {'audits':>7}")
+        calls_saved = 0.0
+        lost = 0.0
+        for kind in sorted(set(self.by_kind) | set(self.skipped)):
+            stats = self.by_kind[kind]
+            per_call = stats.new / stats.calls if stats.calls else 0.0
+            calls_per_task = stats.calls / stats.tasks if stats.tasks else 1.0
+            calls_saved += self.skipped[kind] * calls_per_task
+            lost += self.missed_estimate(kind)
+            print(f"  {kind:<22} {stats.tasks:>6} {stats.calls:>6} {stats.new:>6} "
+                  f"{per_call:>9.3f} {self.skipped[kind]:>8} {self.audit_tasks[kind]:>7}")
+        
+        skipped = sum(self.skipped.values())
+        calls_made = sum(s.calls for s in self.by_kind.values())
+        audit_tasks, audit_new = sum(self.audit_tasks.values()), sum(self.audit_new.values())
+        recall_loss = lost / (found + lost) if found + lost else 0.0
+        print(f"  skipped {skipped} tasks, ~{calls_saved:.0f} calls saved "
+              f"({calls_saved / (calls_made + calls_saved):.1%} of the exhaustive plan)"
+              if calls_made + calls_saved else "  no tasks planned")
+        print(f"  audits: {audit_tasks} would-be-skipped tasks found {audit_new} new places; "
+              f"estimated {lost:.1f} places missed ({recall_loss:.2%} recall loss)")
+        print(f"  {calls_made / found if found else 0:.2f} calls per discovered cafe")
+        return {'skipped_tasks': skipped, 'calls_saved': calls_saved, 'audit_tasks': audit_tasks,
+                'audit_new': audit_new, 'estimated_missed': lost, 'recall_loss': recall_loss}
@@ -0,0 +1,61 @@
+"""
+Adaptive quadtree coverage for Nearby Search.
+
+Nearby Search returns at most 60 results (3 pages of 20) per query, so a
+circle over a dense area silently drops places. The adaptive scan starts
+from coarse cells and only splits a cell into four children, each searched
+with the smaller circle circumscribing it, when one of its queries hits
+that cap. Cells with no results are never refined.
+"""
+
+from typing import Dict, List, NamedTuple
+
+from .geometry import haversine_m
+
+
+class Cell(NamedTuple):
+    """Axis-aligned lat/lng cell searched with its circumscribing circle"""
+    south: float
+    west: float
+    north: float
+    east: float
+    level: int = 0
+
+    @property
+    def center(self) -> Dict[str, float]:
+        return {'lat': (self.south + self.north) / 2, 'lng': (self.west + self.east) / 2}
+
+    @property
+    def radius_m(self) -> float:
+        """Radius (metres) of the circle through the cell's corners"""
+        c = self.center
+        # The southern corners are furthest from the centre in the northern hemisphere
+        return max(haversine_m(c['lat'], c['lng'], self.south, self.west),
+                   haversine_m(c['lat'], c['lng'], self.north, self.west))
+
+    def split(self) -> List['Cell']:
+        """Four equal children one level down (SW, SE, NW, NE)"""
+        mid_lat = (self.south + self.north) / 2
+        mid_lng = (self.west + self.east) / 2
+        level = self.level + 1
+        return [
+            Cell(self.south, self.west, mid_lat, mid_lng, level),
+            Cell(self.south, mid_lng, mid_lat, self.east, level),
+            Cell(mid_lat, self.west, self.north, mid_lng, level),
+            Cell(mid_lat, mid_lng, self.north, self.east, level),
+        ]
+
+
+def root_cells(bounds: Dict[str, float], size: float) -> List[Cell]:
+    """Tile `bounds` with level-0 cells of roughly `size` degrees, south to north"""
+    n_lat = max(1, round((bounds['north'] - bounds['south']) / size))
+    n_lng = max(1, round((bounds['east'] - bounds['west']) / size))
+    d_lat = (bounds['north'] - bounds['south']) / n_lat
+    d_lng = (bounds['east'] - bounds['west']) / n_lng
+    cells = []
+    for i in range(n_lat):
+        for j in range(n_lng):
+            south = bounds['south'] + i * d_lat
+            west = bounds['west'] + j * d_lng
+            cells.append(Cell(south, west, south + d_lat, west + d_lng, 0))
+    return cells
@@ -0,0 +1,56 @@
+"""
+Token-bucket rate limiting for Places API calls.
+
+A single bucket is shared by every worker thread of a fetcher so the
+combined request rate never exceeds the configured requests per second,
+however many calls are in flight. Its rate can be changed while calls
+wait (scan/retry.py lowers it when the API pushes back).
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = float(rate)
+        # Default burst is one second's worth of tokens
+        self._fixed_capacity = capacity is not None
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Refill at `rate` from now on (a default burst size follows the rate)"""
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if not self._fixed_capacity:
+                self.capacity = max(1.0, self.rate)
+                self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available and take them; return seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,160 @@
+"""
+Pure-Python writer for R's RDS format, for the flat data frames the scan produces.
+
+Writes what `saveRDS(df, path)` would: gzip-compressed XDR serialization
+(format version 3, UTF-8 native encoding) of a list with names, class
+and compact row.names attributes. Column types map as:
+
+  bool / boolean          -> logical
+  integer / Int64         -> integer (double if outside the 32-bit range)
+  float                   -> double (NaN -> NA)
+  anything else           -> character (None/NaN -> NA_character_)
+
+so `readRDS()` returns a typed tibble without R ever parsing a CSV.
+"""
+
+import gzip
+import struct
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# SEXP types and flag bits from R's serialize.c
+NILVALUE_SXP = 254
+SYMSXP = 1
+LISTSXP = 2
+CHARSXP = 9
+LGLSXP = 10
+INTSXP = 13
+REALSXP = 14
+STRSXP = 16
+VECSXP = 19
+IS_OBJECT = 1 << 8
+HAS_ATTR = 1 << 9
+HAS_TAG = 1 << 10
+UTF8_MASK = 1 << 3
+ASCII_MASK = 1 << 6
+
+NA_INTEGER = -2 ** 31
+NA_REAL = struct.unpack('>d', bytes.fromhex('7ff00000000007a2'))[0]  # R's NA, not just any NaN
+WRITER_VERSION = (4 << 16) | (3 << 8)  # R 4.3.0
+MIN_READER_VERSION = (3 << 16) | (5 << 8)  # R 3.5.0 reads format version 3
+DATA_FRAME_CLASS = ['tbl_df', 'tbl', 'data.frame']
+
+
+class _Writer:
+    """Accumulates XDR-encoded chunks"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def int(self, value: int) -> None:
+        self.chunks.append(struct.pack('>i', value))
+
+    def ints(self, values: np.ndarray) -> None:
+        self.chunks.append(values.astype('>i4').tobytes())
+
+    def doubles(self, values: np.ndarray) -> None:
+        self.chunks.append(values.astype('>f8').tobytes())
+
+    def charsxp(self, value) -> None:
+        if value is None:
+            self.int(CHARSXP)
+            self.int(-1)  # NA_STRING
+            return
+        data = value.encode('utf-8')
+        self.int(CHARSXP | ((ASCII_MASK if data.isascii() else UTF8_MASK) << 12))
+        self.int(len(data))
+        self.chunks.append(data)
+
+    def strsxp(self, values, flags: int = 0) -> None:
+        self.int(STRSXP | flags)
+        self.int(len(values))
+        for value in values:
+            self.charsxp(value)
+
+    def symbol(self, name: str) -> None:
+        self.int(SYMSXP)
+        self.charsxp(name)
+
+
+def _is_logical(series: pd.Series) -> bool:
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return True
+    if series.dtype != object:
+        return False
+    values = series.dropna()
+    return len(values) > 0 and all(isinstance(v, (bool, np.bool_)) for v in values)
+
+
+def _write_column(out: _Writer, series: pd.Series) -> None:
+    missing = series.isna().to_numpy()
+    if _is_logical(series):
+        values = np.where(missing, NA_INTEGER, series.fillna(False).astype(bool).to_numpy().astype(np.int64))
+        out.int(LGLSXP)
+        out.int(len(values))
+        out.ints(values)
+    elif pd.api.types.is_integer_dtype(series.dtype):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        finite = values[~missing]
+        if len(finite) and (finite.min() <= NA_INTEGER or finite.max() >= 2 ** 31):
+            out.int(REALSXP)
+            out.int(len(values))
+            out.doubles(np.where(missing, NA_REAL, values))
+        else:
+            out.int(INTSXP)
+            out.int(len(values))
+            out.ints(np.where(missing, NA_INTEGER, np.nan_to_num(values)).astype(np.int64))
+    elif pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        out.int(REALSXP)
+        out.int(len(values))
+        out.doubles(np.where(missing, NA_REAL, values))
+    else:
+        out.strsxp([None if m else str(v) for v, m in zip(series.tolist(), missing)])
+
+
+def _write_attributes(out: _Writer, attributes: List) -> None:
+    """Attribute pairlist of (name, writer) pairs"""
+    for name, write_value in attributes:
+        out.int(LISTSXP | HAS_TAG)
+        out.symbol(name)
+        write_value()
+    out.int(NILVALUE_SXP)
+
+
+def serialize_frame(df: pd.DataFrame) -> bytes:
+    """Uncompressed RDS serialization of `df` (index is dropped)"""
+    out = _Writer()
+    out.chunks.append(b'X\n')
+    out.int(3)
+    out.int(WRITER_VERSION)
+    out.int(MIN_READER_VERSION)
+    out.int(len('UTF-8'))
+    out.chunks.append(b'UTF-8')
+
+    out.int(VECSXP | IS_OBJECT | HAS_ATTR)
+    out.int(df.shape[1])
+    for column in df.columns:
+        _write_column(out, df[column])
+
+    def row_names():
+        # Compact form c(NA, -n) for automatic row names 1..n
+        out.int(INTSXP)
+        out.int(2)
+        out.int(NA_INTEGER)
+        out.int(-len(df))
+
+    _write_attributes(out, [
+        ('names', lambda: out.strsxp([str(c) for c in df.columns])),
+        ('row.names', row_names),
+        ('class', lambda: out.strsxp(DATA_FRAME_CLASS)),
+    ])
+    return b''.join(out.chunks)
+
+
+def write_rds(df: pd.DataFrame, path: str, compresslevel: int = 6) -> None:
+    """Write `df` as a gzip-compressed .rds file, like saveRDS()"""
+    with gzip.open(path, 'wb', compresslevel=compresslevel) as f:
+        f.write(serialize_frame(df))
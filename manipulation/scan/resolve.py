@@ -0,0 +1,324 @@
+"""
+Venue resolution: one venue per cafe, however many place_ids Google lists it under.
+
+Google often lists a cafe more than once: a relocated listing next to the
+old one, a kiosk inside a store, "Tim Hortons" next to "Tim Hortons
+Drive-Thru". Scans de-duplicate by place_id only, so such listings are
+counted as separate cafes downstream. resolve_venues() clusters them:
+
+  1. Blocking: places are bucketed into geohash cells at least `radius_m`
+     on a side, so every pair closer than that lies in the same or in
+     adjacent cells. Candidate pairs are expanded per cell with NumPy and
+     filtered by distance; nothing else is compared, which
+     keeps the work near-linear in the number of places.
+  2. Matching: a candidate pair is one venue when the normalized names
+     agree (equal, one contained in the other, or nearly equal) and the
+     listings share a spot (within `same_spot_m`), a normalized street
+     address, or one of them is permanently closed (a relocated listing).
+     The location tests run on all pairs at once; names are compared
+     once per distinct pair of normalized names.
+  3. Clustering: union-find over the matched pairs. Each cluster's
+     canonical listing is the operational one with the most reviews, and
+     its place_id is the cluster's venue_id.
+
+canonical_venues() then builds one record per venue from its canonical
+listing, with gaps (phone, website, hours) filled from the other listings.
+"""
+
+import math
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .geometry import METRES_PER_DEGREE_LAT
+from .spatial import _expand_ranges, haversine_np
+
+MATCH_RADIUS_M = 150.0  # listings further apart are never one venue
+SAME_SPOT_M = 50.0  # closer listings with matching names are one venue whatever their addresses
+NAME_SIMILARITY = 0.9  # SequenceMatcher ratio of two name keys that counts as the same name
+MAX_PRECISION = 9  # geohash characters (~4.8 m x 4.8 m cells)
+
+GEOHASH_BASE32 = np.array(list('0123456789bcdefghjkmnpqrstuvwxyz'))
+# Half of the 3x3 neighbourhood (plus the cell itself), so each pair of cells is visited once
+NEIGHBOUR_OFFSETS = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+# Words that tell listings of one venue apart rather than name it
+LISTING_WORDS = {'the', 'drive', 'thru', 'through', 'kiosk', 'express', 'inc', 'ltd', 'co', 'company',
+                 'location', 'store', 'shop', 'cafe', 'caffe', 'coffee', 'coffeehouse', 'coffeeshop'}
+# Location suffixes, as stripped by clean_name() in clean-cafe-list.R
+NAME_SUFFIXES = [re.compile(pattern) for pattern in (
+    r' [-–—] .*$',  # "Second Cup - Jasper Ave"
+    r' \([^)]*\)$',  # "Starbucks (Safeway)"
+    r' #\s*\d+$',  # "Booster Juice #12"
+    r' unit \d+.*$',
+)]
+ADDRESS_WORDS = {'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+                 'trail': 'tr', 'crescent': 'cres', 'place': 'pl', 'court': 'ct', 'highway': 'hwy',
+                 'northwest': 'nw', 'northeast': 'ne', 'southwest': 'sw', 'southeast': 'se'}
+ADDRESS_UNIT = re.compile(r'^(?:(?:unit|suite|ste|bay)\s*\w+\s*,?\s*|#?\w+\s*-\s*(?=\d))')
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def _ascii_lower(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def normalize_name(name: str) -> str:
+    """Comparable form of a place name: lower-case ASCII words, sorted,
+    without location suffixes or listing words ('' for no name)"""
+    if not isinstance(name, str):
+        return ''
+    text = _ascii_lower(name).replace('&', ' and ').replace("'", '').replace('’', '')
+    for suffix in NAME_SUFFIXES:
+        text = suffix.sub('', text)
+    words = NON_WORD.sub(' ', text).split()
+    # A name made only of listing words ("The Coffee Shop") is kept whole
+    kept = [word for word in words if word not in LISTING_WORDS] or words
+    return ' '.join(sorted(set(kept)))
+
+
+def normalize_address(address: str) -> str:
+    """Comparable street address: the part before the first comma, without
+    unit numbers, with common street words abbreviated ('' for none)"""
+    if not isinstance(address, str):
+        return ''
+    street = ADDRESS_UNIT.sub('', _ascii_lower(address).strip()).split(',')[0]
+    words = NON_WORD.sub(' ', street).split()
+    return ' '.join(ADDRESS_WORDS.get(word, word) for word in words)
+
+
+def names_match(a: str, b: str) -> bool:
+    """Normalized names of one venue: equal, one's words within the other's, or nearly equal"""
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+    words_a, words_b = set(a.split()), set(b.split())
+    if words_a <= words_b or words_b <= words_a:
+        return True
+    # The quick ratios are upper bounds of ratio(), so most pairs stop there
+    matcher = SequenceMatcher(None, a, b)
+    return (matcher.real_quick_ratio() >= NAME_SIMILARITY and matcher.quick_ratio() >= NAME_SIMILARITY
+            and matcher.ratio() >= NAME_SIMILARITY)
+
+
+def geohash_precision(radius_m: float, max_abs_lat: float) -> int:
+    """Most geohash characters whose cells are still at least radius_m high
+    and wide (the width measured at the highest latitude of the places)"""
+    scale = max(math.cos(math.radians(min(max_abs_lat, 89.0))), 0.01)
+    for precision in range(MAX_PRECISION, 0, -1):
+        lat_bits, lng_bits = (5 * precision) // 2, (5 * precision + 1) // 2
+        height = 180.0 / 2 ** lat_bits * METRES_PER_DEGREE_LAT
+        width = 360.0 / 2 ** lng_bits * METRES_PER_DEGREE_LAT * scale
+        if min(height, width) >= radius_m:
+            return precision
+    return 1
+
+
+def geohash_cells(lats, lngs, precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, column) of each point's geohash cell on the grid of `precision` characters"""
+    lat_bits, lng_bits = (5 * precision) // 2, (5 * precision + 1) // 2
+    y = np.floor((np.asarray(lats, dtype=float) + 90.0) / 180.0 * 2 ** lat_bits).astype(np.int64)
+    x = np.floor((np.asarray(lngs, dtype=float) + 180.0) / 360.0 * 2 ** lng_bits).astype(np.int64)
+    return np.clip(y, 0, 2 ** lat_bits - 1), np.clip(x, 0, 2 ** lng_bits - 1)
+
+
+def geohash_encode(y: np.ndarray, x: np.ndarray, precision: int) -> np.ndarray:
+    """Geohash strings of grid cells from geohash_cells (bits interleaved, longitude first)"""
+    lat_bits, lng_bits = (5 * precision) // 2, (5 * precision + 1) // 2
+    code = np.zeros(len(y), dtype=np.int64)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (x >> (lng_bits - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+    chars = [GEOHASH_BASE32[(code >> (5 * (precision - 1 - k))) & 31] for k in range(precision)]
+    result = chars[0].astype(object)
+    for column in chars[1:]:
+        result = result + column.astype(object)
+    return result
+
+
+def candidate_pairs(lats, lngs, radius_m: float = MATCH_RADIUS_M,
+                    precision: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(i, j, metres) for every pair of points (i < j) within radius_m,
+    found by comparing each geohash cell with itself and its neighbours"""
+    lat = np.asarray(lats, dtype=float)
+    lng = np.asarray(lngs, dtype=float)
+    if precision is None:
+        precision = geohash_precision(radius_m, float(np.abs(lat).max(initial=0.0)))
+    y, x = geohash_cells(lat, lng, precision)
+    width = 2 ** ((5 * precision + 1) // 2)
+    order = np.argsort(y * width + x, kind='stable')
+    cells, start, count = np.unique((y * width + x)[order], return_index=True, return_counts=True)
+    cell_y, cell_x = cells // width, cells % width
+    # Positions below are into the cell-sorted arrays
+    lat_s, lng_s = lat[order], lng[order]
+    lng_scale = np.cos(np.radians(lat_s))
+
+    found_i, found_j, found_d = [], [], []
+    for dy, dx in NEIGHBOUR_OFFSETS:
+        # Cell pairs: each occupied cell with its occupied neighbour at (dy, dx)
+        nx = cell_x + dx
+        neighbour = (cell_y + dy) * width + nx
+        k = np.minimum(np.searchsorted(cells, neighbour), len(cells) - 1)
+        hit = (cells[k] == neighbour) & (nx >= 0) & (nx < width)
+        a, b = np.nonzero(hit)[0], k[hit]
+        # Every member of cell a against every member of cell b
+        cols = np.repeat(b, count[a])
+        i = np.repeat(_expand_ranges(start[a], count[a]), count[cols])
+        j = _expand_ranges(start[cols], count[cols])
+        if dy == 0 and dx == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        # Flat-earth distance first (within 1% at this scale), great-circle for the few left
+        dlat = lat_s[i] - lat_s[j]
+        dlng = (lng_s[i] - lng_s[j]) * lng_scale[i]
+        near = dlat * dlat + dlng * dlng <= (1.01 * radius_m / METRES_PER_DEGREE_LAT) ** 2
+        i, j = i[near], j[near]
+        dist = haversine_np(lat_s[i], lng_s[i], lat_s[j], lng_s[j])
+        near = dist <= radius_m
+        i, j = order[i[near]], order[j[near]]
+        found_i.append(np.minimum(i, j))
+        found_j.append(np.maximum(i, j))
+        found_d.append(dist[near])
+    return np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_d)
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 (path halving, union by size)"""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+def _key_codes(values: pd.Series, normalize) -> Tuple[np.ndarray, List[str]]:
+    """(code per value, keys by code): values with the same normalize()
+    key share a code, -1 for an empty key. Each distinct value is
+    normalized once."""
+    value_codes, distinct = pd.factorize(values)
+    keys = np.array([normalize(value) for value in distinct] + [''], dtype=object)  # [-1]: missing values
+    codes, uniques = pd.factorize(keys[value_codes])
+    uniques = list(uniques)
+    if '' in uniques:
+        codes[codes == uniques.index('')] = -1
+    return codes, uniques
+
+
+def resolve_venues(places: pd.DataFrame, radius_m: float = MATCH_RADIUS_M,
+                   same_spot_m: float = SAME_SPOT_M) -> pd.DataFrame:
+    """Cluster listings of the same venue.
+
+    Returns one row per place, in the order of `places`: place_id,
+    venue_id (the canonical listing's place_id), geohash (the blocking
+    cell) and is_canonical."""
+    places = places.reset_index(drop=True)
+    lat = places['lat'].to_numpy(dtype=float)
+    lng = places['lng'].to_numpy(dtype=float)
+    located = np.flatnonzero(np.isfinite(lat) & np.isfinite(lng))
+    precision = geohash_precision(radius_m, float(np.abs(lat[located]).max(initial=0.0)))
+
+    none = pd.Series(np.nan, index=places.index)
+    union = UnionFind(len(places))
+    if len(located):
+        i, j, dist = candidate_pairs(lat[located], lng[located], radius_m, precision)
+        i, j = located[i], located[j]
+        # Where the listings are must fit first: that is cheap to test for every pair
+        addresses, _ = _key_codes(places.get('formatted_address', none).fillna(places['address']),
+                                  normalize_address)
+        closed = (places.get('business_status', none) == 'CLOSED_PERMANENTLY').to_numpy()
+        same_address = (addresses[i] == addresses[j]) & (addresses[i] >= 0)
+        placed = (dist <= same_spot_m) | same_address | closed[i] | closed[j]
+        i, j = i[placed], j[placed]
+        # Then the names, compared once per distinct pair of name keys
+        names, keys = _key_codes(places['name'], normalize_name)
+        named = (names[i] >= 0) & (names[j] >= 0)
+        i, j = i[named], j[named]
+        lo, hi = np.minimum(names[i], names[j]), np.maximum(names[i], names[j])
+        name_pairs, inverse = np.unique(lo * len(keys) + hi, return_inverse=True)
+        same = np.array([names_match(keys[p // len(keys)], keys[p % len(keys)]) for p in name_pairs.tolist()],
+                        dtype=bool)
+        matched = same[inverse.reshape(-1)] if len(name_pairs) else np.zeros(0, dtype=bool)
+        for a, b in zip(i[matched].tolist(), j[matched].tolist()):
+            union.union(a, b)
+    cluster = union.roots()
+
+    # Canonical listing: operational, most reviewed, with details, then by place_id
+    operational = (places.get('business_status', none) == 'OPERATIONAL').to_numpy()
+    reviews = pd.to_numeric(places.get('user_ratings_total', none), errors='coerce').fillna(-1).to_numpy()
+    detailed = places.get('formatted_address', none).notna().to_numpy()
+    place_ids = places['place_id'].astype(str).to_numpy()
+    rank = np.lexsort((place_ids, ~detailed, -reviews, ~operational, cluster))
+    first = np.ones(len(rank), dtype=bool)
+    first[1:] = cluster[rank][1:] != cluster[rank][:-1]
+    canonical_of = dict(zip(cluster[rank][first].tolist(), place_ids[rank][first].tolist()))
+    is_canonical = np.zeros(len(places), dtype=bool)
+    is_canonical[rank[first]] = True
+
+    y, x = geohash_cells(np.nan_to_num(lat), np.nan_to_num(lng), precision)
+    geohash = geohash_encode(y, x, precision)
+    geohash[~(np.isfinite(lat) & np.isfinite(lng))] = None
+    return pd.DataFrame({
+        'place_id': place_ids,
+        'venue_id': [canonical_of[c] for c in cluster.tolist()],
+        'geohash': geohash,
+        'is_canonical': is_canonical,
+    })
+
+
+def canonical_venues(places: pd.DataFrame, venues: pd.DataFrame) -> pd.DataFrame:
+    """One record per venue (venues from resolve_venues): the canonical
+    listing's fields with gaps filled from its other listings, plus
+    venue_id, listings (how many place_ids) and place_ids (canonical first)"""
+    places = places.reset_index(drop=True)
+    venue_ids = venues['venue_id'].to_numpy(dtype=object)
+    canonical = venues['is_canonical'].to_numpy()
+    result = places[canonical].set_axis(pd.Index(venue_ids[canonical], name='venue_id'))
+    listings = pd.Series(venue_ids).map(pd.Series(venue_ids).value_counts()).to_numpy()
+    result['listings'] = listings[canonical]
+    result['place_ids'] = result['place_id'].astype(str)
+
+    # Only venues with several listings have anything to fill
+    others = ~canonical & (listings > 1)
+    if others.any():
+        extra = places[others].set_axis(pd.Index(venue_ids[others], name='venue_id'))
+        # Empty strings are gaps too (detail_fields stores missing phone/website as '')
+        gaps = extra.replace('', np.nan).groupby(level=0, sort=False).first()
+        shared = result.loc[gaps.index]
+        filled = shared[places.columns].replace('', np.nan).combine_first(gaps)[places.columns]
+        filled['listings'] = shared['listings']
+        joined: Dict[str, List[str]] = {}
+        for venue_id, place_id in zip(extra.index, extra['place_id'].astype(str)):
+            joined.setdefault(venue_id, []).append(place_id)
+        filled['place_ids'] = shared['place_ids'] + '; ' + pd.Series(
+            ['; '.join(joined[venue_id]) for venue_id in gaps.index], index=gaps.index)
+        result = pd.concat([result.drop(gaps.index), filled])
+    return result.reset_index().sort_values('name', kind='stable').reset_index(drop=True)
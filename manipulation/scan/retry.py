@@ -0,0 +1,171 @@
+"""
+Retry policy for Places API calls: status classes, backoff, rate control
+and a circuit breaker.
+
+Every response is classified by its status. OK and ZERO_RESULTS succeed;
+push-back (OVER_QUERY_LIMIT, HTTP 429) and transient failures (HTTP 5xx,
+connection errors and timeouts, UNKNOWN_ERROR) are retried after an
+exponentially growing, jittered delay; anything else (REQUEST_DENIED,
+INVALID_REQUEST, NOT_FOUND, other HTTP 4xx) fails at once, since asking
+again gets the same answer.
+
+Push-back also halves the shared request rate, which then creeps back up
+to the configured rate while calls succeed; the rate changes at most once
+a second, as quotas are counted per second. A run of transient failures
+opens the circuit breaker: calls wait out a cool-down and a single probe
+call then decides whether to resume, so an outage costs one call per
+cool-down instead of several per query.
+
+Nothing here sleeps. The engine's request steps yield the delays, so
+run_deferred can use them for other searches.
+"""
+
+import random
+import threading
+import time
+
+from .ratelimit import TokenBucket
+
+SUCCESS = 'success'
+THROTTLED = 'throttled'  # retried, and the request rate is lowered
+TRANSIENT = 'transient'  # retried; counts towards opening the circuit breaker
+FATAL = 'fatal'  # not retried
+
+SUCCESS_STATUSES = frozenset({'OK', 'ZERO_RESULTS'})
+THROTTLED_STATUSES = frozenset({'OVER_QUERY_LIMIT', 'HTTP_429'})
+TRANSIENT_STATUSES = frozenset({'UNKNOWN_ERROR', 'EXCEPTION', 'HTTP_408'})  # plus every HTTP_5xx
+
+MAX_ATTEMPTS = 5  # calls per request, the first one included
+BASE_DELAY = 1.0  # seconds before the first retry; doubles with every further one
+MAX_DELAY = 60.0
+RATE_DECREASE = 0.5  # share of the rate kept after push-back
+RATE_HOLDOFF = 1.0  # seconds between rate changes (push-back within it is the old rate's)
+RATE_STEP = 0.1  # share of the configured rate added back ...
+RECOVER_AFTER = 20  # ... after this many successful calls in a row
+MIN_RATE = 0.5  # requests per second
+BREAKER_THRESHOLD = 8  # consecutive transient failures that open the breaker
+BREAKER_COOLDOWN = 30.0  # seconds before a probe call is let through
+
+
+def classify(status: str) -> str:
+    """SUCCESS, THROTTLED, TRANSIENT or FATAL for a response status (HTTP errors as 'HTTP_<code>')"""
+    if status in SUCCESS_STATUSES:
+        return SUCCESS
+    if status in THROTTLED_STATUSES:
+        return THROTTLED
+    if status in TRANSIENT_STATUSES or status.startswith('HTTP_5'):
+        return TRANSIENT
+    return FATAL
+
+
+class RetryPolicy:
+    """How many times to send a request and how long to wait in between"""
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, seed: int = None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based):
+        half of the capped exponential delay plus a random share of the other
+        half, so calls that failed together don't retry together"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + self._random.uniform(0, ceiling / 2)
+
+
+class AdaptiveRate:
+    """Additive-increase/multiplicative-decrease control of a TokenBucket's rate"""
+
+    def __init__(self, bucket: TokenBucket, decrease: float = RATE_DECREASE, step: float = RATE_STEP,
+                 recover_after: int = RECOVER_AFTER, min_rate: float = MIN_RATE, holdoff: float = RATE_HOLDOFF):
+        self.bucket = bucket
+        self.target = bucket.rate  # the configured rate, never exceeded
+        self.decrease = decrease
+        self.step = step
+        self.recover_after = recover_after
+        self.min_rate = min(min_rate, self.target)
+        self.holdoff = holdoff
+        self.reductions = 0
+        self._successes = 0
+        self._last_reduction = self._last_change = float('-inf')
+        self._lock = threading.Lock()
+
+    def throttled(self, sent_at: float) -> bool:
+        """Push-back for a call sent at `sent_at` (time.monotonic()); return
+        True if the rate was lowered. Calls sent up to `holdoff` seconds after
+        the last reduction met a quota window the old rate had filled (Google
+        counts requests per second), so they don't lower it again."""
+        with self._lock:
+            self._successes = 0
+            if sent_at < self._last_reduction + self.holdoff or self.bucket.rate <= self.min_rate:
+                return False
+            self._last_reduction = self._last_change = time.monotonic()
+            self.reductions += 1
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease))
+            return True
+
+    def succeeded(self) -> None:
+        """A call got through: one step back up per `holdoff` seconds of successes"""
+        with self._lock:
+            if self.bucket.rate >= self.target:
+                return
+            self._successes += 1
+            now = time.monotonic()
+            if self._successes >= self.recover_after and now >= self._last_change + self.holdoff:
+                self._successes = 0
+                self._last_change = now
+                self.bucket.set_rate(min(self.target, self.bucket.rate + self.step * self.target))
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive transient failures. While it is
+    open, callers wait out the cool-down; then one probe call goes through,
+    and its success closes the breaker while its failure re-opens it."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.trips = 0
+        self._failures = 0
+        self._opened_at: float = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if self._probing else 'open'
+
+    def wait(self) -> float:
+        """Seconds to wait before calling (0: call now, possibly as the probe)"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._probing:
+                return max(0.1, self.cooldown / 10)  # the probe's answer is due soon
+            self._probing = True
+            return 0.0
+
+    def record(self, failed: bool) -> bool:
+        """Outcome of a call (failed: a transient failure); return True if it opened the breaker"""
+        with self._lock:
+            if not failed:
+                self._failures = 0
+                self._opened_at = None
+                self._probing = False
+                return False
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self.trips += 1
+                return True
+            return False
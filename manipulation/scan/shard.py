@@ -0,0 +1,264 @@
+"""
+Sharded scans: one search plan worked through by several processes.
+
+plan_shards() writes a fetcher's coverage into a WorkQueue file as work
+units: one per search circle (all of its type/keyword queries), or the
+quadtree root cells in adaptive mode. Worker processes on this host or on
+others sharing the filesystem then run work_shards(): claim a circle,
+search it with an empty set of found places, and complete it with the
+places it accepted, in result order. Completing a circle enqueues one
+Details unit per accepted place_id (once across all workers) and, for a
+quadtree cell whose queries hit the result cap, its four children. Every
+worker paces itself at requests_per_second / workers from the plan, so
+together they stay within the global rate.
+
+merge_shards() then rebuilds the scan deterministically: circles in plan
+order (quadtree level, then parent order, as search_adaptive runs them),
+first sighting of a place_id wins, Details applied last. That is exactly
+what a single-process run of the same plan produces.
+
+The same queue file is the persisted state of a staged scan: a worker can
+be limited to search or to details units, and merge_places() rebuilds the
+records without pandas (for statistics).
+"""
+
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple
+
+from .engine import CafeFetcher, RequestFailed, ScanConfig
+from .placestore import PlaceStore
+from .quadtree import Cell, root_cells
+from .workqueue import Unit, WorkQueue
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DETAILS_PRIORITY = 0  # claimed first: details never add work, so the queue drains steadily
+SEARCH_PRIORITY = 1
+DETAILS_PER_CALL = 4  # details units claimed at once per call in flight
+POLL_SECONDS = 2.0  # idle wait while other workers hold the remaining units
+
+
+def _search_unit(point: Dict[str, float], radius: float, level: int, path: str, cell: Cell = None) -> Unit:
+    """A circle's unit; sort_key orders by quadtree level, then by position in the plan"""
+    payload = {'point': point, 'radius': radius, 'path': path}
+    if cell is not None:
+        payload['cell'] = list(cell)
+    return Unit(f"search|{point['lat']:.6f},{point['lng']:.6f},{round(radius)}", 'search', payload,
+                sort_key=f"{level:02d}|{path}", priority=SEARCH_PRIORITY)
+
+
+def _cell_unit(cell: Cell, path: str) -> Unit:
+    return _search_unit(cell.center, cell.radius_m, cell.level, path, cell)
+
+
+def _details_unit(place_id: str) -> Unit:
+    return Unit(f"details|{place_id}", 'details', {'place_id': place_id}, sort_key=place_id,
+                priority=DETAILS_PRIORITY)
+
+
+def plan_shards(fetcher: CafeFetcher, queue: WorkQueue, coverage: str, requests_per_second: float,
+                workers: int, boundary: str = None) -> int:
+    """Write the coverage of fetcher.config into the queue; return the units added.
+
+    Re-planning an existing queue with the same settings adds nothing, so an
+    interrupted sharded scan continues where it stopped."""
+    config = fetcher.config
+    meta = json.loads(json.dumps({'config': config._asdict(), 'coverage': coverage, 'boundary': boundary}))
+    existing = queue.meta
+    if 'config' in existing and {k: existing.get(k) for k in meta} != meta:
+        raise ValueError(f"{queue.path} holds a plan with other settings; delete it to start over")
+
+    if coverage == 'adaptive':
+        cells = fetcher.prune_cells(root_cells(config.bounds, config.adaptive_root_size))
+        units = [_cell_unit(cell, f"{i:05d}") for i, cell in enumerate(cells)]
+    elif coverage in ('lattice', 'hex'):
+        grid = fetcher.generate_search_grid() if coverage == 'lattice' else fetcher.generate_hex_grid()
+        units = [_search_unit(point, config.search_radius, 0, f"{i:05d}")
+                 for i, point in enumerate(fetcher.prune_to_boundary(grid))]
+    else:
+        raise ValueError(f"Unknown coverage mode: {coverage}")
+
+    meta.update(requests_per_second=requests_per_second, workers=workers,
+                planned_at=existing.get('planned_at') or datetime.now().isoformat(timespec='seconds'))
+    added = queue.add(units, meta)
+    print(f"Work queue {queue.path}: {added} of {len(units)} {coverage} circles added "
+          f"for {workers} workers at {requests_per_second:g} requests/second in total")
+    return added
+
+
+def shard_config(queue: WorkQueue, base: ScanConfig) -> ScanConfig:
+    """The ScanConfig a queue was planned with"""
+    return base.updated(queue.meta['config'], source=queue.path)
+
+
+def search_circle(fetcher: CafeFetcher, unit: Unit) -> Tuple[Unit, Dict[str, Any], List[Unit]]:
+    """Run one circle's queries; return (unit, result, follow-up units).
+    Raises RuntimeError if a query failed for good, so the queue retries the circle."""
+    config = fetcher.config
+    payload = unit.payload
+    cell = Cell(*payload['cell']) if 'cell' in payload else None
+    counts: List[int] = []
+    # Each circle de-duplicates on its own; the merge picks the first sighting overall
+    fetcher.found_places = PlaceStore()
+    dead_before = len(fetcher.dead_letters)
+    fetcher.run_searches(fetcher.point_tasks(payload['point'], radius=payload['radius'], group=unit.key),
+                         lambda task, n_results: counts.append(n_results))
+    dead = fetcher.dead_letters[dead_before:]
+    if dead:
+        raise RuntimeError(f"{len(dead)} queries failed ({', '.join(sorted({d.status for d in dead}))})")
+    places = list(fetcher.found_places.values())
+    follow_ups = [_details_unit(place['place_id']) for place in places]
+
+    capped = cell is not None and max(counts, default=0) >= config.max_results_per_query
+    if capped and cell.level < config.adaptive_max_level:
+        # Children keep their index among all four, so the order doesn't depend on pruning
+        kept = set(fetcher.prune_cells(cell.split()))
+        follow_ups += [_cell_unit(child, f"{payload['path']}.{i}")
+                       for i, child in enumerate(cell.split()) if child in kept]
+    elif capped:
+        print(f"  Warning: cell {payload['path']} still capped at max level {config.adaptive_max_level}")
+    return unit, {'places': places, 'results': sum(counts), 'capped': capped}, follow_ups
+
+
+def fetch_details(fetcher: CafeFetcher, units: List[Unit]) -> Tuple[List[Tuple[Unit, Dict[str, Any], List[Unit]]],
+                                                                     List[Tuple[Unit, RequestFailed]]]:
+    """Place Details for a batch of details units, max_in_flight at a time;
+    return (done, failed)"""
+    done, failed = [], []
+
+    def fetch(unit: Unit) -> Any:
+        place_id = unit.payload['place_id']
+        fields = fetcher.reusable_details(place_id) if fetcher.incremental else {}
+        if fields:
+            # Stored with the unit: the merge may run without --incremental or after they go stale
+            return {'reused': True, 'fields': fields,
+                    'fetched_at': fetcher.known_places[place_id]['details_fetched_at']}
+        try:
+            details = fetcher.get_place_details(place_id)
+        except RequestFailed as e:
+            return e
+        return {'details': details, 'fetched_at': datetime.now().isoformat(timespec='seconds')}
+
+    def handle(unit: Unit, result: Any) -> None:
+        if isinstance(result, RequestFailed):
+            failed.append((unit, result))
+        else:
+            done.append((unit, result, []))
+
+    fetcher._run_ordered(fetch, units, handle)
+    return done, failed
+
+
+def work_shards(fetcher: CafeFetcher, queue: WorkQueue, owner: str = None,
+                kinds: Iterable[str] = ('details', 'search')) -> Dict[str, int]:
+    """Claim and complete units of `kinds` until none of them are left
+    anywhere; return what this worker did"""
+    kinds = tuple(kinds)
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    stats = {'search': 0, 'details': 0, 'failed': 0, 'lost': 0}
+    started = time.monotonic()
+    print(f"Worker {owner}: {fetcher.rate_limiter.rate:g} requests/second, "
+          f"{fetcher.max_in_flight} calls in flight")
+
+    while True:
+        units = []
+        if 'details' in kinds:
+            units = queue.claim(owner, limit=fetcher.max_in_flight * DETAILS_PER_CALL, kind='details')
+        if not units and 'search' in kinds:
+            units = queue.claim(owner, kind='search')
+        if not units:
+            if not sum(queue.unfinished(kind) for kind in kinds):
+                break
+            time.sleep(POLL_SECONDS)  # others may still add follow-ups or let a lease expire
+            continue
+        try:
+            if units[0].kind == 'details':
+                done, failed = fetch_details(fetcher, units)
+                for unit, error in failed:
+                    # Back in the queue; failed for good after max_attempts, until the next run
+                    queue.fail(unit, str(error))
+                stats['failed'] += len(failed)
+            else:
+                done = [search_circle(fetcher, units[0])]
+                fetcher._log(f"  [{owner}] circle {units[0].payload['path']}: "
+                             f"{len(done[0][1]['places'])} places")
+        except Exception as e:
+            print(f"  Warning: {units[0].kind} unit failed on {owner}: {e}")
+            for unit in units:
+                queue.fail(unit, repr(e))
+            stats['failed'] += len(units)
+            continue
+        except BaseException:
+            for unit in units:
+                queue.release(unit)
+            raise
+        accepted = queue.complete(done)
+        stats[units[0].kind] += accepted
+        stats['lost'] += len(done) - accepted
+
+    stats['api_calls'] = fetcher.api_calls
+    stats['seconds'] = round(time.monotonic() - started, 1)
+    queue.add([], {f"worker:{owner}": stats})
+    print(f"Worker {owner} finished: {stats['search']} circles, {stats['details']} details, "
+          f"{stats['api_calls']} API calls in {stats['seconds']:.0f} s")
+    return stats
+
+
+def print_queue(queue: WorkQueue) -> int:
+    """Print units per kind and status and each worker's totals; return the units not done"""
+    counts = queue.counts()
+    for kind, statuses in sorted(counts.items()):
+        print(f"  {kind}: " + ', '.join(f"{n} {status}" for status, n in sorted(statuses.items())))
+    for key, stats in sorted(queue.meta.items()):
+        if key.startswith('worker:'):
+            print(f"  {key[7:]}: {stats['search']} circles, {stats['details']} details, "
+                  f"{stats['api_calls']} calls in {stats['seconds']:.0f} s")
+    return sum(n for statuses in counts.values() for status, n in statuses.items() if status != 'done')
+
+
+def merge_places(fetcher: CafeFetcher, queue: WorkQueue) -> int:
+    """Set fetcher's found places, details and fetch times from a worked
+    queue, deterministically and as if it had run the scan itself; return
+    the units not done"""
+    unfinished = print_queue(queue)
+    if unfinished:
+        print(f"  Warning: {unfinished} units are not done; their places or details are missing")
+
+    places: Dict[str, Dict] = {}
+    for _, result in queue.results('search'):
+        for record in result['places']:
+            places.setdefault(record['place_id'], record)
+
+    for unit, result in queue.results('details'):
+        place_id = unit.payload['place_id']
+        if place_id not in places:
+            continue
+        if result.get('reused') and 'fields' in result:
+            fields, fetched_at = result['fields'], result['fetched_at']
+        elif result.get('reused'):  # queues from before reused fields were stored with the unit
+            fields = fetcher.reusable_details(place_id)
+            fetched_at = fetcher.known_places.get(place_id, {}).get('details_fetched_at')
+        else:
+            fields = fetcher.detail_fields(places[place_id], result['details']) if result['details'] else {}
+            fetched_at = result['fetched_at']
+        if fields:
+            places[place_id].update(fields)
+            fetcher.enriched.add(place_id)
+            fetcher.details_fetched_at[place_id] = fetched_at
+
+    fetcher.found_places = PlaceStore.from_records(places.values())
+    print(f"Merged {len(places)} unique cafes ({len(fetcher.enriched)} with details)")
+    return unfinished
+
+
+def merge_shards(fetcher: CafeFetcher, queue: WorkQueue) -> Tuple['pd.DataFrame', int]:
+    """Results of a worked queue as a DataFrame sorted by name (see
+    merge_places), and the units not done"""
+    unfinished = merge_places(fetcher, queue)
+    df = fetcher.found_places.to_frame()
+    return (df.sort_values('name') if len(df) else df), unfinished
@@ -0,0 +1,165 @@
+"""
+Streaming output sinks for scanned places.
+
+The fetchers emit a place's full current record when it is accepted and
+again when its details arrive. A SinkWriter buffers those records and
+writes them to every sink in batches (one transaction per batch for
+SQLite), so partial results are on disk while the scan runs:
+
+  CsvSink     appends rows; the last row for a place_id is its latest state
+  JsonlSink   appends one JSON object per record, same last-wins rule
+  SqliteSink  upserts by place_id in WAL mode, so readers can query it
+              mid-scan; `read_frame()` returns the places in acceptance order
+"""
+
+import csv
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+
+def _plain(value: Any) -> Any:
+    """NaN -> None and numpy scalars -> Python values"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class PlaceSink:
+    """Destination for batches of place records"""
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class CsvSink(PlaceSink):
+    """Appends records as CSV rows with a fixed column order"""
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = list(columns)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+        self._writer.writeheader()
+        self._file.flush()
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JsonlSink(PlaceSink):
+    """Appends one JSON object per record"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps({k: _plain(v) for k, v in r.items()}, default=str) + '\n'
+                              for r in records)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SqliteSink(PlaceSink):
+    """Upserts records by place_id into a WAL-mode SQLite table"""
+
+    def __init__(self, path: str, columns: List[str], table: str = 'places'):
+        self.path = path
+        self.table = table
+        self.columns = [c for c in columns if c != 'place_id']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        # Untyped columns keep each value's own SQLite storage class
+        column_defs = ', '.join(f'"{c}"' for c in self.columns)
+        self._conn.execute(
+            f'CREATE TABLE "{table}" (seq INTEGER NOT NULL, place_id TEXT PRIMARY KEY, {column_defs})'
+        )
+        self._conn.commit()
+        self._seq = 0
+        names = ', '.join(f'"{c}"' for c in ['seq', 'place_id'] + self.columns)
+        placeholders = ', '.join('?' for _ in range(len(self.columns) + 2))
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in self.columns)
+        self._upsert = (f'INSERT INTO "{table}" ({names}) VALUES ({placeholders}) '
+                        f'ON CONFLICT (place_id) DO UPDATE SET {updates}')
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        rows = []
+        for record in records:
+            self._seq += 1  # only used on first insert, so seq is acceptance order
+            rows.append([self._seq, record['place_id']] + [_plain(record.get(c)) for c in self.columns])
+        with self._conn:
+            self._conn.executemany(self._upsert, rows)
+
+    def read_frame(self):
+        """All places written so far, in acceptance order"""
+        import pandas as pd
+
+        frame = pd.read_sql_query(f'SELECT * FROM "{self.table}" ORDER BY seq', self._conn)
+        return frame.drop(columns=['seq'])
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class SinkWriter:
+    """Thread-safe buffer that flushes records to sinks in batches"""
+
+    def __init__(self, sinks: List[PlaceSink], batch_size: int = 100, max_delay: float = 5.0):
+        self.sinks = sinks
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay  # seconds a record may wait before a flush
+        self.written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        """Queue a snapshot of a place's current record"""
+        with self._lock:
+            self._buffer.append(dict(record))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._oldest >= self.max_delay:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer, self._oldest = self._buffer, [], None
+        for sink in self.sinks:
+            sink.write(batch)
+        self.written += len(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def sqlite_sink(self) -> SqliteSink:
+        return next((s for s in self.sinks if isinstance(s, SqliteSink)), None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            for sink in self.sinks:
+                sink.close()
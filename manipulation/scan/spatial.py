@@ -0,0 +1,184 @@
+"""
+Grid index for batched radius and k-nearest-neighbour queries over places.
+
+Places are bucketed into square cells of about `cell_m` metres on a
+lat/lng grid and stored sorted by cell, so each row of cells a query
+touches is one contiguous slice. A batch of queries expands to its
+candidate slices with NumPy, without a Python loop per query, and
+candidates are filtered by exact great-circle distance. kNN grows a
+radius per query (starting from the average spacing of the places)
+until at least k places fall inside it.
+
+The index is saved as a compressed .npz next to the scan CSV and loads
+without re-sorting.
+"""
+
+import math
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from .geometry import EARTH_RADIUS_M, METRES_PER_DEGREE_LAT
+
+DEFAULT_CELL_M = 250.0
+MAX_CELLS = 4_000_000  # cell size grows if the extent would need more
+
+
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Vectorized great-circle distance in metres"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def _expand_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(s, s + n) for each (s, n), vectorized"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class PlaceIndex:
+    """Places sorted by grid cell; query results are positions into
+    `place_ids`, `lat` and `lng`"""
+
+    def __init__(self, place_ids: Iterable[str], lats: Iterable[float], lngs: Iterable[float],
+                 cell_m: float = DEFAULT_CELL_M):
+        place_ids = np.asarray(list(place_ids), dtype=str)
+        lat = np.asarray(lats, dtype=float)
+        lng = np.asarray(lngs, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lng)
+        place_ids, lat, lng = place_ids[valid], lat[valid], lng[valid]
+        if len(lat) == 0:
+            raise ValueError("PlaceIndex needs at least one place with coordinates")
+
+        self.south, self.west = float(lat.min()), float(lng.min())
+        height = float(lat.max()) - self.south
+        lat0 = math.radians(float(lat.mean()))
+        while True:
+            self.cell_lat = cell_m / METRES_PER_DEGREE_LAT
+            self.cell_lng = cell_m / (METRES_PER_DEGREE_LAT * max(math.cos(lat0), 0.01))
+            self.ny = int(height // self.cell_lat) + 1
+            self.nx = int((float(lng.max()) - self.west) // self.cell_lng) + 1
+            if self.nx * self.ny <= MAX_CELLS:
+                break
+            cell_m *= 2
+        self.cell_m = cell_m
+
+        cells = self._cell_y(lat) * self.nx + self._cell_x(lng)
+        order = np.argsort(cells, kind='stable')
+        self.place_ids, self.lat, self.lng = place_ids[order], lat[order], lng[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_frame(cls, df, cell_m: float = DEFAULT_CELL_M) -> 'PlaceIndex':
+        return cls(df['place_id'].astype(str), df['lat'], df['lng'], cell_m=cell_m)
+
+    @classmethod
+    def from_csv(cls, path: str, cell_m: float = DEFAULT_CELL_M) -> 'PlaceIndex':
+        import pandas as pd
+
+        return cls.from_frame(pd.read_csv(path, usecols=['place_id', 'lat', 'lng']), cell_m=cell_m)
+
+    def _cell_y(self, lat) -> np.ndarray:
+        return np.floor((np.asarray(lat) - self.south) / self.cell_lat).astype(np.int64)
+
+    def _cell_x(self, lng) -> np.ndarray:
+        return np.floor((np.asarray(lng) - self.west) / self.cell_lng).astype(np.int64)
+
+    def _candidates(self, lat: np.ndarray, lng: np.ndarray,
+                    radius: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(query number, position) for every place in the cells each query's
+        bounding box touches"""
+        dlat = radius / METRES_PER_DEGREE_LAT
+        # Widest longitude span is at the box edge nearest the pole
+        far_lat = np.radians(np.minimum(np.abs(lat) + dlat, 89.0))
+        dlng = radius / (METRES_PER_DEGREE_LAT * np.cos(far_lat))
+        y0, y1 = self._cell_y(lat - dlat), self._cell_y(lat + dlat)
+        x0, x1 = self._cell_x(lng - dlng), self._cell_x(lng + dlng)
+        hit = (y1 >= 0) & (y0 < self.ny) & (x1 >= 0) & (x0 < self.nx)
+        y0, y1 = np.clip(y0, 0, self.ny - 1), np.clip(y1, 0, self.ny - 1)
+        x0, x1 = np.clip(x0, 0, self.nx - 1), np.clip(x1, 0, self.nx - 1)
+
+        # One contiguous slice per (query, cell row)
+        rows = np.where(hit, y1 - y0 + 1, 0)
+        pair_q = np.repeat(np.arange(len(lat)), rows)
+        pair_y = _expand_ranges(y0[hit], rows[hit])
+        lo = self.cell_start[pair_y * self.nx + x0[pair_q]]
+        hi = self.cell_start[pair_y * self.nx + x1[pair_q] + 1]
+        lengths = hi - lo
+        return np.repeat(pair_q, lengths), _expand_ranges(lo, lengths)
+
+    def query_radius(self, lats, lngs, radius) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Places within `radius` metres (scalar or per query) of each query point.
+
+        Returns (positions, distances): one array per query, nearest first.
+        """
+        lat = np.atleast_1d(np.asarray(lats, dtype=float))
+        lng = np.atleast_1d(np.asarray(lngs, dtype=float))
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), lat.shape)
+        query, pos = self._candidates(lat, lng, radius)
+        dist = haversine_np(lat[query], lng[query], self.lat[pos], self.lng[pos])
+        inside = dist <= radius[query]
+        query, pos, dist = query[inside], pos[inside], dist[inside]
+        order = np.lexsort((dist, query))
+        splits = np.searchsorted(query[order], np.arange(1, len(lat)))
+        return np.split(pos[order], splits), np.split(dist[order], splits)
+
+    def query_knn(self, lats, lngs, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """The k nearest places to each query point.
+
+        Returns (positions, distances) arrays of shape (queries, k), nearest
+        first; padded with -1 / inf when the index holds fewer than k places.
+        """
+        lat = np.atleast_1d(np.asarray(lats, dtype=float))
+        lng = np.atleast_1d(np.asarray(lngs, dtype=float))
+        positions = np.full((len(lat), k), -1, dtype=np.int64)
+        distances = np.full((len(lat), k), np.inf)
+        need = min(k, len(self))
+
+        # Start at the radius that holds ~k places at the average density of occupied cells
+        area = np.count_nonzero(np.diff(self.cell_start)) * self.cell_m ** 2
+        radius = np.full(len(lat), max(math.sqrt(need * area / (math.pi * len(self))) * 1.5, self.cell_m))
+        pending = np.arange(len(lat))
+        while len(pending):
+            query, pos = self._candidates(lat[pending], lng[pending], radius[pending])
+            dist = haversine_np(lat[pending][query], lng[pending][query], self.lat[pos], self.lng[pos])
+            inside = dist <= radius[pending][query]
+            query, pos, dist = query[inside], pos[inside], dist[inside]
+            counts = np.bincount(query, minlength=len(pending))
+            # Every place within the radius was found, so k hits inside it are the k nearest
+            done = counts >= need
+
+            order = np.lexsort((dist, query))
+            query, pos, dist = query[order], pos[order], dist[order]
+            rank = np.arange(len(query)) - np.searchsorted(query, query)
+            keep = done[query] & (rank < k)
+            rows = pending[query[keep]]
+            positions[rows, rank[keep]] = pos[keep]
+            distances[rows, rank[keep]] = dist[keep]
+
+            radius[pending[~done]] *= 2
+            pending = pending[~done]
+        return positions, distances
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path, place_ids=self.place_ids, lat=self.lat, lng=self.lng, cell_start=self.cell_start,
+            grid=np.array([self.south, self.west, self.cell_lat, self.cell_lng, self.nx, self.ny, self.cell_m])
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'PlaceIndex':
+        with np.load(path, allow_pickle=False) as data:
+            index = cls.__new__(cls)
+            index.place_ids, index.lat, index.lng = data['place_ids'], data['lat'], data['lng']
+            index.cell_start = data['cell_start']
+            south, west, cell_lat, cell_lng, nx, ny, cell_m = data['grid'].tolist()
+        index.south, index.west, index.cell_lat, index.cell_lng = south, west, cell_lat, cell_lng
+        index.nx, index.ny, index.cell_m = int(nx), int(ny), cell_m
+        return index
@@ -0,0 +1,227 @@
+"""
+SQLite persistence for scanned places in global-data.sqlite.
+
+The places table has a declared schema: place_id is the primary key, and
+lat/lng and business_status are indexed for the spatial and status filters
+downstream stages run. The database is kept in WAL mode, so the R stages
+can read while a scan writes. Rows are written with executemany upserts in
+one transaction per call. A refresh updates the rows it saw and leaves the
+rest of the table in place, flagged as not seen in the latest scan; a
+row's first_seen_at is kept once set.
+
+Tables written by earlier versions with pandas `to_sql` (no key, duplicate
+rows possible) are migrated in place the first time they are written to.
+"""
+
+import math
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List
+
+# Declared columns of a places table, in order; other record keys are
+# added as extra columns with the affinity of their first value
+PLACE_SCHEMA = [
+    ('place_id', 'TEXT PRIMARY KEY'),
+    ('name', 'TEXT'),
+    ('address', 'TEXT'),
+    ('lat', 'REAL'),
+    ('lng', 'REAL'),
+    ('types', 'TEXT'),
+    ('rating', 'REAL'),
+    ('user_ratings_total', 'INTEGER'),
+    ('business_status', 'TEXT'),
+    ('price_level', 'INTEGER'),
+    ('formatted_address', 'TEXT'),
+    ('phone', 'TEXT'),
+    ('website', 'TEXT'),
+    ('hours', 'TEXT'),
+    ('is_open_now', 'INTEGER'),
+    ('description', 'TEXT'),
+    ('first_seen_at', 'TEXT'),
+    ('last_seen_at', 'TEXT'),
+    ('details_fetched_at', 'TEXT'),
+    ('seen_in_last_scan', 'INTEGER'),
+]
+PLACE_INDEXES = {'lat_lng': ('lat', 'lng'), 'business_status': ('business_status',)}
+BUSY_TIMEOUT_MS = 30000  # wait this long for another writer instead of failing
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_value(value: Any) -> Any:
+    """Convert pandas/numpy scalars to values sqlite3 accepts (NaN -> NULL)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, 'item'):  # numpy scalar
+        return _sql_value(value.item())
+    return value
+
+
+def _affinity(values: Iterable[Any]) -> str:
+    """SQLite column type for the first non-null value of a column"""
+    for value in values:
+        value = _sql_value(value)
+        if value is None:
+            continue
+        if isinstance(value, (bool, int)):
+            return 'INTEGER'
+        if isinstance(value, float):
+            return 'REAL'
+        return 'TEXT'
+    return 'TEXT'
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open the database in WAL mode with a busy timeout for concurrent writers"""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> Dict[str, int]:
+    """Column name -> primary-key position (0 for non-key columns)"""
+    return {row[1]: row[5] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")}
+
+
+def ensure_schema(conn: sqlite3.Connection, table: str, records: List[Dict[str, Any]] = ()) -> List[str]:
+    """Create or migrate `table` to the declared schema plus any extra record columns.
+    
+    A legacy table without a place_id primary key is rebuilt: the latest
+    row per place_id is kept, and legacy-only columns are carried over.
+    Returns the table's columns. Call inside a transaction.
+    """
+    declared = [name for name, _ in PLACE_SCHEMA]
+    extra: List[str] = []
+    for record in records:
+        for column in record:
+            if column not in declared and column not in extra:
+                extra.append(column)
+    
+    existing = table_columns(conn, table) if table_exists(conn, table) else {}
+    if existing.get('place_id') != 1:
+        legacy = [c for c in existing if c not in declared and c not in extra]
+        column_defs = [f"{_quote(name)} {decl}" for name, decl in PLACE_SCHEMA]
+        column_defs += [f"{_quote(c)} {_affinity(r.get(c) for r in records)}" for c in extra]
+        column_defs += [_quote(c) for c in legacy]  # untyped: values keep their storage class
+        target = table + '__migrating' if existing else table
+        conn.execute(f"CREATE TABLE {_quote(target)} ({', '.join(column_defs)})")
+        if existing:
+            shared = ', '.join(_quote(c) for c in existing)
+            conn.execute(
+                f"INSERT INTO {_quote(target)} ({shared}) SELECT {shared} FROM {_quote(table)} "
+                f"WHERE rowid IN (SELECT MAX(rowid) FROM {_quote(table)} "
+                f"WHERE place_id IS NOT NULL GROUP BY place_id)"
+            )
+            conn.execute(f"DROP TABLE {_quote(table)}")
+            conn.execute(f"ALTER TABLE {_quote(target)} RENAME TO {_quote(table)}")
+    else:
+        for column in declared + extra:
+            if column not in existing:
+                decl = dict(PLACE_SCHEMA).get(column) or _affinity(r.get(column) for r in records)
+                conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} {decl}")
+    
+    # Unique index from earlier versions is redundant with the primary key
+    conn.execute(f"DROP INDEX IF EXISTS {_quote(table + '_place_id')}")
+    for suffix, columns in PLACE_INDEXES.items():
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {_quote(table + '_' + suffix)} "
+            f"ON {_quote(table)} ({', '.join(_quote(c) for c in columns)})"
+        )
+    return list(table_columns(conn, table))
+
+
+def load_places(db_path: str, table: str) -> Dict[str, Dict]:
+    """Existing rows of `table` keyed by place_id (empty if there is no table yet)"""
+    if not os.path.exists(db_path):
+        return {}
+    conn = connect(db_path)
+    try:
+        if not table_exists(conn, table):
+            return {}
+        cursor = conn.execute(f"SELECT * FROM {_quote(table)}")
+        columns = [d[0] for d in cursor.description]
+        if 'place_id' not in columns:
+            return {}
+        return {row['place_id']: row for row in (dict(zip(columns, r)) for r in cursor)}
+    finally:
+        conn.close()
+
+
+def _write_places(conn: sqlite3.Connection, table: str, records: List[Dict[str, Any]],
+                  defaults: Dict[str, Any]) -> List[str]:
+    """Upsert `records` with one executemany; returns the columns written
+    (none for no records: callers still run their DELETE/UPDATE)"""
+    table_cols = ensure_schema(conn, table, records)
+    if not records:
+        return []
+    columns = [c for c in table_cols if c == 'place_id' or any(c in r for r in records) or c in defaults]
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(
+        f"{_quote(c)} = COALESCE({_quote(table)}.{_quote(c)}, excluded.{_quote(c)})" if c == 'first_seen_at'
+        else f"{_quote(c)} = excluded.{_quote(c)}"
+        for c in columns if c != 'place_id')
+    conn.executemany(
+        f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+        f"VALUES ({placeholders}) ON CONFLICT (place_id) "
+        + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING"),
+        ([_sql_value(r.get(c, defaults.get(c))) for c in columns] for r in records)
+    )
+    return columns
+
+
+def upsert_places(db_path: str, table: str, records: List[Dict[str, Any]],
+                  seen_column: str = 'seen_in_last_scan') -> Dict[str, int]:
+    """Insert or update `records` by place_id and flag every other row as unseen.
+    
+    Runs as a single transaction, so readers see either the previous
+    snapshot or the new one. Returns row counts.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            ensure_schema(conn, table, records)  # migrate first so legacy duplicates don't skew counts
+            before = conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+            _write_places(conn, table, records, {seen_column: 1})
+            
+            conn.execute("CREATE TEMP TABLE seen_ids (place_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO seen_ids VALUES (?)", [(r['place_id'],) for r in records])
+            unseen = conn.execute(
+                f"UPDATE {_quote(table)} SET {_quote(seen_column)} = 0 "
+                f"WHERE place_id NOT IN (SELECT place_id FROM seen_ids)"
+            ).rowcount
+            conn.execute("DROP TABLE seen_ids")
+            after = conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+    finally:
+        conn.close()
+    return {'inserted': after - before, 'updated': len(records) - (after - before), 'unseen': unseen}
+
+
+def replace_places(db_path: str, table: str, records: List[Dict[str, Any]]) -> int:
+    """Make `records` the whole contents of `table`, keeping its schema and indexes.
+    
+    Rows for place_ids not in `records` are deleted in the same transaction
+    as the upsert. Returns the number of rows written.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            _write_places(conn, table, records, {})
+            conn.execute("CREATE TEMP TABLE kept_ids (place_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO kept_ids VALUES (?)", [(r['place_id'],) for r in records])
+            conn.execute(f"DELETE FROM {_quote(table)} WHERE place_id NOT IN (SELECT place_id FROM kept_ids)")
+            conn.execute("DROP TABLE kept_ids")
+    finally:
+        conn.close()
+    return len(records)
@@ -0,0 +1,199 @@
+"""
+SQLite work queue with leases, shared by scan worker processes.
+
+A unit is claimed with a time-limited lease inside an IMMEDIATE
+transaction, so no two workers hold the same unit; a worker that dies just
+lets its lease run out and the unit is handed out again. Completing a unit
+stores its result and enqueues its follow-up units in one transaction, and
+only succeeds while the caller still holds the lease, so each unit ends up
+with exactly one result however often it was retried.
+
+The file may sit on a filesystem shared by several hosts. It therefore
+uses SQLite's rollback journal rather than WAL (which needs shared memory
+on one host), and leases are wall-clock times, so the hosts' clocks must
+agree to well within LEASE_SECONDS.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+LEASE_SECONDS = 600.0  # a claimed unit is handed out again after this long without completing
+MAX_ATTEMPTS = 3  # failed claims before a unit is marked failed
+BUSY_TIMEOUT_S = 60.0  # wait this long for another process's transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id          INTEGER PRIMARY KEY,
+    key         TEXT NOT NULL UNIQUE,
+    kind        TEXT NOT NULL,
+    priority    INTEGER NOT NULL,
+    sort_key    TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    result      TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS units_claim ON units (status, priority, sort_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class Unit(NamedTuple):
+    """One piece of work; id, attempts and owner are set once it is in the queue"""
+    key: str  # unique: a unit added twice is kept once
+    kind: str
+    payload: Dict[str, Any]
+    sort_key: str = ''  # order of results (and of claims within a priority)
+    priority: int = 0  # lower is claimed first
+    id: int = None
+    attempts: int = 0
+    owner: str = None
+
+
+class WorkQueue:
+    """Leased units in one SQLite file, usable from many processes"""
+
+    def __init__(self, path: str, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the database write lock for the duration of the block"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, units: Iterable[Unit]) -> int:
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO units (key, kind, priority, sort_key, payload) VALUES (?, ?, ?, ?, ?)",
+            [(u.key, u.kind, u.priority, u.sort_key, json.dumps(u.payload)) for u in units])
+        return cursor.rowcount
+
+    def add(self, units: Iterable[Unit], meta: Dict[str, Any] = None) -> int:
+        """Enqueue units (existing keys are left alone) and set metadata; return units added"""
+        with self._transaction() as conn:
+            for key, value in (meta or {}).items():
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            return self._insert(conn, units)
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        with self._lock:
+            return {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM meta")}
+
+    def claim(self, owner: str, limit: int = 1, kind: str = None) -> List[Unit]:
+        """Lease up to `limit` claimable units (pending, or leased with the lease
+        run out), best priority first and of one kind; [] if there are none"""
+        now = time.time()
+        claimable = "(status = 'pending' OR (status = 'leased' AND lease_until < ?))"
+        with self._transaction() as conn:
+            if kind is None:
+                row = conn.execute(f"SELECT kind FROM units WHERE {claimable} "
+                                   f"ORDER BY priority, sort_key LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return []
+                kind = row[0]
+            rows = conn.execute(f"SELECT id, key, kind, priority, sort_key, payload, attempts FROM units "
+                                f"WHERE kind = ? AND {claimable} ORDER BY priority, sort_key LIMIT ?",
+                                (kind, now, limit)).fetchall()
+            conn.executemany("UPDATE units SET status = 'leased', owner = ?, lease_until = ?, "
+                             "attempts = attempts + 1 WHERE id = ?",
+                             [(owner, now + self.lease_seconds, row[0]) for row in rows])
+        return [Unit(key, kind, json.loads(payload), sort_key, priority, id, attempts + 1, owner)
+                for id, key, kind, priority, sort_key, payload, attempts in rows]
+
+    def complete(self, done: Iterable[Tuple[Unit, Any, Iterable[Unit]]]) -> int:
+        """Store (unit, result, follow-up units) for units whose lease is still
+        held, in one transaction; return how many were accepted (a unit whose
+        lease was lost is ignored: whoever holds it now will complete it)"""
+        accepted = 0
+        now = time.time()
+        with self._transaction() as conn:
+            for unit, result, follow_ups in done:
+                cursor = conn.execute(
+                    "UPDATE units SET status = 'done', result = ?, finished_at = ?, lease_until = NULL, "
+                    "error = NULL WHERE id = ? AND status = 'leased' AND owner = ? AND attempts = ?",
+                    (json.dumps(result), now, unit.id, unit.owner, unit.attempts))
+                if cursor.rowcount:
+                    accepted += 1
+                    self._insert(conn, follow_ups)
+        return accepted
+
+    def fail(self, unit: Unit, error: str) -> None:
+        """Give a unit back after an error; it is marked failed after max_attempts claims"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_until = NULL, error = ? "
+                "WHERE id = ? AND status = 'leased' AND owner = ? AND attempts = ?",
+                (self.max_attempts, error, unit.id, unit.owner, unit.attempts))
+
+    def release(self, unit: Unit) -> None:
+        """Hand back a unit unfinished (e.g. on Ctrl-C) without using up an attempt"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE units SET status = 'pending', owner = NULL, lease_until = NULL, "
+                         "attempts = attempts - 1 WHERE id = ? AND status = 'leased' AND owner = ? "
+                         "AND attempts = ?", (unit.id, unit.owner, unit.attempts))
+
+    def retry_failed(self) -> int:
+        """Make failed units claimable again with fresh attempts; return how many"""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE units SET status = 'pending', attempts = 0 "
+                                "WHERE status = 'failed'").rowcount
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """kind -> status -> units"""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM units GROUP BY kind, status").fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, status, n in rows:
+            counts.setdefault(kind, {})[status] = n
+        return counts
+
+    def unfinished(self, kind: str = None) -> int:
+        """Units (of one kind) still pending or leased (follow-ups of leased units may add more)"""
+        with self._lock:
+            if kind is None:
+                return self._conn.execute("SELECT COUNT(*) FROM units "
+                                          "WHERE status IN ('pending', 'leased')").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM units WHERE kind = ? "
+                                      "AND status IN ('pending', 'leased')", (kind,)).fetchone()[0]
+
+    def results(self, kind: str) -> Iterator[Tuple[Unit, Any]]:
+        """(unit, result) of every completed unit of `kind`, in sort_key order"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, key, priority, sort_key, payload, attempts, owner, result "
+                                      "FROM units WHERE kind = ? AND status = 'done' ORDER BY sort_key, id",
+                                      (kind,)).fetchall()
+        for id, key, priority, sort_key, payload, attempts, owner, result in rows:
+            yield Unit(key, kind, json.loads(payload), sort_key, priority, id, attempts, owner), json.loads(result)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
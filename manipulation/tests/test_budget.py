@@ -0,0 +1,47 @@
+"""Budgeted scans against a warm response cache (run: python -m pytest manipulation/tests)"""
+
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.budget import ScanBudget
+from scan.cache import ResponseCache
+from scan.engine import CafeFetcher, ScanConfig
+from scan.mockapi import MockPlacesServer, PlacesDataset
+
+CONFIG = ScanConfig(bounds={'north': 53.6, 'south': 53.5, 'east': -113.4, 'west': -113.6},
+                    search_types=('cafe',), search_keywords=('coffee',))
+
+
+def scan(url: str, cache: ResponseCache, budget: ScanBudget = None, pipeline: bool = False) -> CafeFetcher:
+    fetcher = CafeFetcher('test-key', CONFIG, requests_per_second=1000, max_in_flight=4,
+                          cache=cache, api_base_url=url)
+    fetcher.page_token_delay = 0
+    fetcher.budget = budget
+    with contextlib.redirect_stdout(io.StringIO()):
+        fetcher.search_all(pipeline=pipeline)
+    return fetcher
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_budgeted_scan_with_cached_details_spends_only_searches(tmp_path, pipeline):
+    dataset = PlacesDataset.synthetic(300, CONFIG.bounds, seed=1)
+    with MockPlacesServer(dataset) as server:
+        cache_path = str(tmp_path / 'cache.sqlite')
+        first = scan(server.url, ResponseCache(cache_path))
+        searches = first.api_calls - len(first.found_places)
+
+        # Searches have gone stale, details are still cached: only the searches cost calls
+        budget = ScanBudget(max_calls=searches + 5)
+        second = scan(server.url, ResponseCache(cache_path, ttls={'nearbysearch': 0}), budget,
+                      pipeline)
+
+    assert not second.budget_exhausted
+    assert not second.details_deferred
+    assert second.api_calls == searches
+    assert budget.summary()['reserved'] == 0
+    assert len(second.enriched) == len(first.enriched) == len(first.found_places)
@@ -0,0 +1,38 @@
+"""Journal recovery after a crash mid-write (run: python -m pytest manipulation/tests)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.journal import ScanJournal
+
+
+def write_tasks(journal: ScanJournal, keys) -> None:
+    for key in keys:
+        journal.record_task(key, 1)
+
+
+def test_resume_after_torn_line_keeps_later_entries(tmp_path):
+    path = str(tmp_path / 'scan.jsonl')
+    journal = ScanJournal(path)
+    journal.open(resume=False)
+    write_tasks(journal, ['a1', 'a2', 'a3', 'a4', 'a5'])
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"kind":"task","key":"tor')  # crash mid-write
+
+    resumed = ScanJournal(path)
+    assert len(resumed.load().tasks) == 5
+    resumed.open(resume=True)
+    write_tasks(resumed, ['b1', 'b2', 'b3', 'b4', 'b5'])
+    resumed.close()
+
+    assert sorted(ScanJournal(path).load().tasks) == ['a1', 'a2', 'a3', 'a4', 'a5', 'b1', 'b2', 'b3', 'b4', 'b5']
+
+
+def test_torn_line_inside_the_journal_is_skipped(tmp_path):
+    path = str(tmp_path / 'scan.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"kind":"task","key":"a","results":1}\n{"kind":"ta{"kind":"task","key":"b","results":2}\n'
+                '{"kind":"task","key":"c","results":3}\n')
+    assert ScanJournal(path).load().tasks == {'a': 1, 'c': 3}
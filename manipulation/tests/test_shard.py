@@ -0,0 +1,40 @@
+"""Merging a sharded scan (run: python -m pytest manipulation/tests)"""
+
+import contextlib
+import io
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan.engine import CafeFetcher, ScanConfig
+from scan.shard import _details_unit, _search_unit, fetch_details, merge_places
+from scan.workqueue import WorkQueue
+
+CONFIG = ScanConfig(bounds={'north': 53.6, 'south': 53.5, 'east': -113.4, 'west': -113.6})
+PLACE = {'place_id': 'p1', 'name': 'Cafe One', 'address': '1 Main St', 'lat': 53.55, 'lng': -113.5}
+
+
+def test_merge_without_incremental_keeps_reused_details(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    search = _search_unit({'lat': 53.55, 'lng': -113.5}, 3500, 0, '0')
+    queue.add([search, _details_unit('p1')])
+    queue.complete([(queue.claim('w', kind='search')[0], {'places': [PLACE], 'results': 1, 'capped': False}, [])])
+
+    # The worker reuses details stored by an earlier scan
+    worker = CafeFetcher('test-key', CONFIG)
+    worker.incremental = True
+    worker.stale_days = 30
+    fetched_at = datetime.now().isoformat(timespec='seconds')
+    worker.known_places = {'p1': dict(PLACE, phone='780-555-0100', is_open_now=1, details_fetched_at=fetched_at)}
+    with contextlib.redirect_stdout(io.StringIO()):
+        done, failed = fetch_details(worker, queue.claim('w', limit=10, kind='details'))
+    queue.complete(done)
+
+    merger = CafeFetcher('test-key', CONFIG)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert merge_places(merger, queue) == 0
+    assert failed == []
+    assert merger.found_places['p1']['phone'] == '780-555-0100'
+    assert merger.found_places['p1']['is_open_now'] is True
+    assert merger.details_fetched_at['p1'] == fetched_at